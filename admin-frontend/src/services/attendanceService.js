@@ -28,29 +28,27 @@ export const attendanceService = {
 
     async verifyFaceAndMarkAttendance(employeeId, photoBase64, areaId, latitude, longitude) {
         try {
-            console.log('🔍 Verificando rostro para asistencia...');
+            console.log('🔍 Verificando rostro y marcando asistencia...');
             
-            // Primero verificar el rostro
-            const faceVerification = await this.verifyFace(employeeId, photoBase64);
-            
-            if (!faceVerification.verified) {
-                throw new Error(`Rostro no reconocido: ${faceVerification.message}`);
-            }
-            
-            // ✅ VALIDACIÓN DE UMBRAL DE CONFIANZA: Solo permitir 90% o superior
-            if (faceVerification.confidence < CONFIDENCE_THRESHOLD) {
-                throw new Error(`Confianza insuficiente: ${(faceVerification.confidence * 100).toFixed(1)}%. Se requiere mínimo ${(CONFIDENCE_THRESHOLD * 100)}% para registrar asistencia.`);
-            }
-            
-            console.log(`✅ Rostro verificado con confianza ${(faceVerification.confidence * 100).toFixed(1)}%, marcando asistencia...`);
+            // Una sola solicitud: el backend valida ubicación, día laboral y asistencia de hoy
+            // antes de verificar el rostro, y exige el umbral de confianza para registrar
+            const response = await api.post('/attendance/verify_and_mark/', {
+                employee_id: employeeId,
+                area_id: areaId,
+                latitude: latitude,
+                longitude: longitude,
+                photo: photoBase64
+            }, {
+                headers: this.getAuthHeaders()
+            });
             
-            // Si el rostro es verificado y cumple el umbral, marcar asistencia
-            const attendance = await this.markAttendance(employeeId, areaId, latitude, longitude, true);
+            const attendance = response.data;
+            console.log(`✅ Rostro verificado con confianza ${(attendance.confidence * 100).toFixed(1)}% (umbral ${(CONFIDENCE_THRESHOLD * 100).toFixed(0)}%)`);
             
             return {
                 success: true,
                 faceVerified: true,
-                confidence: faceVerification.confidence,
+                confidence: attendance.confidence,
                 attendance: attendance,
                 message: 'Asistencia marcada exitosamente con verificación facial'
             };
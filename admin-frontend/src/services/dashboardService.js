@@ -14,6 +14,11 @@ export const dashboardService = {
   async getRecentActivity() {
     const response = await api.get('/dashboard/recent_activity/')
     return response.data
+  },
+  
+  async getAreaSummary(params = {}) {
+    const response = await api.get('/dashboard/area_summary/', { params })
+    return response.data
   }
 }
 
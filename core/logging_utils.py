@@ -0,0 +1,88 @@
+"""
+Utilidades de logging para las rutas calientes (asistencia y sistema facial)
+
+- ``summarize_payload`` resume request.data sin volcar fotos en base64 ni archivos.
+- El log DEBUG del logger ``core`` se muestrea por solicitud: DebugLogSamplingMiddleware
+  decide al inicio de cada solicitud si sus mensajes DEBUG se emiten
+  (CORE_DEBUG_SAMPLE_RATE o la cabecera ``X-Debug-Log: 1``) y SampledDebugFilter descarta
+  los de las solicitudes no muestreadas. Fuera de una solicitud (comandos, trabajos en
+  segundo plano) solo cuenta el nivel del logger.
+- ``debug_enabled`` permite saltar el trabajo de armar un mensaje DEBUG (consultas,
+  resúmenes) cuando no se va a emitir.
+"""
+
+import contextvars
+import logging
+
+# None = fuera de una solicitud
+_debug_sampled = contextvars.ContextVar('core_debug_sampled', default=None)
+
+MAX_VALUE_CHARS = 80
+MAX_ITEMS = 20
+
+
+def set_debug_sampled(sampled):
+    """Marca la solicitud en curso como muestreada (o no); devuelve el token para restaurar"""
+    return _debug_sampled.set(sampled)
+
+
+def reset_debug_sampled(token):
+    _debug_sampled.reset(token)
+
+
+def debug_enabled(logger):
+    """True si un logger.debug(...) de este contexto llegaría a emitirse"""
+    return logger.isEnabledFor(logging.DEBUG) and _debug_sampled.get() is not False
+
+
+class SampledDebugFilter(logging.Filter):
+    """Descarta los registros DEBUG de las solicitudes que no fueron muestreadas"""
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or _debug_sampled.get() is not False
+
+
+def _summarize_value(value):
+    if hasattr(value, 'size') and hasattr(value, 'name') and hasattr(value, 'read'):
+        # Archivo subido
+        return f'<archivo {value.name!r} {value.size} bytes>'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, str):
+        if value.startswith('data:') and ';base64,' in value[:64]:
+            return f"<{value[5:value.index(';')]} base64 {len(value)} caracteres>"
+        if len(value) > MAX_VALUE_CHARS:
+            return f'<texto {len(value)} caracteres: {value[:24]!r}...>'
+        return value
+    if isinstance(value, dict):
+        return summarize_payload(value)
+    if isinstance(value, (list, tuple)):
+        items = [_summarize_value(item) for item in value[:3]]
+        if len(value) > 3:
+            items.append(f'... ({len(value)} elementos)')
+        return items
+    return value
+
+
+def summarize_payload(data):
+    """
+    Resumen de un payload apto para el log
+
+    Los valores largos (fotos en base64, archivos, listas de fotos) se reemplazan por
+    su tipo y tamaño; solo se incluyen las primeras MAX_ITEMS claves.
+
+    Args:
+        data: request.data (dict, QueryDict) u otro valor
+
+    Returns:
+        dict (o valor) con el mismo formato pero de tamaño acotado
+    """
+    if hasattr(data, 'lists'):
+        # QueryDict: conservar todas las fotos de un campo repetido
+        data = {key: values if len(values) > 1 else values[0] for key, values in data.lists()}
+    if not isinstance(data, dict):
+        return _summarize_value(data)
+    summary = {key: _summarize_value(value) for key, value in list(data.items())[:MAX_ITEMS]}
+    if len(data) > MAX_ITEMS:
+        summary['...'] = f'{len(data) - MAX_ITEMS} claves más'
+    return summary
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from core.signals import auto_process_all_incomplete_attendances
+from core.services.day_close import close_incomplete_attendances, close_pending_days
 from datetime import date, timedelta
 
 
@@ -22,7 +22,7 @@ class Command(BaseCommand):
             '--days',
             type=int,
             default=7,
-            help='Número de días hacia atrás para procesar (por defecto: 7)'
+            help='Días hacia atrás a cerrar si nunca se cerró un día (por defecto: 7)'
         )
 
     def handle(self, *args, **options):
@@ -31,10 +31,17 @@ class Command(BaseCommand):
             self.stdout.write("🤖 MODO AUTOMÁTICO: Procesando asistencias incompletas...")
             
             try:
-                auto_process_all_incomplete_attendances()
+                # Cierra los días posteriores a la marca "cerrado hasta" (idempotente)
+                result = close_pending_days(lookback_days=options['days'])
+                if result['days']:
+                    self.stdout.write(
+                        f"   📅 Días cerrados: {result['days'][0]} a {result['days'][-1]} "
+                        f"({result['updated']} asistencias marcadas como ausentes)"
+                    )
                 self.stdout.write(
                     self.style.SUCCESS(
-                        "✅ Procesamiento automático completado exitosamente"
+                        f"✅ Procesamiento automático completado: {result['updated']} asistencias "
+                        f"marcadas como ausentes (cerrado hasta {result['closed_through']})"
                     )
                 )
             except Exception as e:
@@ -51,12 +58,12 @@ class Command(BaseCommand):
                 target_date = date.fromisoformat(options['date'])
                 self.stdout.write(f"📅 Procesando fecha específica: {target_date}")
                 
-                from core.signals import process_incomplete_attendance_for_date
-                process_incomplete_attendance_for_date(target_date)
+                result = close_incomplete_attendances(target_date, source='manual')
                 
                 self.stdout.write(
                     self.style.SUCCESS(
-                        f"✅ Procesamiento completado para {target_date}"
+                        f"✅ Procesamiento completado para {target_date}: "
+                        f"{result['updated']} asistencias marcadas como ausentes"
                     )
                 )
                 
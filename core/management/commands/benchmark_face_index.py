@@ -0,0 +1,140 @@
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from core.services.benchmark import latency_summary
+from core.services.face_paths import FACES_DIR, ensure_face_recognition_path
+
+ensure_face_recognition_path()
+from embedding_index import EmbeddingIndex  # noqa: E402
+
+
+class Command(BaseCommand):
+    help = 'Comparar recall y latencia del índice aproximado (IVF) contra la búsqueda exacta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=500,
+            help='Número de consultas (por defecto: 500)'
+        )
+        parser.add_argument(
+            '--nprobe',
+            type=int,
+            nargs='+',
+            default=[1, 2, 4, 8, 16, 32],
+            help='Valores de nprobe a evaluar'
+        )
+        parser.add_argument(
+            '--nlist',
+            type=int,
+            default=None,
+            help='Número de listas IVF (por defecto ~4·√N)'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=1,
+            help='Candidatos por consulta; el recall se mide sobre estas personas (por defecto: 1)'
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help='Usar N personas sintéticas en lugar de los datos de faces/'
+        )
+        parser.add_argument(
+            '--templates',
+            type=int,
+            default=5,
+            help='Embeddings por persona sintética (por defecto: 5)'
+        )
+        parser.add_argument(
+            '--noise',
+            type=float,
+            default=0.5,
+            help='Ruido de las consultas respecto al embedding original (por defecto: 0.5)'
+        )
+        parser.add_argument(
+            '--json',
+            type=str,
+            default=None,
+            help="Guardar los resultados en un archivo JSON ('-' para stdout)"
+        )
+
+    def _synthetic_data(self, persons, templates, dim=128, seed=0):
+        """Personas sintéticas: un centro por persona y variaciones alrededor"""
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(size=(persons, dim)).astype(np.float32)
+        matrix = np.repeat(centers, templates, axis=0)
+        matrix += rng.normal(scale=0.35, size=matrix.shape).astype(np.float32)
+        labels = np.repeat(np.arange(persons).astype(str), templates)
+        return matrix, labels
+
+    def handle(self, *args, **options):
+        index = EmbeddingIndex(FACES_DIR, mode='ivf', ivf_min_size=0)
+        if options['synthetic']:
+            matrix, labels = self._synthetic_data(options['synthetic'], options['templates'])
+            index.load_arrays(matrix, labels)
+            source = f"sintético ({options['synthetic']} personas x {options['templates']})"
+        else:
+            index.ensure_loaded()
+            source = FACES_DIR
+
+        if not len(index):
+            self.stdout.write(self.style.ERROR("❌ No hay embeddings para evaluar (use --synthetic N)"))
+            return
+
+        self.stdout.write(f"📊 Benchmark del índice facial: {len(index)} embeddings, origen {source}")
+        started = time.perf_counter()
+        stats = index.rebuild_ivf(nlist=options['nlist'])
+        self.stdout.write(f"   🔧 IVF entrenado en {time.perf_counter() - started:.2f}s: {stats['nlist']} listas")
+
+        # Consultas: embeddings registrados con ruido, como una captura nueva del mismo rostro
+        rng = np.random.default_rng(1)
+        stored = index._state['matrix']
+        rows = rng.integers(0, len(stored), size=options['queries'])
+        queries = stored[rows] + rng.normal(scale=options['noise'] / np.sqrt(stored.shape[1]), size=(len(rows), stored.shape[1]))
+        top_k = max(1, options['top_k'])
+
+        def run(mode, nprobe=None):
+            latencies = []
+            results = []
+            for query in queries:
+                t0 = time.perf_counter()
+                matches = index.search(query, top_k=top_k, mode=mode, nprobe=nprobe)
+                latencies.append(time.perf_counter() - t0)
+                results.append([label for label, _ in matches])
+            return results, latency_summary(latencies)
+
+        exact_results, exact_latency = run('exact')
+        report = {
+            'embeddings': len(index),
+            'persons': int(len(index._state['persons'])),
+            'nlist': stats['nlist'],
+            'queries': len(queries),
+            'top_k': top_k,
+            'exact': exact_latency,
+            'ivf': [],
+        }
+        self.stdout.write(f"   {'modo':<12}{'recall':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        self.stdout.write(f"   {'exacto':<12}{1.0:>8.3f}{exact_latency['p50_ms']:>10.3f}{exact_latency['p99_ms']:>10.3f}")
+
+        for nprobe in options['nprobe']:
+            ivf_results, ivf_latency = run('ivf', nprobe)
+            hits = sum(len(set(a) & set(e)) for a, e in zip(ivf_results, exact_results))
+            recall = hits / max(1, sum(len(e) for e in exact_results))
+            report['ivf'].append({'nprobe': nprobe, 'recall': round(recall, 4), **ivf_latency})
+            self.stdout.write(f"   {f'ivf/{nprobe}':<12}{recall:>8.3f}{ivf_latency['p50_ms']:>10.3f}{ivf_latency['p99_ms']:>10.3f}")
+
+        if options['json']:
+            payload = json.dumps(report, indent=2)
+            if options['json'] == '-':
+                self.stdout.write(payload)
+            else:
+                with open(options['json'], 'w') as json_file:
+                    json_file.write(payload)
+                self.stdout.write(f"   💾 Resultados guardados en {options['json']}")
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark completado"))
@@ -0,0 +1,349 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core.services.benchmark import run_concurrent
+from core.services.face_paths import ensure_face_recognition_path
+
+ensure_face_recognition_path()
+from batched_inference import BatchedEmbedder  # noqa: E402
+from embedding_index import EmbeddingIndex  # noqa: E402
+from face_detector import FaceDetector  # noqa: E402
+from face_quality import FaceQualityGate  # noqa: E402
+from image_pipeline import crop_face, decode_image, fit_to_input  # noqa: E402
+from template_compaction import compact_templates, verify_with_templates  # noqa: E402
+
+STAGES = ['decode', 'detect', 'quality', 'embed', 'match']
+SCENARIOS = ['register', 'verify', 'identify']
+
+
+class Command(BaseCommand):
+    help = 'Medir latencia y throughput del flujo facial por etapa y de extremo a extremo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--images',
+            type=str,
+            default=None,
+            help='Carpeta con fotos reales (una subcarpeta por persona o archivos sueltos)'
+        )
+        parser.add_argument(
+            '--persons',
+            type=int,
+            default=8,
+            help='Personas sintéticas si no se usa --images (por defecto: 8)'
+        )
+        parser.add_argument(
+            '--photos',
+            type=int,
+            default=5,
+            help='Fotos sintéticas por persona (por defecto: 5)'
+        )
+        parser.add_argument(
+            '--resolution',
+            type=str,
+            default='1280x960',
+            help='Resolución de las fotos sintéticas, ANCHOxALTO (por defecto: 1280x960)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 4, 16],
+            help='Llamadores concurrentes a evaluar (por defecto: 1 4 16)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Llamadas por llamador en cada etapa y escenario (por defecto: 20)'
+        )
+        parser.add_argument(
+            '--register-iterations',
+            type=int,
+            default=2,
+            help='Registros por llamador en el escenario register (por defecto: 2)'
+        )
+        parser.add_argument(
+            '--stages',
+            nargs='*',
+            choices=STAGES,
+            default=STAGES,
+            help='Etapas a medir por separado'
+        )
+        parser.add_argument(
+            '--scenarios',
+            nargs='*',
+            choices=SCENARIOS,
+            default=SCENARIOS,
+            help='Escenarios de extremo a extremo (requieren el sistema facial)'
+        )
+        parser.add_argument(
+            '--index-persons',
+            type=int,
+            default=1000,
+            help='Personas sintéticas en el índice de la etapa match (por defecto: 1000)'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Mostrar los mensajes del servicio facial durante las mediciones'
+        )
+        parser.add_argument(
+            '--json',
+            type=str,
+            default=None,
+            help="Guardar los resultados en un archivo JSON ('-' para stdout)"
+        )
+
+    # ------------------------------------------------------------------ datos
+
+    def _synthetic_photos(self, persons, photos, resolution, seed=0):
+        """Fotos JPEG sintéticas: un 'rostro' por persona con variaciones por foto"""
+        width, height = (int(v) for v in resolution.lower().split('x'))
+        rng = np.random.default_rng(seed)
+        dataset = {}
+        for person in range(persons):
+            skin = rng.integers(90, 220, size=3)
+            face_w = int(width * rng.uniform(0.18, 0.26))
+            face_h = int(face_w * rng.uniform(1.2, 1.4))
+            images = []
+            for _ in range(photos):
+                frame = rng.normal(110, 25, size=(height, width, 3)).clip(0, 255).astype(np.uint8)
+                frame = cv2.GaussianBlur(frame, (0, 0), 3)
+                cx = int(width / 2 + rng.normal(0, width * 0.03))
+                cy = int(height / 2 + rng.normal(0, height * 0.03))
+                cv2.ellipse(frame, (cx, cy), (face_w // 2, face_h // 2), 0, 0, 360, skin.tolist(), -1)
+                for dx in (-1, 1):
+                    cv2.circle(frame, (cx + dx * face_w // 5, cy - face_h // 8), max(3, face_w // 14), (40, 30, 30), -1)
+                cv2.ellipse(frame, (cx, cy + face_h // 4), (face_w // 5, face_h // 16), 0, 0, 180, (60, 40, 120), -1)
+                frame = np.clip(frame + rng.normal(0, 6, size=frame.shape), 0, 255).astype(np.uint8)
+                images.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+            dataset[f'sintetico_{person}'] = images
+        return dataset
+
+    def _load_photos(self, folder):
+        """Fotos reales agrupadas por subcarpeta (persona)"""
+        dataset = {}
+        for path in sorted(glob.glob(os.path.join(folder, '**', '*'), recursive=True)):
+            if os.path.splitext(path)[1].lower() not in ('.jpg', '.jpeg', '.png'):
+                continue
+            person = os.path.relpath(os.path.dirname(path), folder) or 'fotos'
+            with open(path, 'rb') as image_file:
+                dataset.setdefault(person, []).append(image_file.read())
+        return dataset
+
+    # ------------------------------------------------------------------ medición
+
+    def _measure(self, name, func, inputs, options, iterations=None):
+        runs = []
+        for concurrency in options['concurrency']:
+            summary = run_concurrent(func, inputs, concurrency, iterations or options['iterations'])
+            runs.append(summary)
+            self.stdout.write(
+                f"   {name:<14}{concurrency:>4}{summary['p50_ms']:>11.2f}{summary['p95_ms']:>11.2f}"
+                f"{summary['p99_ms']:>11.2f}{summary['throughput_per_s']:>10.1f}{summary['errors']:>8}"
+            )
+        return runs
+
+    def _header(self, title):
+        self.stdout.write(f"\n📊 {title}")
+        self.stdout.write(f"   {'etapa':<14}{'conc':>4}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>10}{'errores':>8}")
+
+    def _stages(self, dataset, options, report):
+        max_side = getattr(settings, 'FACE_DECODE_MAX_SIDE', 640)
+        encoded = [data for images in dataset.values() for data in images]
+        frames = [decode_image(data, max_side=max_side) for data in encoded]
+        frames = [frame for frame in frames if frame is not None]
+        if not frames:
+            raise ValueError('Ninguna foto se pudo decodificar')
+
+        detector = FaceDetector(
+            tiers=getattr(settings, 'FACE_DETECTOR_TIERS', ['haar', 'retinaface']),
+            budget_ms=getattr(settings, 'FACE_DETECTOR_BUDGET_MS', 800),
+            haar_max_side=getattr(settings, 'FACE_DETECTOR_HAAR_MAX_SIDE', 480),
+            retinaface_max_side=getattr(settings, 'FACE_DETECTOR_RETINAFACE_MAX_SIDE', 640),
+            probe_every=getattr(settings, 'FACE_DETECTOR_PROBE_EVERY', 20),
+        )
+        crops = []
+        for frame in frames:
+            faces, _ = detector.detect(frame)
+            crop = crop_face(frame, faces[0]) if faces else None
+            crops.append(frame if crop is None else crop)
+        detector.reset_stats()
+        model_name = 'Facenet'
+        fitted = [fit_to_input(crop, (160, 160)) for crop in crops]
+
+        self._header('Etapas por separado')
+        stages = report['stages']
+        if 'decode' in options['stages']:
+            stages['decode'] = self._measure('decode', lambda data: decode_image(data, max_side=max_side), encoded, options)
+        if 'detect' in options['stages']:
+            stages['detect'] = self._measure('detect', detector.detect, frames, options)
+            report['detector'] = detector.stats()
+        if 'quality' in options['stages']:
+            gate = FaceQualityGate(**getattr(settings, 'FACE_QUALITY_THRESHOLDS', {}))
+            stages['quality'] = self._measure('quality', gate.check, crops, options)
+        if 'embed' in options['stages']:
+            embedder = BatchedEmbedder(model_name, batch_size=getattr(settings, 'FACE_EMBEDDING_BATCH_SIZE', 32))
+            try:
+                embedder.embed(fitted[:1])
+            except Exception as e:
+                report['skipped']['embed'] = f'Modelo {model_name} no disponible: {e}'
+                self.stdout.write(self.style.WARNING(f"   ⚠️ embed omitido: {report['skipped']['embed']}"))
+            else:
+                stages['embed'] = self._measure('embed', lambda crop: embedder.embed([crop]), fitted, options)
+                batch = (fitted * (embedder.batch_size // len(fitted) + 1))[:embedder.batch_size]
+                stages['embed_batch'] = self._measure('embed_batch', embedder.embed, [batch], options, iterations=max(1, options['iterations'] // 4))
+        if 'match' in options['stages']:
+            stages.update(self._match_stages(options))
+
+    def _match_stages(self, options, dim=128, templates=5):
+        """Búsqueda 1:N en el índice y verificación 1:1 con plantillas compactas"""
+        rng = np.random.default_rng(1)
+        persons = max(1, options['index_persons'])
+        centers = rng.normal(size=(persons, dim)).astype(np.float32)
+        matrix = np.repeat(centers, templates, axis=0) + rng.normal(scale=0.35, size=(persons * templates, dim)).astype(np.float32)
+        labels = np.repeat(np.arange(persons).astype(str), templates)
+        probes = [centers[i] + rng.normal(scale=0.35, size=dim).astype(np.float32) for i in rng.integers(0, persons, 64)]
+
+        index = EmbeddingIndex(
+            mode=getattr(settings, 'FACE_INDEX_MODE', 'exact'),
+            nprobe=getattr(settings, 'FACE_IVF_NPROBE', 8),
+            ivf_min_size=getattr(settings, 'FACE_IVF_MIN_SIZE', 2000),
+        )
+        index.load_arrays(matrix, labels)
+        if index.mode == 'ivf':
+            index.rebuild_ivf()
+
+        full = matrix[:templates]
+        compact = compact_templates(full, medoids=getattr(settings, 'FACE_TEMPLATE_MEDOIDS', 4))
+        margin = getattr(settings, 'FACE_TEMPLATE_MARGIN', 0.05)
+
+        return {
+            'match_1n': self._measure('match_1n', lambda probe: index.search(probe, top_k=5), probes, options),
+            'match_1to1': self._measure(
+                'match_1to1', lambda probe: verify_with_templates(probe, compact, lambda: full, 0.9, margin), probes, options
+            ),
+        }
+
+    def _end_to_end(self, dataset, options, report):
+        """Escenarios completos del servicio sobre una base de datos y faces/ temporales"""
+        from django.contrib.auth import get_user_model
+        from core.models import Employee
+        from core.services.face_service import FaceRecognitionService
+
+        base_dir = tempfile.mkdtemp(prefix='face-benchmark-')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            service = FaceRecognitionService(base_dir=base_dir)
+            if not service.facial_system:
+                for scenario in options['scenarios']:
+                    report['skipped'][scenario] = 'Sistema de reconocimiento facial no disponible'
+                self.stdout.write(self.style.WARNING("   ⚠️ Escenarios omitidos: sistema facial no disponible"))
+                return
+            # Sin caché por contenido: cada llamada hace el trabajo completo
+            service.facial_system.cache.max_bytes = 0
+
+            User = get_user_model()
+            employees = {}
+            for i, person in enumerate(dataset):
+                user = User.objects.create_user(username=f'benchmark_{i}', password=None, first_name=person)
+                employees[person] = Employee.objects.create(user=user, employee_id=900000 + i)
+
+            def checked(result):
+                if not result.get('success'):
+                    raise RuntimeError(result.get('message') or result.get('error') or 'sin éxito')
+                return result
+
+            registrations = [(employees[person], images) for person, images in dataset.items()]
+            probes = [(employees[person], image) for person, images in dataset.items() for image in images]
+            max_side = getattr(settings, 'FACE_DECODE_MAX_SIDE', 640)
+            frames = [decode_image(image, max_side=max_side) for _, image in probes]
+
+            self._header('Extremo a extremo')
+            scenarios = report['end_to_end']
+            if 'register' in options['scenarios']:
+                scenarios['register'] = self._measure(
+                    'register', lambda item: checked(service.register_or_update_employee_face(*item)),
+                    registrations, options, iterations=options['register_iterations']
+                )
+            else:
+                for employee, images in registrations:
+                    service.register_or_update_employee_face(employee, images)
+
+            if 'verify' in options['scenarios']:
+                scenarios['verify'] = self._measure(
+                    'verify', lambda item: checked(service.verify_face(*item)), probes, options
+                )
+            if 'identify' in options['scenarios']:
+                scenarios['identify'] = self._measure(
+                    'identify', lambda frame: checked(service.facial_system.identify_person(frame)), frames, options
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    def handle(self, *args, **options):
+        if options['images']:
+            dataset = self._load_photos(options['images'])
+            source = options['images']
+        else:
+            dataset = self._synthetic_photos(options['persons'], options['photos'], options['resolution'])
+            source = f"sintético ({options['persons']} personas x {options['photos']} fotos, {options['resolution']})"
+
+        if not dataset:
+            self.stdout.write(self.style.ERROR("❌ No hay fotos para el benchmark"))
+            return
+
+        photos = sum(len(images) for images in dataset.values())
+        self.stdout.write(f"🚀 Benchmark del flujo facial: {photos} fotos de {len(dataset)} personas, origen {source}")
+        report = {
+            'config': {
+                'source': source,
+                'persons': len(dataset),
+                'photos': photos,
+                'concurrency': options['concurrency'],
+                'iterations': options['iterations'],
+                'decode_max_side': getattr(settings, 'FACE_DECODE_MAX_SIDE', 640),
+                'detector_tiers': getattr(settings, 'FACE_DETECTOR_TIERS', ['haar', 'retinaface']),
+                'index_mode': getattr(settings, 'FACE_INDEX_MODE', 'exact'),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'stages': {},
+            'end_to_end': {},
+            'skipped': {},
+        }
+
+        # Los mensajes del servicio facial (logger core) se limitan a advertencias salvo con --verbose
+        core_logger = logging.getLogger('core')
+        previous_level = core_logger.level
+        if not options['verbose']:
+            core_logger.setLevel(logging.WARNING)
+        try:
+            if options['stages']:
+                self._stages(dataset, options, report)
+            if options['scenarios']:
+                self._end_to_end(dataset, options, report)
+        finally:
+            core_logger.setLevel(previous_level)
+
+        if options['json']:
+            payload = json.dumps(report, indent=2, default=str)
+            if options['json'] == '-':
+                self.stdout.write(payload)
+            else:
+                with open(options['json'], 'w') as json_file:
+                    json_file.write(payload)
+                self.stdout.write(f"   💾 Resultados guardados en {options['json']}")
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark completado"))
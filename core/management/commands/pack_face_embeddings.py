@@ -0,0 +1,94 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.services.face_paths import FACES_DIR, ensure_face_recognition_path
+
+ensure_face_recognition_path()
+from embedding_store import _legacy_files, load_person_embeddings, pack_person_folder  # noqa: E402
+
+
+class Command(BaseCommand):
+    help = ('Convertir los embeddings .npy sueltos de cada empleado a un único archivo empaquetado '
+            'y agregar el conjunto compacto de verificación a los archivos que no lo tienen')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            type=str,
+            default=None,
+            help='Modelo de los embeddings (por defecto se infiere por la dimensión)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar qué carpetas se convertirían'
+        )
+        parser.add_argument(
+            '--keep-legacy',
+            action='store_true',
+            help='No eliminar los archivos .npy después de convertir'
+        )
+        parser.add_argument(
+            '--medoids',
+            type=int,
+            default=getattr(settings, 'FACE_TEMPLATE_MEDOIDS', 4),
+            help='Medoides del conjunto compacto por empleado'
+        )
+
+    def handle(self, *args, **options):
+        model_name = options['model']
+        dry_run = options['dry_run']
+        keep_legacy = options['keep_legacy']
+
+        if not os.path.isdir(FACES_DIR):
+            self.stdout.write(self.style.ERROR(f"❌ Directorio de rostros no encontrado: {FACES_DIR}"))
+            return
+
+        self.stdout.write(f"📦 Empaquetando embeddings en {FACES_DIR}...")
+        if dry_run:
+            self.stdout.write("🔍 Modo simulación: no se modificará ningún archivo")
+
+        packed_folders = 0
+        packed_embeddings = 0
+        errors = 0
+
+        for folder in sorted(os.listdir(FACES_DIR)):
+            folder_path = os.path.join(FACES_DIR, folder)
+            if not os.path.isdir(folder_path):
+                continue
+
+            legacy = _legacy_files(folder_path)
+            if not legacy:
+                _, header = load_person_embeddings(folder_path)
+                if header.get('legacy') or header.get('compact'):
+                    continue
+
+            if dry_run:
+                pending = f"{len(legacy)} archivos .npy" if legacy else "sin conjunto compacto"
+                self.stdout.write(f"   📁 {folder}: {pending}")
+                packed_folders += 1
+                packed_embeddings += len(legacy)
+                continue
+
+            try:
+                total = pack_person_folder(
+                    folder_path,
+                    model_name=model_name,
+                    remove_legacy=not keep_legacy,
+                    medoids=options['medoids']
+                )
+                packed_folders += 1
+                packed_embeddings += len(legacy)
+                if legacy:
+                    self.stdout.write(f"   ✅ {folder}: {len(legacy)} archivos .npy → {total} embeddings empaquetados")
+                else:
+                    self.stdout.write(f"   ✅ {folder}: conjunto compacto generado ({total} embeddings)")
+            except Exception as e:
+                errors += 1
+                self.stdout.write(self.style.ERROR(f"   ❌ Error empaquetando {folder}: {e}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Empaquetado completado. {packed_folders} carpetas, {packed_embeddings} embeddings, {errors} errores."
+            )
+        )
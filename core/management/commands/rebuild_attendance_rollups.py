@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from core.services.attendance_rollup import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Regenerar los resúmenes diarios de asistencia (DailyAttendanceRollup) de un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=str,
+            default=None,
+            help='Primera fecha (YYYY-MM-DD, por defecto: sin límite)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=str,
+            default=None,
+            help='Última fecha (YYYY-MM-DD, por defecto: sin límite)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from']) if options['date_from'] else None
+            date_to = date.fromisoformat(options['date_to']) if options['date_to'] else None
+        except ValueError:
+            raise CommandError('Formato de fecha inválido. Use YYYY-MM-DD')
+
+        self.stdout.write(f"🔄 Regenerando resúmenes diarios ({date_from or 'inicio'} a {date_to or 'hoy'})...")
+        written = rebuild_rollups(date_from, date_to)
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ Resúmenes regenerados. {written} filas (fecha, área, estado) escritas.")
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from core.services.face_index import build_embedding_index
+
+
+class Command(BaseCommand):
+    help = 'Re-entrenar los centroides del índice aproximado (IVF) de identificación facial'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--nlist',
+            type=int,
+            default=None,
+            help='Número de listas IVF (por defecto ~4·√N)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=10,
+            help='Iteraciones de k-means (por defecto: 10)'
+        )
+
+    def handle(self, *args, **options):
+        index = build_embedding_index()
+        index.ensure_loaded()
+
+        if not len(index):
+            self.stdout.write(self.style.ERROR("❌ No hay embeddings registrados para construir el índice"))
+            return
+
+        self.stdout.write(f"🔄 Entrenando índice IVF con {len(index)} embeddings...")
+        try:
+            stats = index.rebuild_ivf(nlist=options['nlist'], iterations=options['iterations'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"❌ Error reconstruyendo el índice: {e}"))
+            return
+
+        self.stdout.write(f"   📊 Listas: {stats['nlist']} (vacías: {stats['empty_lists']}, mayor: {stats['largest_list']} embeddings)")
+        self.stdout.write(f"   💾 Centroides guardados en {index.centroids_path}")
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ Índice reconstruido. {stats['embeddings']} embeddings indexados.")
+        )
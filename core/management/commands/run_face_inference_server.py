@@ -0,0 +1,72 @@
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.services.face_inference import inference_address, inference_authkey
+from core.services.face_paths import ensure_face_recognition_path
+
+ensure_face_recognition_path()
+from inference_server import InferenceServer  # noqa: E402
+
+
+class Command(BaseCommand):
+    help = 'Iniciar el servidor local de inferencia facial con micro-batching'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address',
+            type=str,
+            default=None,
+            help='Ruta del socket Unix o host:puerto (por defecto FACE_INFERENCE_SERVER)'
+        )
+        parser.add_argument(
+            '--model',
+            type=str,
+            default='Facenet',
+            help='Modelo de DeepFace (por defecto: Facenet)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'FACE_EMBEDDING_BATCH_SIZE', 32),
+            help='Máximo de rostros por forward'
+        )
+        parser.add_argument(
+            '--window-ms',
+            type=float,
+            default=getattr(settings, 'FACE_INFERENCE_WINDOW_MS', 5.0),
+            help='Ventana para agrupar solicitudes concurrentes (ms)'
+        )
+
+    def handle(self, *args, **options):
+        address = options['address'] or inference_address()
+        if not address:
+            self.stdout.write(self.style.ERROR("❌ Configure FACE_INFERENCE_SERVER o use --address"))
+            return
+
+        server = InferenceServer(
+            address,
+            inference_authkey(),
+            model_name=options['model'],
+            batch_size=options['batch_size'],
+            window_ms=options['window_ms']
+        )
+
+        self.stdout.write(f"🚀 Cargando modelo {options['model']}...")
+        try:
+            server.warm_up()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"❌ Error cargando el modelo: {e}"))
+            return
+
+        signal.signal(signal.SIGTERM, lambda *_: server.stop())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Servidor de inferencia escuchando en {address} "
+                f"(lotes de {options['batch_size']}, ventana {options['window_ms']} ms)"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+        self.stdout.write(f"🛑 Servidor detenido. Estadísticas: {server.stats}")
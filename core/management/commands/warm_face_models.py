@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from core.services.face_service_singleton import face_service_singleton
+
+
+class Command(BaseCommand):
+    help = 'Cargar explícitamente el sistema facial (DeepFace/TensorFlow) y descargar los pesos si faltan'
+
+    def handle(self, *args, **options):
+        self.stdout.write("🚀 Cargando sistema facial...")
+        started = time.perf_counter()
+        service = face_service_singleton.warm_up()
+        elapsed = time.perf_counter() - started
+
+        if service is None:
+            self.stdout.write(self.style.ERROR(f"❌ Sistema facial no disponible ({elapsed:.1f}s)"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Sistema facial listo en {elapsed:.1f}s"))
@@ -1,9 +1,15 @@
+import random
+from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib import messages
 from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 from rest_framework import status
+from .logging_utils import reset_debug_sampled, set_debug_sampled
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ForcePasswordChangeMiddleware(MiddlewareMixin):
     """
@@ -70,3 +76,45 @@ class ForcePasswordChangeMiddleware(MiddlewareMixin):
                 return redirect('admin:password_change')
         
         return None
+
+
+class DebugLogSamplingMiddleware:
+    """
+    Decide por solicitud si se emiten sus mensajes DEBUG del logger core
+    (ver core/logging_utils.py)
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        rate = getattr(settings, 'CORE_DEBUG_SAMPLE_RATE', 1.0)
+        sampled = rate >= 1.0 or random.random() < rate
+        if request.headers.get('X-Debug-Log', '').lower() in ('1', 'true', 'yes'):
+            sampled = True
+        token = set_debug_sampled(sampled)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_debug_sampled(token)
+
+
+class DayCloseMiddleware:
+    """
+    Cierra los días de asistencia pendientes en la primera solicitud después de
+    medianoche (ver core/services/day_close.py); el resto de las solicitudes solo
+    compara la fecha con la marca recordada en el proceso
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if getattr(settings, 'ATTENDANCE_CLOSE_ON_REQUEST', True):
+            from .services.day_close import ensure_days_closed
+            try:
+                ensure_days_closed()
+            except Exception:
+                # Un fallo al cerrar días no debe tumbar la solicitud; se reintenta en la siguiente
+                logger.exception("No se pudieron cerrar los días de asistencia pendientes")
+        return self.get_response(request)
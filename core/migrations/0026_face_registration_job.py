@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 20:21
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_auto_20250826_2158'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaceRegistrationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'Procesando'), ('completed', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=20, verbose_name='Estado')),
+                ('payload_path', models.CharField(blank=True, max_length=255, verbose_name='Archivo de Fotos')),
+                ('total_photos', models.IntegerField(default=0, verbose_name='Fotos Recibidas')),
+                ('processed_photos', models.IntegerField(default=0, verbose_name='Fotos Procesadas')),
+                ('saved_photos', models.IntegerField(default=0, verbose_name='Fotos Guardadas')),
+                ('rejected_photos', models.IntegerField(default=0, verbose_name='Fotos Rechazadas')),
+                ('message', models.TextField(blank=True, verbose_name='Mensaje')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='face_registration_jobs', to='core.employee')),
+            ],
+            options={
+                'verbose_name': 'Registro Facial en Proceso',
+                'verbose_name_plural': 'Registros Faciales en Proceso',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
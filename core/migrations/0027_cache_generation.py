@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_face_registration_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True, verbose_name='Caché')),
+                ('generation', models.PositiveBigIntegerField(default=0, verbose_name='Generación')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Generación de Caché',
+                'verbose_name_plural': 'Generaciones de Caché',
+            },
+        ),
+    ]
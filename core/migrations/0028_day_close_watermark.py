@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_cache_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayCloseWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(default='attendance', max_length=50, unique=True, verbose_name='Proceso')),
+                ('closed_through', models.DateField(blank=True, null=True, verbose_name='Cerrado Hasta')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Cierre de Días',
+                'verbose_name_plural': 'Cierres de Días',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_day_close_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceCloseAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('previous_status', models.CharField(choices=[('present', 'Presente'), ('late', 'Llegada Tarde'), ('absent', 'Ausente')], max_length=10, verbose_name='Estado Anterior')),
+                ('new_status', models.CharField(choices=[('present', 'Presente'), ('late', 'Llegada Tarde'), ('absent', 'Ausente')], default='absent', max_length=10, verbose_name='Estado Nuevo')),
+                ('source', models.CharField(choices=[('auto', 'Cierre Automático'), ('manual', 'Cierre Manual')], default='auto', max_length=10, verbose_name='Origen')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attendance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='close_audits', to='core.attendance', verbose_name='Asistencia')),
+            ],
+            options={
+                'verbose_name': 'Cierre de Asistencia',
+                'verbose_name_plural': 'Cierres de Asistencias',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_attendance_close_audit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('status', models.CharField(choices=[('present', 'Presente'), ('late', 'Llegada Tarde'), ('absent', 'Ausente')], max_length=10, verbose_name='Estado')),
+                ('attendance_count', models.IntegerField(default=0, verbose_name='Asistencias')),
+                ('late_minutes', models.IntegerField(default=0, verbose_name='Minutos de Tardanza')),
+                ('worked_minutes', models.IntegerField(default=0, verbose_name='Minutos Trabajados')),
+                ('area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_rollups', to='core.area', verbose_name='Área de Trabajo')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Asistencias',
+                'verbose_name_plural': 'Resúmenes Diarios de Asistencias',
+                'ordering': ['date', 'area_id', 'status'],
+                'unique_together': {('date', 'area', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+# Hora límite de Attendance.is_late cuando el área no tiene horario para ese día
+DEFAULT_LATE_AFTER = 8 * 3600 + 30 * 60
+
+
+def seconds_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def backfill_late_minutes_and_rollups(apps, schema_editor):
+    """
+    Calcula Attendance.late_minutes de las asistencias existentes con el horario
+    actual (no se conserva el anterior) y regenera todos los resúmenes diarios
+    """
+    Attendance = apps.get_model('core', 'Attendance')
+    AreaSchedule = apps.get_model('core', 'AreaSchedule')
+    DailyAttendanceRollup = apps.get_model('core', 'DailyAttendanceRollup')
+
+    expected = {}
+    for schedule in AreaSchedule.objects.all():
+        expected[schedule.area_id] = [
+            seconds_of_day(getattr(schedule, f'{day}_start'))
+            if getattr(schedule, f'{day}_active') and getattr(schedule, f'{day}_start') else DEFAULT_LATE_AFTER
+            for day in WEEKDAYS
+        ]
+
+    pending = []
+    for attendance in Attendance.objects.filter(check_in__isnull=False, late_minutes__isnull=True).iterator():
+        start = expected.get(attendance.area_id, [DEFAULT_LATE_AFTER] * 7)[attendance.date.weekday()]
+        attendance.late_minutes = max(0, (seconds_of_day(attendance.check_in) - start) // 60)
+        pending.append(attendance)
+        if len(pending) >= 1000:
+            Attendance.objects.bulk_update(pending, ['late_minutes'])
+            pending = []
+    if pending:
+        Attendance.objects.bulk_update(pending, ['late_minutes'])
+
+    totals = defaultdict(lambda: [0, 0, 0])
+    rows = Attendance.objects.order_by().values_list(
+        'date', 'area_id', 'status', 'check_in', 'check_out', 'late_minutes'
+    )
+    for day, area_id, status, check_in, check_out, late_minutes in rows.iterator():
+        total = totals[(day, area_id, status)]
+        total[0] += 1
+        if status == 'late':
+            total[1] += late_minutes or 0
+        if check_in is not None and check_out is not None:
+            total[2] += max(0, (seconds_of_day(check_out) - seconds_of_day(check_in)) // 60)
+
+    DailyAttendanceRollup.objects.all().delete()
+    DailyAttendanceRollup.objects.bulk_create([
+        DailyAttendanceRollup(
+            date=day, area_id=area_id, status=status,
+            attendance_count=count, late_minutes=late, worked_minutes=worked
+        )
+        for (day, area_id, status), (count, late, worked) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_daily_attendance_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='late_minutes',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Minutos de Tardanza'),
+        ),
+        migrations.RunPython(backfill_late_minutes_and_rollups, migrations.RunPython.noop),
+    ]
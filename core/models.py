@@ -1,10 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+import logging
 import uuid
 from datetime import timedelta, time
 
+logger = logging.getLogger(__name__)
+
 class User(AbstractUser):
     """Usuario base del sistema (Admin o Empleado)"""
     ROLE_CHOICES = [
@@ -353,6 +356,106 @@ class FaceProfile(models.Model):
     def __str__(self):
         return f"Perfil Facial - {self.employee.full_name}"
 
+class FaceRegistrationJob(models.Model):
+    """Trabajo de registro facial procesado en segundo plano"""
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('processing', 'Procesando'),
+        ('completed', 'Completado'),
+        ('failed', 'Fallido'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    employee = models.ForeignKey(
+        Employee,
+        on_delete=models.CASCADE,
+        related_name='face_registration_jobs'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Estado')
+    payload_path = models.CharField(max_length=255, blank=True, verbose_name='Archivo de Fotos')
+    total_photos = models.IntegerField(default=0, verbose_name='Fotos Recibidas')
+    processed_photos = models.IntegerField(default=0, verbose_name='Fotos Procesadas')
+    saved_photos = models.IntegerField(default=0, verbose_name='Fotos Guardadas')
+    rejected_photos = models.IntegerField(default=0, verbose_name='Fotos Rechazadas')
+    message = models.TextField(blank=True, verbose_name='Mensaje')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Registro Facial en Proceso'
+        verbose_name_plural = 'Registros Faciales en Proceso'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Registro facial {self.id} - {self.employee.full_name} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+class AttendanceQuerySet(models.QuerySet):
+    """Consultas de asistencias con el estado efectivo calculado al leer"""
+    
+    @staticmethod
+    def effective_status_expression(now=None):
+        """
+        Expresión SQL del estado efectivo de una asistencia en el momento ``now``
+        
+        Aplica las reglas de Attendance.update_status_dynamically sin escribir: las
+        asistencias de hoy sin entrada pasan a ausente cuando vence la hora límite de
+        su área y las que tienen entrada sin salida a presente cuando pasa la hora de
+        salida, salvo las tardanzas (el save() de update_status_dynamically volvía a
+        clasificar la entrada y las dejaba en 'late'). Los horarios salen de la caché
+        de áreas (ScheduleService).
+        """
+        from django.db.models import Case, CharField, F, Q, Value, When
+        from core.services.schedule_service import ScheduleService
+        
+        today, past_limit, past_end = ScheduleService.effective_status_cutoffs(now)
+        return Case(
+            When(date=today, check_in__isnull=True, area_id__in=past_limit, then=Value('absent')),
+            When(
+                ~Q(status='late'),
+                date=today, check_in__isnull=False, check_out__isnull=True, area_id__in=past_end,
+                then=Value('present')
+            ),
+            default=F('status'),
+            output_field=CharField(),
+        )
+    
+    def with_effective_status(self, now=None):
+        """Anota ``effective_status`` (ver effective_status_expression)"""
+        return self.annotate(effective_status=self.effective_status_expression(now))
+    
+    def persist_effective_status(self, now=None):
+        """
+        Guarda el estado efectivo en las filas donde difiere del almacenado
+        
+        Returns:
+            int: Asistencias actualizadas
+        """
+        from core.services.attendance_rollup import ROLLUP_FIELDS, apply_changes, with_status
+        from core.services.schedule_service import ScheduleService
+        
+        today, past_limit, past_end = ScheduleService.effective_status_cutoffs(now)
+        changed_at = timezone.now()
+        to_absent = self.filter(date=today, check_in__isnull=True, area_id__in=past_limit).exclude(status='absent')
+        to_present = self.filter(
+            date=today, check_in__isnull=False, check_out__isnull=True, area_id__in=past_end
+        ).exclude(status__in=('present', 'late'))
+        with transaction.atomic():
+            # Filas antes del cambio para ajustar los resúmenes diarios en la misma transacción
+            removed, added = [], []
+            for queryset, status in ((to_absent, 'absent'), (to_present, 'present')):
+                rows = list(queryset.select_for_update().order_by().values_list(*ROLLUP_FIELDS))
+                removed.extend(rows)
+                added.extend(with_status(values, status) for values in rows)
+            absent = to_absent.update(status='absent', updated_at=changed_at)
+            present = to_present.update(status='present', updated_at=changed_at)
+            apply_changes(removed, added)
+        return absent + present
+
 class Attendance(models.Model):
     """Registro de asistencia del empleado"""
     STATUS_CHOICES = [
@@ -397,9 +500,14 @@ class Attendance(models.Model):
         verbose_name='Longitud de Entrada'
     )
     face_verified = models.BooleanField(default=False, verbose_name='Rostro Verificado')
+    # Minutos después de la hora de entrada esperada según el horario vigente al
+    # registrar la entrada (None sin entrada); los resúmenes diarios los suman
+    late_minutes = models.PositiveIntegerField(null=True, blank=True, verbose_name='Minutos de Tardanza')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AttendanceQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Asistencia'
         verbose_name_plural = 'Asistencias'
@@ -427,19 +535,19 @@ class Attendance(models.Model):
         
         # Verificar si es un día laboral
         from core.services.schedule_service import ScheduleService
-        if not ScheduleService.is_work_day(self.area, self.date):
+        if not ScheduleService.is_work_day(self.area_id, self.date):
             self.status = 'absent'
             return
         
         # Obtener horarios esperados del área para esta fecha
-        expected_check_in, expected_check_out = ScheduleService.get_expected_times(self.area, self.date)
+        expected_check_in, expected_check_out = ScheduleService.get_expected_times(self.area_id, self.date)
         
         if not expected_check_in:
             # Sin horario definido, mantener status actual
             return
         
         # Obtener período de gracia del área
-        grace_period = ScheduleService.get_grace_period(self.area)
+        grace_period = ScheduleService.get_grace_period(self.area_id)
         
         # Calcular hora límite con tolerancia
         from datetime import datetime, timedelta
@@ -457,15 +565,15 @@ class Attendance(models.Model):
         else:
             self.status = 'present'
         
-        print(f"🔄 Status actualizado para {self.employee.full_name}:")
-        print(f"   - Hora entrada: {self.check_in}")
-        print(f"   - Hora esperada: {expected_check_in}")
-        print(f"   - Hora límite con tolerancia: {limit_time}")
-        print(f"   - Status final: {self.status}")
+        # employee_id y no employee.full_name: el mensaje no debe costar una consulta
+        logger.debug(
+            "Status de asistencia (empleado %s, %s): entrada %s, esperada %s, límite %s → %s",
+            self.employee_id, self.date, self.check_in, expected_check_in, limit_time, self.status
+        )
     
     def update_status_dynamically(self):
         """Actualizar el estado de asistencia dinámicamente basado en la hora actual"""
-        if not self.area or not self.date:
+        if not self.area_id or not self.date:
             return
         
         from core.services.schedule_service import ScheduleService
@@ -473,12 +581,12 @@ class Attendance(models.Model):
         from datetime import datetime, timedelta
         
         # Obtener horarios esperados
-        expected_check_in, expected_check_out = ScheduleService.get_expected_times(self.area, self.date)
+        expected_check_in, expected_check_out = ScheduleService.get_expected_times(self.area_id, self.date)
         if not expected_check_in or not expected_check_out:
             return
         
         # Obtener período de gracia
-        grace_period = ScheduleService.get_grace_period(self.area)
+        grace_period = ScheduleService.get_grace_period(self.area_id)
         
         # Hora actual
         current_time = timezone.localtime().time()
@@ -513,6 +621,15 @@ class Attendance(models.Model):
         if self.check_in and self.check_out:
             return
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores cargados, para ajustar los resúmenes diarios al guardar sin releer la fila
+        from core.services.attendance_rollup import ROLLUP_FIELDS, rollup_values
+        if all(name in instance.__dict__ for name in ROLLUP_FIELDS):
+            instance._rollup_original = rollup_values(instance)
+        return instance
+    
     def save(self, *args, **kwargs):
         """Guardar y actualizar status automáticamente"""
         # Validar hora de salida antes de guardar
@@ -526,7 +643,20 @@ class Attendance(models.Model):
         if self.check_in and not self.check_out:
             self.update_status_based_on_schedule()
         
-        super().save(*args, **kwargs)
+        # Tardanza con el horario de hoy, una sola vez por hora de entrada: cambiar
+        # el horario después no reescribe los resúmenes de días pasados
+        from core.services.attendance_rollup import ROLLUP_FIELDS, late_minutes_for
+        original = getattr(self, '_rollup_original', None)
+        if original is not None and original[ROLLUP_FIELDS.index('check_in')] != self.check_in:
+            self.late_minutes = None
+        if self.check_in is None:
+            self.late_minutes = None
+        elif self.late_minutes is None:
+            self.late_minutes = late_minutes_for(self.area_id, self.date, self.check_in)
+        
+        # El resumen diario se ajusta en post_save, dentro de esta misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
     @property
     def is_late(self):
@@ -536,7 +666,7 @@ class Attendance(models.Model):
             
         # Usar ScheduleService para obtener horarios esperados
         from core.services.schedule_service import ScheduleService
-        expected_check_in, _ = ScheduleService.get_expected_times(self.area, self.date)
+        expected_check_in, _ = ScheduleService.get_expected_times(self.area_id, self.date)
         
         if not expected_check_in:
             # Sin horario definido, usar fallback (8:30 AM)
@@ -544,7 +674,7 @@ class Attendance(models.Model):
             return self.check_in > time(8, 30)
         
         # Obtener período de gracia del área
-        grace_period = ScheduleService.get_grace_period(self.area)
+        grace_period = ScheduleService.get_grace_period(self.area_id)
         
         # Calcular hora límite con tolerancia
         from datetime import datetime, timedelta
@@ -560,11 +690,11 @@ class Attendance(models.Model):
         Returns:
             tuple: (is_valid, error_message, error_details)
         """
-        if not self.check_out or not self.area:
+        if not self.check_out or not self.area_id:
             return True, None, None
         
         from core.services.schedule_service import ScheduleService
-        expected_check_in, expected_check_out = ScheduleService.get_expected_times(self.area, self.date)
+        expected_check_in, expected_check_out = ScheduleService.get_expected_times(self.area_id, self.date)
         
         if not expected_check_out:
             # Sin horario definido, permitir cualquier hora de salida
@@ -608,7 +738,7 @@ class Attendance(models.Model):
             self.status = 'absent'
             # Guardar sin llamar a update_status_based_on_schedule
             super(Attendance, self).save(update_fields=['status', 'updated_at'])
-            print(f"🔄 {self.employee.full_name} ({self.date}): {old_status} → ausente (jornada incompleta)")
+            logger.info("Asistencia de %s (%s): %s → ausente (jornada incompleta)", self.employee_id, self.date, old_status)
             return True
         return False
 
@@ -649,3 +779,113 @@ class PasswordResetToken(models.Model):
         """Marcar el token como usado"""
         self.is_used = True
         self.save()
+
+class CacheGeneration(models.Model):
+    """
+    Contador de generación de una caché por proceso
+
+    Cada cambio en los datos cacheados incrementa el contador; los procesos comparan
+    su generación con la de la base para saber si otro worker invalidó la caché.
+    """
+    key = models.CharField(max_length=50, unique=True, verbose_name='Caché')
+    generation = models.PositiveBigIntegerField(default=0, verbose_name='Generación')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Generación de Caché'
+        verbose_name_plural = 'Generaciones de Caché'
+    
+    def __str__(self):
+        return f"{self.key} (generación {self.generation})"
+    
+    @classmethod
+    def current(cls, key):
+        """Generación actual de la caché ``key`` (0 si nunca se invalidó)"""
+        return cls.objects.filter(key=key).values_list('generation', flat=True).first() or 0
+    
+    @classmethod
+    def bump(cls, key):
+        """Incrementa la generación de la caché ``key``"""
+        from django.db.models import F
+        _, created = cls.objects.get_or_create(key=key, defaults={'generation': 1})
+        if not created:
+            cls.objects.filter(key=key).update(generation=F('generation') + 1)
+
+class DayCloseWatermark(models.Model):
+    """
+    Último día cuyas asistencias ya se cerraron (entradas sin salida → ausente)
+
+    Un día se cierra una sola vez: el comando auto_process_attendance o la primera
+    solicitud después de medianoche cierran los días posteriores a ``closed_through``
+    y avanzan la marca (core/services/day_close.py).
+    """
+    key = models.CharField(max_length=50, unique=True, default='attendance', verbose_name='Proceso')
+    closed_through = models.DateField(null=True, blank=True, verbose_name='Cerrado Hasta')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Cierre de Días'
+        verbose_name_plural = 'Cierres de Días'
+    
+    def __str__(self):
+        return f"{self.key} cerrado hasta {self.closed_through}"
+
+class AttendanceCloseAudit(models.Model):
+    """Registro de cada asistencia que el cierre de días pasó a ausente"""
+    SOURCE_CHOICES = [
+        ('auto', 'Cierre Automático'),
+        ('manual', 'Cierre Manual'),
+    ]
+    
+    attendance = models.ForeignKey(
+        Attendance,
+        on_delete=models.CASCADE,
+        related_name='close_audits',
+        verbose_name='Asistencia'
+    )
+    date = models.DateField(verbose_name='Fecha')
+    previous_status = models.CharField(max_length=10, choices=Attendance.STATUS_CHOICES, verbose_name='Estado Anterior')
+    new_status = models.CharField(max_length=10, choices=Attendance.STATUS_CHOICES, default='absent', verbose_name='Estado Nuevo')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='auto', verbose_name='Origen')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Cierre de Asistencia'
+        verbose_name_plural = 'Cierres de Asistencias'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Asistencia {self.attendance_id} ({self.date}): {self.previous_status} → {self.new_status}"
+
+class DailyAttendanceRollup(models.Model):
+    """
+    Resumen diario de asistencias por área y estado
+
+    Se mantiene en la misma transacción que cada escritura de asistencias
+    (core/services/attendance_rollup.py) y se regenera con
+    ``manage.py rebuild_attendance_rollups``.
+    """
+    date = models.DateField(verbose_name='Fecha')
+    area = models.ForeignKey(
+        Area,
+        on_delete=models.CASCADE,
+        related_name='attendance_rollups',
+        verbose_name='Área de Trabajo'
+    )
+    status = models.CharField(max_length=10, choices=Attendance.STATUS_CHOICES, verbose_name='Estado')
+    attendance_count = models.IntegerField(default=0, verbose_name='Asistencias')
+    late_minutes = models.IntegerField(default=0, verbose_name='Minutos de Tardanza')
+    worked_minutes = models.IntegerField(default=0, verbose_name='Minutos Trabajados')
+    
+    class Meta:
+        verbose_name = 'Resumen Diario de Asistencias'
+        verbose_name_plural = 'Resúmenes Diarios de Asistencias'
+        ordering = ['date', 'area_id', 'status']
+        unique_together = ['date', 'area', 'status']
+    
+    def __str__(self):
+        return f"{self.date} - área {self.area_id} ({self.status}): {self.attendance_count}"
+    
+    @property
+    def hours_worked(self):
+        return round(self.worked_minutes / 60, 2)
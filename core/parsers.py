@@ -0,0 +1,128 @@
+"""
+Parsers para los endpoints faciales (register_face, verify_face)
+
+Además del JSON con fotos en base64, estos endpoints aceptan multipart/form-data
+(campos 'photos' / 'photo') y el cuerpo binario de una sola imagen
+(Content-Type: image/jpeg, image/png, ...). Los archivos se escriben a disco por
+bloques en lugar de quedar en memoria, y cada solicitud tiene un tope de tamaño
+(settings.FACE_UPLOAD_MAX_BYTES) que se comprueba con el Content-Length y, como
+este puede faltar, también sobre los bytes realmente leídos.
+"""
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import BaseParser, DataAndFiles, JSONParser, MultiPartParser
+
+CHUNK_SIZE = 64 * 1024
+RAW_IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/bmp': '.bmp',
+}
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'La solicitud supera el tamaño máximo permitido para imágenes'
+    default_code = 'upload_too_large'
+
+
+def max_upload_bytes():
+    """Tamaño máximo de una solicitud a los endpoints faciales (0 = sin límite)"""
+    return getattr(settings, 'FACE_UPLOAD_MAX_BYTES', 0)
+
+
+def check_upload_size(parser_context):
+    """Rechaza la solicitud antes de leerla si el Content-Length supera el tope"""
+    limit = max_upload_bytes()
+    request = (parser_context or {}).get('request')
+    if not limit or request is None:
+        return
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (TypeError, ValueError):
+        length = 0
+    if length > limit:
+        raise UploadTooLarge()
+
+
+class CappedStream:
+    """
+    Envoltura de lectura que cuenta los bytes leídos y corta al pasar el tope
+
+    Cubre los cuerpos sin Content-Length (transferencia por bloques), que
+    check_upload_size no puede rechazar por adelantado.
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size) if size is not None and size >= 0 else self.stream.read()
+        self.read_bytes += len(chunk)
+        if self.read_bytes > self.limit:
+            raise UploadTooLarge()
+        return chunk
+
+
+class FaceJSONParser(JSONParser):
+    """JSON con fotos en base64 (formato original) con tope de tamaño"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        check_upload_size(parser_context)
+        return super().parse(stream, media_type, parser_context)
+
+
+class FaceMultiPartParser(MultiPartParser):
+    """multipart/form-data: cada archivo se escribe a un temporal por bloques"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        check_upload_size(parser_context)
+        request = parser_context['request']
+        request._request.upload_handlers = [TemporaryFileUploadHandler(request._request)]
+        limit = max_upload_bytes()
+        if limit:
+            stream = CappedStream(stream, limit)
+        return super().parse(stream, media_type, parser_context)
+
+
+class RawImageParser(BaseParser):
+    """Cuerpo binario de una imagen; queda disponible como el archivo 'photo'"""
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        check_upload_size(parser_context)
+        limit = max_upload_bytes()
+        content_type = (media_type or '').split(';')[0].strip().lower()
+        upload = TemporaryUploadedFile(
+            'photo' + RAW_IMAGE_EXTENSIONS.get(content_type, ''), content_type, 0, None
+        )
+        size = 0
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                # El Content-Length puede faltar (transferencia por bloques)
+                if limit and size > limit:
+                    raise UploadTooLarge()
+                upload.write(chunk)
+        except Exception:
+            upload.close()
+            raise
+        upload.size = size
+        upload.seek(0)
+        files = MultiValueDict({'photo': [upload]} if size else {})
+        return DataAndFiles(QueryDict('', mutable=True), files)
+
+
+FACE_UPLOAD_PARSERS = [FaceJSONParser, FaceMultiPartParser, RawImageParser]
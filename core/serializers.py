@@ -3,6 +3,7 @@ from django.contrib.auth import authenticate, get_user_model
 from .models import User, Employee, Area, Attendance, AreaSchedule
 from .models import PasswordResetToken
 from .services.employee_welcome_service import EmployeeWelcomeService
+from .services.area_cache import area_cache
 from datetime import time
 import os
 
@@ -737,7 +738,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
 class AttendanceSerializer(serializers.ModelSerializer):
     """Serializer para el modelo Attendance"""
     employee_name = serializers.CharField(source='employee.full_name', read_only=True)
-    area_name = serializers.CharField(source='area.name', read_only=True)
+    area_name = serializers.SerializerMethodField()
     hours_worked = serializers.ReadOnlyField()
     
     class Meta:
@@ -749,6 +750,11 @@ class AttendanceSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'employee_name', 'area_name', 'hours_worked']
     
+    def get_area_name(self, obj):
+        """Nombre del área desde la caché de áreas (sin consultar obj.area)"""
+        area = area_cache.get(obj.area_id)
+        return area.name if area is not None else None
+    
     def validate(self, attrs):
         """Validación personalizada para el modelo Attendance"""
         # Validar que si hay check_out, también debe haber check_in
@@ -0,0 +1,306 @@
+"""
+Caché por proceso de áreas y horarios para la ruta caliente de asistencia
+
+Las áreas y sus horarios cambian pocas veces al mes pero se leen miles de veces cada
+mañana (mark_attendance, ScheduleService, Attendance.is_late...). Aquí se guardan
+como instantáneas inmutables (AreaSnapshot / ScheduleSnapshot), con la latitud y
+longitud ya en radianes y el coseno de la latitud precalculado para la geocerca.
+
+Invalidación:
+- En el proceso que guarda o elimina un Area / AreaSchedule, las señales de
+  core/signals.py vacían la caché al instante.
+- Cada invalidación incrementa CacheGeneration('areas'); los demás workers comparan
+  ese contador como máximo cada AREA_CACHE_CHECK_SECONDS y recargan si cambió.
+
+Con la caché caliente, consultar un área o su horario no hace consultas a la base.
+
+Cada horario se compila además en una tabla de 7 filas (una por día de la semana,
+0 = lunes) con entrada y salida en segundos del día, día activo y tolerancia en
+minutos. ``ScheduleSnapshot.evaluate`` la usa para clasificar en bloque (numpy) las
+asistencias de un área sin ramas por fila (la regeneración de resúmenes calcula así
+la tardanza de las filas que no la tienen).
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from math import asin, cos, radians, sin, sqrt
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'areas'
+EARTH_RADIUS_METERS = 6371000
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Columnas de ScheduleSnapshot.table
+START, END, ACTIVE, GRACE = range(4)
+NO_TIME = -1
+# Hora límite de Attendance.is_late cuando el área no tiene horario para ese día
+DEFAULT_LATE_AFTER = 8 * 3600 + 30 * 60
+# 1970-01-01 (día 0 de datetime64[D]) fue jueves
+_EPOCH_WEEKDAY = 3
+
+
+def seconds_of_day(value):
+    """Segundos desde la medianoche de un time (NO_TIME si es None)"""
+    if value is None:
+        return NO_TIME
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def to_day_array(dates):
+    """Fechas (date, str ISO o datetime64) como arreglo datetime64[D]"""
+    return np.asarray(dates, dtype='datetime64[D]')
+
+
+def to_seconds_array(times):
+    """Horas (time o None) como arreglo de segundos del día; None → NO_TIME"""
+    if isinstance(times, np.ndarray) and times.dtype.kind in 'iu':
+        return times.astype(np.int32, copy=False)
+    return np.fromiter((seconds_of_day(value) for value in times), dtype=np.int32, count=len(times))
+
+
+def weekdays(days):
+    """Día de la semana (0 = lunes) de un arreglo datetime64[D]"""
+    return (days.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+
+
+def late_minutes_array(seconds, expected_in):
+    """Minutos de tardanza en bloque (como attendance_rollup.late_minutes_for)"""
+    base = np.where(expected_in != NO_TIME, expected_in, DEFAULT_LATE_AFTER)
+    return np.where(seconds != NO_TIME, np.maximum(0, (seconds - base) // 60), 0).astype(np.int32)
+
+
+@dataclass(frozen=True)
+class ScheduleSnapshot:
+    """
+    Horario semanal compilado de un área
+
+    ``days[weekday] = (entrada, salida, activo)`` para las consultas de una fecha y
+    ``table`` (7 x 4, int32, solo lectura) con START/END en segundos del día (NO_TIME
+    si no hay hora), ACTIVE (0/1) y GRACE (minutos) para la evaluación en bloque.
+    """
+    id: int
+    schedule_type: str
+    days: tuple
+    grace_period_minutes: int
+    table: np.ndarray = field(repr=False, compare=False)
+
+    @classmethod
+    def from_model(cls, schedule):
+        days = tuple(
+            (getattr(schedule, f'{day}_start'), getattr(schedule, f'{day}_end'), getattr(schedule, f'{day}_active'))
+            for day in WEEKDAYS
+        )
+        table = np.array(
+            [(seconds_of_day(start), seconds_of_day(end), int(bool(active)), schedule.grace_period_minutes)
+             for start, end, active in days],
+            dtype=np.int32
+        )
+        table.setflags(write=False)
+        return cls(schedule.id, schedule.schedule_type, days, schedule.grace_period_minutes, table)
+
+    def expected_times(self, date):
+        """(entrada, salida) esperadas en la fecha o (None, None) si el día no está activo"""
+        start, end, active = self.days[date.weekday()]
+        return (start, end) if active else (None, None)
+
+    def is_work_day(self, date):
+        return bool(self.days[date.weekday()][2])
+
+    def evaluate(self, dates, check_ins=None):
+        """
+        Clasifica en bloque asistencias de esta área
+
+        Misma lógica que ScheduleService / Attendance.is_late fila por fila: sin día
+        activo no hay horas esperadas y la tardanza usa el límite de las 8:30.
+
+        Args:
+            dates: Fechas (arreglo datetime64[D] o secuencia de date)
+            check_ins: Horas de entrada (segundos del día con NO_TIME o secuencia de
+                time/None); None si solo se necesitan las horas esperadas
+
+        Returns:
+            dict de arreglos numpy alineados con ``dates``: 'weekday', 'is_work_day',
+            'expected_check_in' y 'expected_check_out' (segundos, NO_TIME si no hay
+            horario ese día), 'limit' (entrada + tolerancia) y, si se pasaron
+            check_ins, 'is_late' y 'late_minutes' (minutos después de la entrada
+            esperada, o de las 8:30 sin horario; 0 sin entrada)
+        """
+        weekday = weekdays(to_day_array(dates))
+        rows = self.table[weekday]
+        active = rows[:, ACTIVE].astype(bool)
+        expected_in = np.where(active, rows[:, START], NO_TIME)
+        expected_out = np.where(active, rows[:, END], NO_TIME)
+        limit = np.where(expected_in != NO_TIME, expected_in + rows[:, GRACE] * 60, DEFAULT_LATE_AFTER)
+        result = {
+            'weekday': weekday,
+            'is_work_day': active,
+            'expected_check_in': expected_in,
+            'expected_check_out': expected_out,
+            'limit': limit,
+        }
+        if check_ins is not None:
+            seconds = to_seconds_array(check_ins)
+            result['is_late'] = (seconds != NO_TIME) & (seconds > limit)
+            result['late_minutes'] = late_minutes_array(seconds, expected_in)
+        return result
+
+
+@dataclass(frozen=True)
+class AreaSnapshot:
+    """Datos de un área usados al marcar asistencia"""
+    id: int
+    name: str
+    status: str
+    latitude: float
+    longitude: float
+    radius: int
+    lat_rad: float
+    lon_rad: float
+    cos_lat: float
+    schedule: ScheduleSnapshot = None
+
+    @classmethod
+    def from_model(cls, area):
+        latitude, longitude = float(area.latitude), float(area.longitude)
+        schedule = area.schedule if hasattr(area, 'schedule') else None
+        return cls(
+            id=area.id,
+            name=area.name,
+            status=area.status,
+            latitude=latitude,
+            longitude=longitude,
+            radius=area.radius,
+            lat_rad=radians(latitude),
+            lon_rad=radians(longitude),
+            cos_lat=cos(radians(latitude)),
+            schedule=ScheduleSnapshot.from_model(schedule) if schedule is not None else None,
+        )
+
+    def is_active(self):
+        return self.status == 'active'
+
+    def distance_to(self, latitude, longitude):
+        """
+        Distancia en metros desde el centro del área (fórmula de Haversine)
+
+        Args:
+            latitude: Latitud del punto en grados
+            longitude: Longitud del punto en grados
+        """
+        lat_rad, lon_rad = radians(float(latitude)), radians(float(longitude))
+        a = sin((lat_rad - self.lat_rad) / 2) ** 2 + self.cos_lat * cos(lat_rad) * sin((lon_rad - self.lon_rad) / 2) ** 2
+        return 2 * asin(sqrt(a)) * EARTH_RADIUS_METERS
+
+
+class AreaCache:
+    """Instantáneas de áreas por id, válidas mientras no cambie la generación"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        # True si _snapshots tiene todas las áreas (cargadas con all())
+        self._complete = False
+        self._generation = None
+        self._checked_at = 0.0
+
+    def _check_generation(self):
+        """Vacía la caché si otro proceso incrementó la generación"""
+        interval = getattr(settings, 'AREA_CACHE_CHECK_SECONDS', 5.0)
+        now = time.monotonic()
+        if self._generation is not None and now - self._checked_at < interval:
+            return
+        from core.models import CacheGeneration
+        generation = CacheGeneration.current(CACHE_KEY)
+        with self._lock:
+            if generation != self._generation:
+                if self._generation is not None:
+                    logger.debug("Caché de áreas: generación %s → %s", self._generation, generation)
+                self._snapshots = {}
+                self._complete = False
+                self._generation = generation
+            self._checked_at = now
+
+    def get(self, area_id):
+        """
+        Instantánea del área (con su horario)
+
+        Args:
+            area_id: id del área
+
+        Returns:
+            AreaSnapshot o None si el área no existe
+        """
+        if area_id is None:
+            return None
+        try:
+            area_id = int(area_id)
+        except (TypeError, ValueError):
+            return None
+        self._check_generation()
+        snapshot = self._snapshots.get(area_id)
+        if snapshot is None:
+            from core.models import Area
+            area = Area.objects.select_related('schedule').filter(pk=area_id).first()
+            if area is None:
+                return None
+            snapshot = AreaSnapshot.from_model(area)
+            with self._lock:
+                self._snapshots[area_id] = snapshot
+        return snapshot
+
+    def all(self):
+        """
+        Instantáneas de todas las áreas (una sola consulta la primera vez)
+
+        Returns:
+            lista de AreaSnapshot
+        """
+        self._check_generation()
+        if not self._complete:
+            from core.models import Area
+            snapshots = self._snapshots
+            loaded = {area.id: AreaSnapshot.from_model(area) for area in Area.objects.select_related('schedule')}
+            with self._lock:
+                # Si se invalidó mientras se cargaba, no marcar la caché como completa
+                if self._snapshots is snapshots:
+                    self._snapshots = loaded
+                    self._complete = True
+            return list(loaded.values())
+        return list(self._snapshots.values())
+
+    def clear(self):
+        """Vacía la caché de este proceso"""
+        with self._lock:
+            self._snapshots = {}
+            self._complete = False
+            self._generation = None
+
+    def invalidate(self):
+        """Invalida la caché en este proceso y, vía CacheGeneration, en los demás"""
+        from core.models import CacheGeneration
+        self.clear()
+        CacheGeneration.bump(CACHE_KEY)
+        # Una lectura concurrente antes del commit pudo cachear los datos anteriores
+        transaction.on_commit(self.clear)
+
+
+area_cache = AreaCache()
+
+
+def area_snapshot(area):
+    """
+    Instantánea de un área a partir de un Area, un AreaSnapshot o un id
+
+    Returns:
+        AreaSnapshot o None
+    """
+    if isinstance(area, AreaSnapshot):
+        return area
+    return area_cache.get(getattr(area, 'pk', area))
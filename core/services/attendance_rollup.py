@@ -0,0 +1,282 @@
+"""
+Resúmenes diarios de asistencias (DailyAttendanceRollup) mantenidos al escribir
+
+Cada asistencia aporta a la fila (fecha, área, estado) una asistencia, sus minutos
+de tardanza (Attendance.late_minutes, solo si el estado es 'late') y sus minutos
+trabajados. La tardanza se guarda en la asistencia con el horario vigente al
+registrar la entrada, así que ni un cambio de horario ni una regeneración alteran
+los resúmenes de días pasados.
+
+- Las escrituras de una fila (Attendance.save / delete) se aplican con las señales
+  de core/signals.py, en la misma transacción que la escritura.
+- Las escrituras en bloque (cierre de días, persist_effective_status) llaman a
+  ``apply_changes`` con las filas antes y después del UPDATE.
+- ``rebuild_rollups`` regenera un rango de fechas desde las asistencias (la
+  migración 0031 lo hace una vez para los datos existentes). Antes calcula en
+  bloque la tardanza de las filas con entrada que no la tienen (creadas con
+  bulk_create o update(), que no pasan por Attendance.save).
+
+El dashboard lee estas filas en lugar de recorrer Attendance.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from core.services.area_cache import DEFAULT_LATE_AFTER, seconds_of_day
+
+logger = logging.getLogger(__name__)
+
+# Campos de Attendance que determinan su aporte al resumen
+ROLLUP_FIELDS = ('date', 'area_id', 'status', 'check_in', 'check_out', 'late_minutes')
+STATUS_POSITION = ROLLUP_FIELDS.index('status')
+
+
+def rollup_values(attendance):
+    """Tupla ROLLUP_FIELDS de una asistencia"""
+    return tuple(getattr(attendance, name) for name in ROLLUP_FIELDS)
+
+
+def with_status(values, status):
+    """Tupla ROLLUP_FIELDS con otro estado (para los UPDATE en bloque)"""
+    return values[:STATUS_POSITION] + (status,) + values[STATUS_POSITION + 1:]
+
+
+def late_minutes_for(area_id, day, check_in):
+    """
+    Minutos de la entrada después de la hora esperada del área ese día
+
+    Sin horario para ese día se toma 8:30, como en Attendance.is_late.
+    """
+    from core.services.schedule_service import ScheduleService
+    expected_check_in, _ = ScheduleService.get_expected_times(area_id, day)
+    expected = seconds_of_day(expected_check_in) if expected_check_in else DEFAULT_LATE_AFTER
+    return max(0, (seconds_of_day(check_in) - expected) // 60)
+
+
+def backfill_late_minutes(attendances):
+    """
+    Completa Attendance.late_minutes de las asistencias con entrada que no lo tienen
+
+    Evalúa todas las fechas de cada área de una vez con su horario compilado
+    (ScheduleService.classify), con el mismo resultado que late_minutes_for.
+
+    Args:
+        attendances: QuerySet de Attendance a revisar
+
+    Returns:
+        int: Asistencias actualizadas
+    """
+    from core.models import Attendance
+    from core.services.schedule_service import ScheduleService
+
+    by_area = defaultdict(list)
+    pending = attendances.filter(check_in__isnull=False, late_minutes__isnull=True).order_by()
+    for pk, area_id, day, check_in in pending.values_list('pk', 'area_id', 'date', 'check_in').iterator():
+        by_area[area_id].append((pk, day, check_in))
+
+    updated = 0
+    for area_id, rows in by_area.items():
+        pks, days, check_ins = zip(*rows)
+        minutes = ScheduleService.classify(area_id, days, check_ins)['late_minutes']
+        Attendance.objects.bulk_update(
+            [Attendance(pk=pk, late_minutes=int(value)) for pk, value in zip(pks, minutes)],
+            ['late_minutes'], batch_size=1000
+        )
+        updated += len(rows)
+    if updated:
+        logger.info("Tardanza calculada para %s asistencias sin late_minutes", updated)
+    return updated
+
+
+def _worked_minutes(check_in, check_out):
+    if check_in is None or check_out is None:
+        return 0
+    return max(0, (seconds_of_day(check_out) - seconds_of_day(check_in)) // 60)
+
+
+def contribution(values):
+    """
+    Aporte de una asistencia al resumen
+
+    Args:
+        values: Tupla ROLLUP_FIELDS
+
+    Returns:
+        ((fecha, área, estado), minutos de tardanza, minutos trabajados)
+    """
+    day, area_id, status, check_in, check_out, late_minutes = values
+    return (
+        (day, area_id, status),
+        (late_minutes or 0) if status == 'late' else 0,
+        _worked_minutes(check_in, check_out),
+    )
+
+
+def _increment(key, delta):
+    """Suma ``delta`` a una fila con F(), creándola si no existe"""
+    from core.models import DailyAttendanceRollup
+
+    day, area_id, status = key
+    count, late, worked = delta
+    rows = DailyAttendanceRollup.objects.filter(date=day, area_id=area_id, status=status)
+    changes = {
+        'attendance_count': F('attendance_count') + count,
+        'late_minutes': F('late_minutes') + late,
+        'worked_minutes': F('worked_minutes') + worked,
+    }
+    if not rows.update(**changes) and count > 0:
+        DailyAttendanceRollup.objects.create(
+            date=day, area_id=area_id, status=status,
+            attendance_count=count, late_minutes=late, worked_minutes=worked
+        )
+
+
+def apply_changes(removed=(), added=()):
+    """
+    Ajusta los resúmenes: resta el aporte de ``removed`` y suma el de ``added``
+
+    Un SELECT ... FOR UPDATE de las filas afectadas, un UPDATE en bloque y un INSERT
+    en bloque de las que faltan, sin importar cuántas asistencias cambien. Una fila
+    que no existe solo se crea si el aporte es positivo (si no, la fecha aún no se
+    regeneró o el área se está eliminando en cascada con sus resúmenes). Debe
+    llamarse dentro de la transacción de la escritura.
+
+    Args:
+        removed: Tuplas ROLLUP_FIELDS de las filas antes del cambio
+        added: Tuplas ROLLUP_FIELDS de las filas después del cambio
+    """
+    from core.models import DailyAttendanceRollup
+
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for sign, rows in ((-1, removed), (1, added)):
+        for values in rows:
+            key, late, worked = contribution(values)
+            delta = deltas[key]
+            delta[0] += sign
+            delta[1] += sign * late
+            delta[2] += sign * worked
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        dates, area_ids, statuses = (set(column) for column in zip(*deltas))
+        existing = {
+            (row.date, row.area_id, row.status): row
+            for row in DailyAttendanceRollup.objects.select_for_update().filter(
+                date__in=dates, area_id__in=area_ids, status__in=statuses
+            ).order_by()
+        }
+        to_update, to_create = [], []
+        for key, (count, late, worked) in deltas.items():
+            row = existing.get(key)
+            if row is not None:
+                row.attendance_count += count
+                row.late_minutes += late
+                row.worked_minutes += worked
+                to_update.append(row)
+            elif count > 0:
+                day, area_id, status = key
+                to_create.append(DailyAttendanceRollup(
+                    date=day, area_id=area_id, status=status,
+                    attendance_count=count, late_minutes=late, worked_minutes=worked
+                ))
+            else:
+                logger.debug("Resumen %s / área %s / %s inexistente, se omite", *key)
+        if to_update:
+            DailyAttendanceRollup.objects.bulk_update(
+                to_update, ['attendance_count', 'late_minutes', 'worked_minutes']
+            )
+        if to_create:
+            try:
+                with transaction.atomic():
+                    DailyAttendanceRollup.objects.bulk_create(to_create)
+            except IntegrityError:
+                # Otra transacción creó alguna de las filas después del SELECT
+                for row in to_create:
+                    _increment((row.date, row.area_id, row.status), deltas[(row.date, row.area_id, row.status)])
+
+
+def rebuild_rollups(date_from=None, date_to=None):
+    """
+    Regenera los resúmenes de un rango de fechas desde Attendance
+
+    Solo suma lo guardado en cada asistencia (la tardanza incluida), así que el
+    resultado coincide con el mantenido al escribir aunque el horario haya cambiado.
+    Las filas sin tardanza guardada se completan antes con backfill_late_minutes.
+
+    Args:
+        date_from: Primera fecha (sin límite si es None)
+        date_to: Última fecha (sin límite si es None)
+
+    Returns:
+        int: Filas de resumen escritas
+    """
+    from core.models import Attendance, DailyAttendanceRollup
+
+    attendances = Attendance.objects.order_by()
+    rollups = DailyAttendanceRollup.objects.all()
+    if date_from:
+        attendances = attendances.filter(date__gte=date_from)
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        attendances = attendances.filter(date__lte=date_to)
+        rollups = rollups.filter(date__lte=date_to)
+
+    backfill_late_minutes(attendances)
+    totals = defaultdict(lambda: [0, 0, 0])
+    for values in attendances.values_list(*ROLLUP_FIELDS).iterator():
+        key, late, worked = contribution(values)
+        total = totals[key]
+        total[0] += 1
+        total[1] += late
+        total[2] += worked
+
+    with transaction.atomic():
+        rollups.delete()
+        DailyAttendanceRollup.objects.bulk_create([
+            DailyAttendanceRollup(
+                date=day, area_id=area_id, status=status,
+                attendance_count=count, late_minutes=late, worked_minutes=worked
+            )
+            for (day, area_id, status), (count, late, worked) in totals.items()
+        ], batch_size=1000)
+    logger.info("Resúmenes diarios regenerados (%s a %s): %s filas", date_from, date_to, len(totals))
+    return len(totals)
+
+
+def daily_totals(date_from, date_to):
+    """
+    Asistencias por fecha en un rango (una consulta sobre los resúmenes)
+
+    Returns:
+        dict {fecha: asistencias}
+    """
+    from core.models import DailyAttendanceRollup
+
+    rows = DailyAttendanceRollup.objects.filter(date__range=(date_from, date_to)).values('date').annotate(
+        total=Sum('attendance_count')
+    ).order_by('date')
+    return {row['date']: row['total'] for row in rows}
+
+
+def area_totals(date_from, date_to):
+    """
+    Resumen por área y estado en un rango de fechas
+
+    Returns:
+        lista de dicts con 'area_id', 'status', 'attendances', 'late_minutes' y
+        'worked_minutes'
+    """
+    from core.models import DailyAttendanceRollup
+
+    return list(
+        DailyAttendanceRollup.objects.filter(date__range=(date_from, date_to)).values('area_id', 'status').annotate(
+            attendances=Sum('attendance_count'),
+            late_minutes=Sum('late_minutes'),
+            worked_minutes=Sum('worked_minutes'),
+        ).order_by('area_id', 'status')
+    )
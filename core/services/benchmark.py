@@ -0,0 +1,79 @@
+"""
+Utilidades para los comandos de benchmark del sistema facial
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def latency_summary(samples):
+    """
+    Resume una lista de latencias
+
+    Args:
+        samples: Latencias en segundos
+
+    Returns:
+        Diccionario con count, mean, p50, p95, p99 y max en milisegundos
+    """
+    if not len(samples):
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': int(len(values)),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def run_concurrent(func, inputs, concurrency=1, iterations=50):
+    """
+    Ejecuta func con varios llamadores concurrentes y mide cada llamada
+
+    Args:
+        func: Función de un argumento; se considera error si lanza una excepción
+        inputs: Entradas que se reparten en ronda entre las llamadas
+        concurrency: Número de hilos llamando a la vez
+        iterations: Llamadas por cada hilo
+
+    Returns:
+        latency_summary de todas las llamadas más concurrency, errors y
+        throughput_per_s (llamadas completadas por segundo de reloj)
+    """
+    inputs = list(inputs)
+    errors = []
+
+    def caller(offset):
+        latencies = []
+        for i in range(iterations):
+            item = inputs[(offset + i * concurrency) % len(inputs)]
+            started = time.perf_counter()
+            try:
+                func(item)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(caller, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    samples = [latency for latencies in results for latency in latencies]
+    summary = latency_summary(samples)
+    summary.update({
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'throughput_per_s': round(len(samples) / wall, 3) if wall > 0 else 0.0,
+    })
+    if errors:
+        summary['first_error'] = errors[0]
+    return summary
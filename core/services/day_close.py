@@ -0,0 +1,139 @@
+"""
+Cierre de días de asistencia con una marca persistente ("cerrado hasta")
+
+Cerrar un día marca como ausentes las asistencias con entrada y sin salida de esa
+fecha con un solo UPDATE por rango de fechas (``close_incomplete_attendances``),
+deja una fila de AttendanceCloseAudit por asistencia cambiada y ajusta los
+resúmenes diarios en la misma transacción. La marca DayCloseWatermark guarda el
+último día cerrado, así cada día se cierra una sola vez aunque varios workers o el
+comando lo intenten:
+
+- ``close_pending_days`` cierra, dentro de una transacción sobre la fila de la
+  marca, los días entre la marca y ayer. Es idempotente.
+- ``ensure_days_closed`` es la versión perezosa para la primera solicitud después de
+  medianoche (DayCloseMiddleware): recuerda en el proceso hasta dónde está cerrado y
+  solo toca la base cuando cambia el día.
+
+Cargar asistencias no tiene efectos secundarios.
+"""
+
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = 'attendance'
+# Estados que el cierre pasa a ausente
+CLOSABLE_STATUSES = ('present', 'late')
+
+_lock = threading.Lock()
+# Último día que este proceso sabe cerrado (None = consultar la marca)
+_state = {'closed_through': None}
+
+
+def close_incomplete_attendances(date_from, date_to=None, source='auto'):
+    """
+    Marca como ausentes, en bloque, las asistencias con entrada y sin salida
+
+    Un UPDATE para todo el rango de fechas y un INSERT en bloque en
+    AttendanceCloseAudit con el estado anterior de cada fila cambiada.
+
+    Args:
+        date_from: Primera fecha a cerrar
+        date_to: Última fecha a cerrar (date_from por defecto)
+        source: 'auto' o 'manual' (se guarda en la auditoría)
+
+    Returns:
+        dict con 'updated' (total) y 'by_date' ({'YYYY-MM-DD': cantidad})
+    """
+    from core.models import Attendance, AttendanceCloseAudit
+    from core.services.attendance_rollup import ROLLUP_FIELDS, apply_changes, with_status
+
+    date_to = date_to or date_from
+    incomplete = Attendance.objects.filter(
+        date__range=(date_from, date_to),
+        check_in__isnull=False,
+        check_out__isnull=True,
+        status__in=CLOSABLE_STATUSES,
+    )
+    with transaction.atomic():
+        rows = list(incomplete.select_for_update().order_by().values_list('id', *ROLLUP_FIELDS))
+        if not rows:
+            return {'updated': 0, 'by_date': {}}
+        updated = incomplete.update(status='absent', updated_at=timezone.now())
+        AttendanceCloseAudit.objects.bulk_create([
+            AttendanceCloseAudit(attendance_id=pk, date=day, previous_status=previous, source=source)
+            for pk, day, _, previous, *_ in rows
+        ])
+        before = [values[1:] for values in rows]
+        apply_changes(removed=before, added=[with_status(values, 'absent') for values in before])
+
+    by_date = Counter(values[1].isoformat() for values in rows)
+    logger.info("Cierre %s a %s: %s asistencias marcadas como ausentes", date_from, date_to, updated)
+    return {'updated': updated, 'by_date': dict(sorted(by_date.items()))}
+
+
+def close_pending_days(today=None, lookback_days=None):
+    """
+    Cierra los días entre la marca y ayer, y avanza la marca
+
+    Args:
+        today: Fecha de referencia (hoy en la zona local por defecto)
+        lookback_days: Días hacia atrás a cerrar si la marca nunca se fijó
+            (ATTENDANCE_CLOSE_LOOKBACK_DAYS por defecto)
+
+    Returns:
+        dict con 'closed_through' (marca resultante), 'days' (fechas cerradas ahora)
+        y 'updated' (asistencias marcadas como ausentes)
+    """
+    from core.models import DayCloseWatermark
+
+    today = today or timezone.localdate()
+    yesterday = today - timedelta(days=1)
+    if lookback_days is None:
+        lookback_days = getattr(settings, 'ATTENDANCE_CLOSE_LOOKBACK_DAYS', 7)
+
+    with transaction.atomic():
+        watermark, _ = DayCloseWatermark.objects.select_for_update().get_or_create(key=WATERMARK_KEY)
+        closed_through = watermark.closed_through or (yesterday - timedelta(days=lookback_days))
+        days = [closed_through + timedelta(days=offset) for offset in range(1, (yesterday - closed_through).days + 1)]
+        updated = close_incomplete_attendances(days[0], days[-1])['updated'] if days else 0
+        if days or watermark.closed_through is None:
+            watermark.closed_through = max(closed_through, yesterday)
+            watermark.save(update_fields=['closed_through', 'updated_at'])
+
+    _state['closed_through'] = watermark.closed_through
+    return {'closed_through': watermark.closed_through, 'days': days, 'updated': updated}
+
+
+def ensure_days_closed(today=None):
+    """
+    Cierra los días pendientes si este proceso aún no lo hizo desde la medianoche
+
+    Sin trabajo que hacer es solo una comparación de fechas. Si otro hilo del proceso
+    ya está cerrando, no espera.
+
+    Returns:
+        El resultado de close_pending_days, o None si no había nada que hacer
+    """
+    today = today or timezone.localdate()
+    closed_through = _state['closed_through']
+    if closed_through is not None and closed_through >= today - timedelta(days=1):
+        return None
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        return close_pending_days(today)
+    finally:
+        _lock.release()
+
+
+def forget_closed_days():
+    """Olvida la marca recordada en el proceso (la próxima llamada consulta la base)"""
+    _state['closed_through'] = None
@@ -74,3 +74,16 @@ class EmployeeWelcomeService:
             logger.error(f"❌ Error enviando email de bienvenida: {str(e)}")
             print(f"❌ Error enviando email de bienvenida: {str(e)}")
             return False
+    
+    @staticmethod
+    def send_after_face_registration(employee):
+        """Enviar el email de bienvenida con las credenciales por defecto tras el registro facial"""
+        username = employee.user.username
+        
+        # Usar la cédula como contraseña por defecto
+        if hasattr(employee.user, 'cedula') and employee.user.cedula:
+            password = employee.user.cedula
+        else:
+            password = f"pass{employee.user.id}"
+        
+        return EmployeeWelcomeService.send_welcome_email(employee, username, password)
@@ -0,0 +1,48 @@
+"""
+Configuración del índice de embeddings 1:N
+
+Reúne en un solo lugar las opciones del índice que se leen de settings, para que
+el servicio facial y los comandos de administración usen exactamente el mismo
+índice (incluido el almacén compartido entre workers).
+"""
+
+import os
+from django.conf import settings
+from .face_paths import FACES_DIR, SHARED_INDEX_DIR, ensure_face_recognition_path
+
+
+def shared_store_dir():
+    """Directorio del almacén compartido o None si está desactivado"""
+    if getattr(settings, 'FACE_SHARED_EMBEDDING_STORE', True):
+        return SHARED_INDEX_DIR
+    return None
+
+
+def embedding_index_options():
+    """Opciones del índice según settings"""
+    return {
+        'mode': getattr(settings, 'FACE_INDEX_MODE', 'exact'),
+        'nprobe': getattr(settings, 'FACE_IVF_NPROBE', 8),
+        'ivf_min_size': getattr(settings, 'FACE_IVF_MIN_SIZE', 2000),
+        'centroids_path': os.path.join(SHARED_INDEX_DIR, 'ivf_centroids.npy'),
+        'sync_interval': getattr(settings, 'FACE_SHARED_STORE_SYNC_SECONDS', 1.0),
+        'rescan_interval': getattr(settings, 'FACE_SHARED_STORE_RESCAN_SECONDS', 30.0),
+    }
+
+
+def build_embedding_index(**overrides):
+    """
+    Crea un índice sobre faces/ sin cargar los modelos de DeepFace
+
+    Args:
+        **overrides: Opciones que reemplazan a las de settings
+
+    Returns:
+        Instancia de EmbeddingIndex
+    """
+    ensure_face_recognition_path()
+    from embedding_index import EmbeddingIndex
+
+    options = embedding_index_options()
+    options.update(overrides)
+    return EmbeddingIndex(FACES_DIR, shared_dir=shared_store_dir(), **options)
@@ -0,0 +1,40 @@
+"""
+Conexión con el servidor local de inferencia facial
+
+Si FACE_INFERENCE_SERVER está configurado, los workers de Django envían los
+recortes de rostro a ese proceso (comando run_face_inference_server) en lugar de
+ejecutar el modelo en el hilo de la solicitud.
+"""
+
+import hashlib
+from django.conf import settings
+from .face_paths import ensure_face_recognition_path
+
+
+def inference_address():
+    """Dirección del servidor de inferencia ('' si está desactivado)"""
+    return getattr(settings, 'FACE_INFERENCE_SERVER', '') or ''
+
+
+def inference_authkey():
+    """Clave compartida entre servidor y clientes, derivada de SECRET_KEY"""
+    return hashlib.sha256(f'face-inference:{settings.SECRET_KEY}'.encode('utf-8')).digest()
+
+
+def build_inference_client():
+    """
+    Crea el cliente del servidor de inferencia
+
+    Returns:
+        InferenceClient o None si no hay servidor configurado
+    """
+    address = inference_address()
+    if not address:
+        return None
+    ensure_face_recognition_path()
+    from inference_server import InferenceClient
+    return InferenceClient(
+        address,
+        inference_authkey(),
+        timeout=getattr(settings, 'FACE_INFERENCE_TIMEOUT', 5.0)
+    )
@@ -0,0 +1,21 @@
+"""
+Rutas del sistema de reconocimiento facial
+
+Los módulos de face_recognition/ no forman parte de un paquete de Python, por lo
+que se agregan al path antes de importarlos.
+"""
+
+import os
+import sys
+from django.conf import settings
+
+FACE_RECOGNITION_DIR = os.path.join(settings.BASE_DIR, 'face_recognition')
+FACES_DIR = os.path.join(FACE_RECOGNITION_DIR, 'faces')
+SHARED_INDEX_DIR = os.path.join(FACE_RECOGNITION_DIR, 'shared_index')
+
+
+def ensure_face_recognition_path():
+    """Agrega el directorio de reconocimiento facial al path si no está"""
+    if FACE_RECOGNITION_DIR not in sys.path:
+        sys.path.insert(0, FACE_RECOGNITION_DIR)
+    return FACE_RECOGNITION_DIR
@@ -0,0 +1,198 @@
+"""
+Registro facial en segundo plano
+
+El endpoint guarda las fotos en un archivo temporal (las subidas como archivo se
+copian a una carpeta del trabajo), crea un FaceRegistrationJob y
+responde 202 de inmediato; un pool de hilos procesa el registro (decodificación,
+detección, embeddings, archivos y email de bienvenida) y va actualizando el
+progreso por foto en la base de datos.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from ..models import FaceProfile, FaceRegistrationJob
+from .employee_welcome_service import EmployeeWelcomeService
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de hilos compartido para los registros en segundo plano"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'FACE_REGISTRATION_WORKERS', 2),
+                    thread_name_prefix='face-registration'
+                )
+    return _executor
+
+
+def reset_executor():
+    """Olvida el pool heredado de un fork (sus hilos no existen en el proceso hijo)"""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+def jobs_dir():
+    """Directorio donde se guardan las fotos de los trabajos pendientes"""
+    return os.path.join(settings.MEDIA_ROOT, 'face_registration_jobs')
+
+
+def _photo_files_dir(job_id):
+    return os.path.join(jobs_dir(), str(job_id))
+
+
+def _write_payload(job_id, photos):
+    """Guarda las fotos del trabajo de forma atómica y devuelve la ruta"""
+    folder = jobs_dir()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f'{job_id}.json')
+
+    entries = []
+    for i, photo in enumerate(photos):
+        if hasattr(photo, 'read'):
+            # Archivo subido: se copia por bloques, sin pasar a base64
+            files_dir = _photo_files_dir(job_id)
+            os.makedirs(files_dir, exist_ok=True)
+            file_path = os.path.join(files_dir, f'photo_{i:03d}')
+            photo.seek(0)
+            with open(file_path, 'wb') as photo_file:
+                shutil.copyfileobj(photo, photo_file)
+            entries.append({'file': file_path})
+        else:
+            entries.append(photo)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.job-', dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(entries, tmp_file)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def _read_payload(path):
+    """Fotos del trabajo: strings base64 o bytes de los archivos copiados"""
+    with open(path) as payload_file:
+        entries = json.load(payload_file)
+    photos = []
+    for entry in entries:
+        if isinstance(entry, dict) and 'file' in entry:
+            with open(entry['file'], 'rb') as photo_file:
+                photos.append(photo_file.read())
+        else:
+            photos.append(entry)
+    return photos
+
+
+def submit_registration(employee, photos):
+    """
+    Crea un trabajo de registro facial y lo encola
+
+    Args:
+        employee: Instancia del modelo Employee
+        photos: Lista de fotos en base64 o archivos subidos
+
+    Returns:
+        FaceRegistrationJob creado (estado 'pending')
+    """
+    job = FaceRegistrationJob(employee=employee, total_photos=len(photos))
+    job.payload_path = _write_payload(job.id, photos)
+    job.save()
+    # Encolar solo cuando el trabajo ya es visible para el hilo que lo procesa
+    transaction.on_commit(lambda: get_executor().submit(run_registration_job, job.id))
+    return job
+
+
+def run_registration_job(job_id):
+    """Procesa un trabajo de registro facial (se ejecuta en el pool de hilos)"""
+    from .face_service_singleton import face_service_singleton
+
+    close_old_connections()
+    jobs = FaceRegistrationJob.objects.filter(pk=job_id)
+    try:
+        job = FaceRegistrationJob.objects.select_related('employee__user').get(pk=job_id)
+        jobs.update(status='processing', started_at=timezone.now())
+
+        photos = _read_payload(job.payload_path)
+
+        def progress(processed, saved, rejected):
+            jobs.update(processed_photos=processed, saved_photos=saved, rejected_photos=rejected)
+
+        result = face_service_singleton.register_face(job.employee, photos, progress=progress)
+
+        if result.get('success'):
+            jobs.update(
+                status='completed',
+                processed_photos=len(photos),
+                saved_photos=result.get('photos_count', 0),
+                message=result.get('message', ''),
+                finished_at=timezone.now()
+            )
+            try:
+                EmployeeWelcomeService.send_after_face_registration(job.employee)
+            except Exception as email_error:
+                # No fallar el registro facial si el email falla
+                logger.warning("No se pudo enviar email de bienvenida (job %s): %s", job_id, email_error)
+        else:
+            jobs.update(
+                status='failed',
+                message=result.get('error') or result.get('message') or 'Error desconocido',
+                finished_at=timezone.now()
+            )
+    except Exception as e:
+        logger.exception("Error en registro facial en segundo plano %s: %s", job_id, e)
+        jobs.update(status='failed', message=f'Error interno: {str(e)}', finished_at=timezone.now())
+    finally:
+        payload_path = jobs.values_list('payload_path', flat=True).first()
+        if payload_path and os.path.exists(payload_path):
+            os.remove(payload_path)
+        shutil.rmtree(_photo_files_dir(job_id), ignore_errors=True)
+        close_old_connections()
+
+
+def job_status(job):
+    """Estado del trabajo y del perfil facial resultante"""
+    data = {
+        'job_id': str(job.id),
+        'employee_id': job.employee_id,
+        'status': job.status,
+        'total_photos': job.total_photos,
+        'processed_photos': job.processed_photos,
+        'saved_photos': job.saved_photos,
+        'rejected_photos': job.rejected_photos,
+        'progress': round(job.processed_photos / job.total_photos, 3) if job.total_photos else 0.0,
+        'message': job.message,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'face_profile': None,
+    }
+    if job.is_finished:
+        profile = FaceProfile.objects.filter(employee_id=job.employee_id).first()
+        if profile:
+            data['face_profile'] = {
+                'is_trained': profile.is_trained,
+                'photos_count': profile.photos_count,
+                'last_training': profile.last_training,
+            }
+    return data
@@ -0,0 +1,116 @@
+"""
+Ciclo de vida del sistema facial en el proceso (precarga para gunicorn y readiness)
+
+Con FACE_STACK_LOADING = 'preload' (geoproject/gunicorn.conf.py) el proceso maestro
+carga los pesos de RetinaFace y Facenet antes del fork; los workers los comparten
+por copy-on-write en lugar de tener cada uno su copia. En el maestro no se ejecuta
+ninguna inferencia: los hilos de TensorFlow no sobreviven al fork, por eso la
+inferencia de prueba corre en cada worker justo después del fork (post_fork), antes
+de que acepte solicitudes.
+
+El número de hilos de TensorFlow se fija por variables de entorno antes de importarlo,
+para que los pools que crea cada worker no compitan entre sí por los núcleos.
+"""
+
+import gc
+import os
+import threading
+
+from django.conf import settings
+
+_state = {'phase': 'cold', 'pid': os.getpid(), 'error': ''}
+_state_lock = threading.Lock()
+
+
+def _set_phase(phase, error=''):
+    with _state_lock:
+        _state.update(phase=phase, pid=os.getpid(), error=error)
+
+
+def configure_tensorflow_threads():
+    """Fija los hilos de TensorFlow por proceso (debe llamarse antes de importarlo)"""
+    intra = getattr(settings, 'FACE_TF_INTRA_OP_THREADS', 0)
+    inter = getattr(settings, 'FACE_TF_INTER_OP_THREADS', 0)
+    if intra:
+        os.environ.setdefault('TF_NUM_INTRAOP_THREADS', str(intra))
+        os.environ.setdefault('OMP_NUM_THREADS', str(intra))
+    if inter:
+        os.environ.setdefault('TF_NUM_INTEROP_THREADS', str(inter))
+
+
+def preload_in_master():
+    """
+    Carga los pesos en el proceso maestro antes del fork (hook when_ready de gunicorn)
+
+    Returns:
+        True si el sistema facial quedó cargado
+    """
+    from .face_service_singleton import face_service_singleton
+
+    configure_tensorflow_threads()
+    _set_phase('loading')
+    service = face_service_singleton.warm_up(warm_models=False)
+    if service is None:
+        _set_phase('unavailable', 'Sistema de reconocimiento facial no disponible')
+        return False
+
+    # Los objetos cargados pasan a la generación permanente: el GC de los workers no
+    # los recorre y sus páginas no se copian
+    gc.freeze()
+    _set_phase('preloaded')
+    return True
+
+
+def after_fork():
+    """
+    Prepara el worker recién creado (hook post_fork de gunicorn)
+
+    Descarta el estado heredado que no sobrevive al fork (pool de registros, conexiones
+    al servidor de inferencia) y ejecuta la inferencia de prueba en este proceso.
+    """
+    from .face_registration_jobs import reset_executor
+    from .face_service_singleton import face_service_singleton
+
+    reset_executor()
+    if not face_service_singleton.is_loaded:
+        _set_phase('cold')
+        return
+
+    service = face_service_singleton.get_service()
+    facial_system = getattr(service, 'facial_system', None)
+    if facial_system is None:
+        _set_phase('unavailable', 'Sistema de reconocimiento facial no disponible')
+        return
+
+    if facial_system.inference_client is not None:
+        facial_system.inference_client.after_fork()
+    try:
+        facial_system.warm_up_models()
+    except Exception as e:
+        _set_phase('unavailable', str(e))
+        return
+    _set_phase('ready')
+
+
+def readiness():
+    """
+    Estado del sistema facial en este proceso
+
+    Returns:
+        dict con 'ready', 'phase' (cold, loading, preloaded, ready, unavailable),
+        'loading_mode', 'pid' y 'error'
+    """
+    from .face_service_singleton import face_service_singleton
+
+    with _state_lock:
+        state = dict(_state)
+    if state['pid'] != os.getpid():
+        # Estado heredado del maestro sin pasar por after_fork
+        state = {'phase': 'cold', 'pid': os.getpid(), 'error': ''}
+    if state['phase'] == 'cold' and face_service_singleton.is_loaded:
+        # Carga perezosa o 'eager' (sin hooks de gunicorn)
+        available = face_service_singleton._service is not None
+        state['phase'] = 'ready' if available else 'unavailable'
+    state['ready'] = state['phase'] == 'ready'
+    state['loading_mode'] = getattr(settings, 'FACE_STACK_LOADING', 'lazy')
+    return state
@@ -1,131 +1,168 @@
 import os
 import sys
 import json
+import logging
 import base64
 import subprocess
 import time
 import numpy as np
 import cv2
-from io import BytesIO
-from PIL import Image
 from django.conf import settings
 from django.utils import timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+from collections import Counter
 from ..models import FaceProfile
+from .face_paths import FACE_RECOGNITION_DIR, ensure_face_recognition_path
+from .face_index import embedding_index_options, shared_store_dir
+from .face_inference import build_inference_client
 
 # Agregar el directorio de reconocimiento facial al path
-FACE_RECOGNITION_DIR = os.path.join(settings.BASE_DIR, 'face_recognition')
-if FACE_RECOGNITION_DIR not in sys.path:
-    sys.path.insert(0, FACE_RECOGNITION_DIR)
+ensure_face_recognition_path()
+from embedding_store import (
+    save_person_embeddings, load_person_embeddings, load_compact_templates, count_person_embeddings,
+)
+from template_compaction import verify_with_templates
+from image_pipeline import crop_face, decode_image, fit_to_input
+from face_quality import FaceQualityGate
+from batched_inference import MODEL_INPUT_SIZES
+from stage_timing import bind, span
 
-print(f"🔍 DEBUG: IMPORT PATHS DURANTE CARGA DEL MÓDULO")
-print(f"   - FACE_RECOGNITION_DIR: {FACE_RECOGNITION_DIR}")
-print(f"   - sys.path contiene FACE_RECOGNITION_DIR: {FACE_RECOGNITION_DIR in sys.path}")
-print(f"   - sys.path[0]: {sys.path[0] if sys.path else 'Empty'}")
-print(f"   - Current working directory: {os.getcwd()}")
+logger = logging.getLogger(__name__)
+
+logger.debug("Directorio del sistema facial: %s (en sys.path: %s)", FACE_RECOGNITION_DIR, FACE_RECOGNITION_DIR in sys.path)
+
+# El sistema facial (DeepFace/TensorFlow) se importa en el primer uso: los procesos
+# que no atienden rostros (migrate, comandos de cron) no cargan TensorFlow
+FacialRecognition = None
+FACIAL_RECOGNITION_AVAILABLE = None  # None = todavía no se intentó importar
+_import_lock = threading.Lock()
+
+
+def load_facial_recognition():
+    """
+    Importa advanced_face_system (y con él DeepFace/TensorFlow) una sola vez
+
+    Returns:
+        La clase FacialRecognition o None si el sistema facial no está disponible
+    """
+    global FacialRecognition, FACIAL_RECOGNITION_AVAILABLE
+    if FACIAL_RECOGNITION_AVAILABLE is None:
+        with _import_lock:
+            if FACIAL_RECOGNITION_AVAILABLE is None:
+                try:
+                    from advanced_face_system import FacialRecognition as facial_recognition_class
+                    FacialRecognition = facial_recognition_class
+                    FACIAL_RECOGNITION_AVAILABLE = True
+                    logger.info("Sistema facial importado desde %s", FACE_RECOGNITION_DIR)
+                except ImportError as e:
+                    logger.warning("Sistema facial no disponible: %s", e)
+                    FACIAL_RECOGNITION_AVAILABLE = False
+    return FacialRecognition
+
+
+def read_image_bytes(photo_data):
+    """
+    Bytes codificados (JPEG/PNG) de una foto recibida por cualquiera de los transportes
+
+    Args:
+        photo_data: Archivo subido (multipart o cuerpo binario), bytes o string base64
+            (con o sin prefijo data URL)
+
+    Returns:
+        numpy.ndarray uint8 con los bytes de la imagen
+    """
+    if hasattr(photo_data, 'temporary_file_path'):
+        # Archivo en disco: se lee directo al buffer sin pasar por el objeto Python
+        return np.fromfile(photo_data.temporary_file_path(), dtype=np.uint8)
+    if hasattr(photo_data, 'read'):
+        photo_data.seek(0)
+        return np.frombuffer(photo_data.read(), dtype=np.uint8)
+    if isinstance(photo_data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(photo_data, dtype=np.uint8)
+    if ',' in photo_data:
+        photo_data = photo_data.split(',', 1)[1]
+    return np.frombuffer(base64.b64decode(photo_data), dtype=np.uint8)
 
-try:
-    from advanced_face_system import FacialRecognition
-    FACIAL_RECOGNITION_AVAILABLE = True
-    print(f"✅ Sistema facial importado correctamente desde: {FACE_RECOGNITION_DIR}")
-    print(f"   - FacialRecognition class: {FacialRecognition}")
-    print(f"   - FacialRecognition type: {type(FacialRecognition)}")
-except ImportError as e:
-    print(f"⚠️ Sistema facial no disponible: {e}")
-    print(f"   Path actual: {sys.path}")
-    print(f"   Archivo buscado: {os.path.join(FACE_RECOGNITION_DIR, 'advanced_face_system.py')}")
-    FacialRecognition = None
-    FACIAL_RECOGNITION_AVAILABLE = False
 
 class FaceRecognitionService:
     """Servicio para integrar el sistema de reconocimiento facial"""
     
-    def __init__(self):
-        print(f"🔍 DEBUG: INICIALIZANDO FaceRecognitionService")
-        print(f"   - Current working directory: {os.getcwd()}")
-        print(f"   - BASE_DIR: {settings.BASE_DIR}")
+    def __init__(self, warm_up_models=True, base_dir=None):
+        """
+        Args:
+            warm_up_models: Ejecutar inferencias de prueba al cargar (False solo carga
+                los pesos; ver core/services/face_runtime.py)
+            base_dir: Directorio alternativo para faces/ con un índice privado
+                (benchmarks); None = face_recognition/ del proyecto
+        """
         
-        self.face_system_path = os.path.join(settings.BASE_DIR, 'face_recognition')
+        # Lado mayor al que se decodifican las fotos (lo que necesita el detector)
+        self.decode_max_side = getattr(settings, 'FACE_DECODE_MAX_SIDE', 640)
+        # Control de calidad entre la detección y el modelo (None = desactivado)
+        self.quality_gate = (
+            FaceQualityGate(**getattr(settings, 'FACE_QUALITY_THRESHOLDS', {}))
+            if getattr(settings, 'FACE_QUALITY_GATE', True) else None
+        )
+        self.face_system_path = base_dir or os.path.join(settings.BASE_DIR, 'face_recognition')
         self.faces_dir = os.path.join(self.face_system_path, 'faces')
         
-        print(f"   - face_system_path: {self.face_system_path}")
-        print(f"   - faces_dir: {self.faces_dir}")
-        print(f"   - face_system_path exists: {os.path.exists(self.face_system_path)}")
-        print(f"   - faces_dir exists: {os.path.exists(self.faces_dir)}")
         
         # Inicializar sistema facial si está disponible
-        print(f"   - FACIAL_RECOGNITION_AVAILABLE: {FACIAL_RECOGNITION_AVAILABLE}")
-        print(f"   - FacialRecognition class: {FacialRecognition}")
+        load_facial_recognition()
         
         if FACIAL_RECOGNITION_AVAILABLE:
             try:
-                print(f"   - Intentando crear FacialRecognition...")
+                # ✅ Una sola copia de los embeddings mapeada en memoria por todos los workers
                 self.facial_system = FacialRecognition(
                     base_dir=self.face_system_path,
-                    database_name="faces"
+                    database_name="faces",
+                    shared_store_dir=None if base_dir else shared_store_dir(),
+                    index_options=embedding_index_options(),
+                    batch_size=getattr(settings, 'FACE_EMBEDDING_BATCH_SIZE', 32),
+                    inference_client=build_inference_client(),
+                    cache_options={
+                        'max_bytes': int(getattr(settings, 'FACE_EMBEDDING_CACHE_MB', 32) * 1024 * 1024),
+                        'ttl': getattr(settings, 'FACE_EMBEDDING_CACHE_TTL', 120),
+                    },
+                    detector_options={
+                        'tiers': getattr(settings, 'FACE_DETECTOR_TIERS', ['haar', 'retinaface']),
+                        'budget_ms': getattr(settings, 'FACE_DETECTOR_BUDGET_MS', 800),
+                        'haar_max_side': getattr(settings, 'FACE_DETECTOR_HAAR_MAX_SIDE', 480),
+                        'retinaface_max_side': getattr(settings, 'FACE_DETECTOR_RETINAFACE_MAX_SIDE', 640),
+                        'probe_every': getattr(settings, 'FACE_DETECTOR_PROBE_EVERY', 20),
+                    },
+                    warm_up=warm_up_models
                 )
-                print(f"   - FacialRecognition creado: {self.facial_system}")
-                print(f"   - facial_system type: {type(self.facial_system)}")
-                print(f"   - facial_system is None: {self.facial_system is None}")
                 
                 if self.facial_system:
-                    print(f"   - facial_system methods: {[m for m in dir(self.facial_system) if not m.startswith('_')]}")
-                    print(f"   - facial_system base_dir: {getattr(self.facial_system, 'base_dir', 'N/A')}")
-                    print(f"   - facial_system face_dir: {getattr(self.facial_system, 'face_dir', 'N/A')}")
+                    logger.debug("Sistema facial inicializado en %s", self.face_system_path)
                 else:
-                    print(f"   ❌ FacialRecognition se creó pero es None")
+                    logger.error("FacialRecognition se creó pero es None")
                     
             except Exception as e:
-                print(f"   ❌ Error inicializando sistema facial: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error inicializando sistema facial: %s", e)
                 self.facial_system = None
         else:
-            print(f"   ❌ FACIAL_RECOGNITION_AVAILABLE es False")
+            logger.debug("Servicio facial creado sin sistema de reconocimiento")
             self.facial_system = None
-        
-        print(f"   - FINAL: facial_system = {self.facial_system}")
-        print(f"   - FINAL: facial_system is None = {self.facial_system is None}")
-        print(f"   - FINAL: bool(facial_system) = {bool(self.facial_system)}")
     
-    def register_employee_face(self, employee, photos_data):
+    def register_employee_face(self, employee, photos_data, progress=None):
         """Alias para mantener compatibilidad - redirige al método principal"""
-        return self.register_or_update_employee_face(employee, photos_data)
+        return self.register_or_update_employee_face(employee, photos_data, progress=progress)
     
-    def register_or_update_employee_face(self, employee, photos_data):
+    def register_or_update_employee_face(self, employee, photos_data, progress=None):
         """
         Registra o actualiza múltiples fotos de un empleado usando el sistema facial real
         ✅ OPTIMIZADO PARA VELOCIDAD: 15 fotos + procesamiento en lotes
-        """
-        print(f"🔍 FACE_SERVICE.register_or_update_employee_face INICIADO")
-        print(f"   - Employee: {employee.full_name}")
-        print(f"   - Photos data type: {type(photos_data)}")
-        print(f"   - Photos data length: {len(photos_data) if photos_data else 0}")
-        print(f"   - ⚠️ PROCESAMIENTO ÚNICO: Este método se ejecuta SOLO UNA VEZ")
-        
-        # 🔍 DEBUG: Verificar estado del servicio facial ANTES de procesar
-        print(f"\n🔍 DEBUG: VERIFICANDO ESTADO DEL SERVICIO FACIAL EN FACE_SERVICE")
-        print(f"   - self: {self}")
-        print(f"   - self type: {type(self)}")
-        print(f"   - self.facial_system: {self.facial_system}")
-        print(f"   - self.facial_system type: {type(self.facial_system)}")
-        print(f"   - self.facial_system is None: {self.facial_system is None}")
-        print(f"   - self.facial_system bool evaluation: {bool(self.facial_system)}")
-        print(f"   - self.face_system_path: {self.face_system_path}")
-        print(f"   - self.faces_dir: {self.faces_dir}")
         
-        if self.facial_system:
-            print(f"   - facial_system methods: {[m for m in dir(self.facial_system) if not m.startswith('_')]}")
-            print(f"   - facial_system base_dir: {getattr(self.facial_system, 'base_dir', 'N/A')}")
-            print(f"   - facial_system face_dir: {getattr(self.facial_system, 'face_dir', 'N/A')}")
-        else:
-            print("   ❌ facial_system es None o False")
-            
-        # 🔍 DEBUG: Verificar si hay algún problema con la inicialización
-        print(f"\n🔍 DEBUG: VERIFICANDO INICIALIZACIÓN DEL SERVICIO")
-        print(f"   - FACE_RECOGNITION_AVAILABLE (module level): {FACIAL_RECOGNITION_AVAILABLE}")
-        print(f"   - FacialRecognition class: {FacialRecognition}")
+        Args:
+            employee: Instancia del modelo Employee
+            photos_data: Lista de imágenes (base64 o archivos subidos)
+            progress: Función opcional progress(procesadas, guardadas, rechazadas)
+                para informar el avance por foto (registro en segundo plano)
+        """
+        logger.info("Registro facial de %s: %s fotos", employee.id, len(photos_data) if photos_data else 0)
         
         try:
             # Verificar si ya existe un perfil facial
@@ -133,19 +170,13 @@ class FaceRecognitionService:
             try:
                 existing_profile = employee.face_profile
                 is_update = True
-                print(f"🔄 ACTUALIZANDO REGISTRO FACIAL PARA EMPLEADO: {employee.full_name}")
-                print(f"📸 Fotos anteriores: {existing_profile.photos_count}")
+                logger.debug("Actualizando registro facial de %s (fotos anteriores: %s)", employee.id, existing_profile.photos_count)
             except FaceProfile.DoesNotExist:
-                print(f"🆕 NUEVO REGISTRO FACIAL PARA EMPLEADO: {employee.full_name}")
+                logger.debug("Nuevo registro facial de %s", employee.id)
             
-            print(f"📸 Fotos nuevas recibidas: {len(photos_data)}")
             
             if not self.facial_system:
-                print("❌ Sistema facial no disponible")
-                print("🔍 DEBUG: facial_system es None/False, verificando por qué...")
-                print(f"   - self.facial_system: {self.facial_system}")
-                print(f"   - bool(self.facial_system): {bool(self.facial_system)}")
-                print(f"   - self.facial_system is None: {self.facial_system is None}")
+                logger.warning("Sistema facial no disponible")
                 return {
                     'success': False,
                     'message': 'Sistema de reconocimiento facial no disponible'
@@ -156,95 +187,93 @@ class FaceRecognitionService:
             
             # ✅ NUEVA LÓGICA: SOLO USAR ID (más robusto)
             # Ya no usamos el nombre del empleado para evitar problemas de sincronización
-            print(f"🆔 ID del empleado: {employee_id}")
-            print(f"📝 Nombre del empleado: {employee.user.first_name} {employee.user.last_name}")
-            print(f"🎯 NUEVA ESTRATEGIA: Carpeta solo con ID para máxima robustez")
             
             # Crear carpeta para el empleado (SOLO ID - más robusto)
             employee_folder = os.path.join(self.faces_dir, f"{employee_id}")
             
             # Si es actualización, limpiar carpeta anterior
             if is_update and os.path.exists(employee_folder):
-                print(f"🧹 Limpiando carpeta anterior: {employee_folder}")
+                logger.debug("Limpiando carpeta anterior: %s", employee_folder)
                 import shutil
                 shutil.rmtree(employee_folder)
-                print(f"✅ Carpeta anterior eliminada")
             
             os.makedirs(employee_folder, exist_ok=True)
             
-            print(f"📁 Carpeta creada: {employee_folder}")
-            print(f"📁 Carpeta existe: {os.path.exists(employee_folder)}")
             
             # ✅ PROCESAMIENTO ULTRA-OPTIMIZADO: Decodificación en lote + procesamiento paralelo
             saved_photos = 0
             rejected_photos = 0
+            saved_features = []
+            quality_rejections = []
             total_photos = len(photos_data)
             
+            def report(processed):
+                if progress is None:
+                    return
+                try:
+                    progress(processed, saved_photos, rejected_photos)
+                except Exception as e:
+                    logger.warning("Error informando progreso: %s", e)
+            
             # ✅ OPTIMIZACIÓN ESPECIAL: Detectar si son pocas fotos para modo ultra-rápido
             if total_photos <= 20:
-                print(f"🚀 MODO ULTRA-RÁPIDO - {total_photos} fotos con Facenet-128")
-                print(f"⚡ VELOCIDAD MÁXIMA: Procesamiento directo sin lotes")
-                print(f"⏱️ Tiempo estimado: {total_photos * 0.2:.1f} segundos (MODO ULTRA-RÁPIDO)")
+                logger.debug("Modo directo: %s fotos", total_photos)
                 ultra_fast_mode = True
             else:
-                print(f"🚀 PROCESAMIENTO ULTRA-OPTIMIZADO - {total_photos} fotos con Facenet-128")
-                print(f"⚡ VELOCIDAD MÁXIMA: Decodificación en lote + procesamiento paralelo")
-                print(f"⏱️ Tiempo estimado: {total_photos * 0.3:.1f} segundos (ULTRA-OPTIMIZADO)")
+                logger.debug("Modo en lote: %s fotos", total_photos)
                 ultra_fast_mode = False
             
             if ultra_fast_mode:
                 # ✅ MODO ULTRA-RÁPIDO: Para pocas fotos (≤20)
-                print(f"⚡ MODO ULTRA-RÁPIDO: Procesando {total_photos} fotos directamente...")
                 
-                # Procesar cada foto directamente sin lotes
+                # Decodificar todas las fotos y extraer características en un solo lote
+                decoded = []
                 for i, photo_data in enumerate(photos_data):
                     try:
-                        print(f"📸 Procesando foto {i+1}/{total_photos}...")
-                        
-                        # Decodificar imagen
-                        face_image = self._decode_base64_image(photo_data)
-                        if face_image is None:
-                            print(f"   ❌ Foto {i+1} rechazada: Sin rostro válido")
-                            rejected_photos += 1
-                            continue
-                        
-                        # Extraer características
-                        features = self.facial_system.extract_face_features(face_image)
+                        face_image = self._decode_face(photo_data, quality_rejections)
+                    except Exception as e:
+                        logger.warning("Error decodificando foto %s: %s", i + 1, e)
+                        face_image = None
+                    if face_image is None:
+                        logger.debug("Foto %s rechazada: sin rostro válido", i + 1)
+                        rejected_photos += 1
+                        report(i + 1)
+                        continue
+                    decoded.append((i, face_image))
+                    report(i + 1)
+                
+                with span('embed', photos=len(decoded)):
+                    features_list = self.facial_system.batch_extract_features([face for _, face in decoded])
+                
+                for (i, face_image), features in zip(decoded, features_list):
+                    try:
                         if features is None:
-                            print(f"   ❌ Foto {i+1} sin características válidas")
+                            logger.debug("Foto %s sin características válidas", i + 1)
                             rejected_photos += 1
                             continue
                         
-                        # Guardar directamente
+                        # Guardar la foto; los embeddings se empaquetan al final en un solo archivo
                         timestamp = int(time.time() * 1000000) + i
                         photo_path = os.path.join(employee_folder, f"face_{timestamp}.jpg")
                         
                         if cv2.imwrite(photo_path, face_image, [cv2.IMWRITE_JPEG_QUALITY, 70]):
-                            embedding_path = photo_path.replace('.jpg', '.npy')
-                            np.save(embedding_path, features)
-                            
-                            if os.path.exists(embedding_path):
-                                saved_photos += 1
-                                print(f"   ✅ Foto {i+1} guardada exitosamente")
-                            else:
-                                rejected_photos += 1
-                                if os.path.exists(photo_path):
-                                    os.remove(photo_path)
+                            saved_photos += 1
+                            saved_features.append(features)
                         else:
                             rejected_photos += 1
-                            print(f"   ❌ Error guardando foto {i+1}")
+                            logger.warning("Error guardando foto %s", i + 1)
                             
                     except Exception as e:
                         rejected_photos += 1
-                        print(f"   ❌ Error procesando foto {i+1}: {e}")
+                        logger.warning("Error procesando foto %s: %s", i + 1, e)
                         continue
                         
             else:
                 # ✅ MODO NORMAL: Para muchas fotos (>20)
-                print(f"🔄 Decodificando {total_photos} imágenes en lote ultra-optimizado...")
                 
                 # Usar el nuevo método de decodificación en lote
-                face_images = self._batch_decode_base64_images(photos_data)
+                face_images = self._batch_decode_images(photos_data, quality_rejections)
+                report(len(face_images))
                 
                 # Filtrar imágenes válidas
                 valid_face_images = []
@@ -254,22 +283,19 @@ class FaceRecognitionService:
                     if face_image is not None:
                         valid_face_images.append(face_image)
                         valid_photos.append(i)
-                        print(f"   ✅ Foto {i+1} decodificada: {face_image.shape}")
                     else:
-                        print(f"   ❌ Foto {i+1} rechazada: Sin rostro válido")
+                        logger.debug("Foto %s rechazada: sin rostro válido", i + 1)
                         rejected_photos += 1
                 
-                print(f"📸 Imágenes válidas para procesamiento: {len(valid_face_images)}")
                 
                 # ✅ OPTIMIZACIÓN 2: Procesamiento en lote usando el sistema facial optimizado
                 if valid_face_images:
-                    print(f"🧠 Procesando {len(valid_face_images)} rostros en lote...")
                     
                     # Usar el nuevo método batch_extract_features del sistema facial
-                    features_list = self.facial_system.batch_extract_features(valid_face_images)
+                    with span('embed', photos=len(valid_face_images)):
+                        features_list = self.facial_system.batch_extract_features(valid_face_images)
                     
                     # ✅ OPTIMIZACIÓN 3: Guardar en paralelo usando ThreadPoolExecutor
-                    print(f"💾 Guardando {len(valid_face_images)} rostros en paralelo...")
                     
                     def save_face_data(args):
                         i, face_image, features, valid_photo_idx = args
@@ -280,23 +306,14 @@ class FaceRecognitionService:
                                 
                                 # ✅ OPTIMIZACIÓN: Compresión más rápida (70 en lugar de 85)
                                 if cv2.imwrite(photo_path, face_image, [cv2.IMWRITE_JPEG_QUALITY, 70]):
-                                    embedding_path = photo_path.replace('.jpg', '.npy')
-                                    np.save(embedding_path, features)
-                                    
-                                    if os.path.exists(embedding_path):
-                                        print(f"   ✅ Rostro {valid_photo_idx+1} guardado exitosamente")
-                                        return True
-                                    else:
-                                        if os.path.exists(photo_path):
-                                            os.remove(photo_path)
-                                        return False
+                                    return True
                                 else:
                                     return False
                             else:
-                                print(f"   ❌ Rostro {valid_photo_idx+1} sin características válidas")
+                                logger.debug("Rostro %s sin características válidas", valid_photo_idx + 1)
                                 return False
                         except Exception as e:
-                            print(f"   ❌ Error guardando rostro {valid_photo_idx+1}: {e}")
+                            logger.warning("Error guardando rostro %s: %s", valid_photo_idx + 1, e)
                             return False
                     
                     # ✅ PROCESAMIENTO PARALELO: Máximo 3 hilos para balance velocidad/estabilidad
@@ -306,22 +323,37 @@ class FaceRecognitionService:
                         
                         results = list(executor.map(save_face_data, save_args))
                         saved_photos = sum(results)
+                        saved_features = [f for f, ok in zip(features_list, results) if ok]
                         rejected_photos += (len(valid_face_images) - saved_photos)
             
-            print(f"🎯 Procesamiento ultra-optimizado completado: {saved_photos}/{total_photos} fotos procesadas")
-            print(f"✅ Servidor Django sigue funcionando - Terminal NO se cierra")
+            report(total_photos)
             
-            print(f"\n📊 RESUMEN DEL PROCESAMIENTO:")
-            print(f"   📸 Fotos procesadas: {saved_photos}")
-            print(f"   📁 Archivos en carpeta: {len(os.listdir(employee_folder)) if os.path.exists(employee_folder) else 0}")
+            # ✅ Un solo archivo empaquetado con todos los embeddings (escritura atómica)
+            if saved_features:
+                try:
+                    model_name = getattr(self.facial_system, 'model_name', 'Facenet')
+                    save_person_embeddings(
+                        employee_folder, saved_features, model_name,
+                        medoids=getattr(settings, 'FACE_TEMPLATE_MEDOIDS', 4)
+                    )
+                except Exception as e:
+                    logger.error("Error guardando embeddings empaquetados: %s", e)
+                    saved_photos = 0
+                    saved_features = []
+            
+            rejected_reasons = dict(Counter(quality_rejections))
             
             if saved_photos == 0:
-                print("❌ No se pudo procesar ninguna foto")
+                logger.info("Registro facial de %s: ninguna foto válida (rechazos por calidad: %s)", employee.id, rejected_reasons)
                 return {
                     'success': False,
-                    'message': 'No se pudo procesar ninguna foto'
+                    'message': 'No se pudo procesar ninguna foto',
+                    'rejected_reasons': rejected_reasons
                 }
             
+            # Mantener sincronizado el índice 1:N del sistema facial
+            self.facial_system.index.replace(employee_id, saved_features)
+            
             # Crear o actualizar perfil facial
             face_profile, created = FaceProfile.objects.get_or_create(
                 employee=employee,
@@ -339,20 +371,20 @@ class FaceRecognitionService:
                 face_profile.last_training = timezone.localtime()
                 face_profile.save()
             
-            print(f"✅ FACE_SERVICE: Registro facial completado exitosamente")
-            print(f"   - Fotos guardadas: {saved_photos}")
-            print(f"   - Empleado: {employee.full_name}")
-            print(f"   - Employee ID: {employee_id}")
+            logger.info(
+                "Registro facial de %s completado: %s/%s fotos, rechazos por calidad %s",
+                employee.id, saved_photos, total_photos, rejected_reasons
+            )
             
             result = {
                 'success': True,
                 'message': f'Registradas {saved_photos} fotos para {employee.full_name}',
                 'photos_count': saved_photos,
+                'rejected_photos': rejected_photos,
+                'rejected_reasons': rejected_reasons,
                 'employee_id': employee_id
             }
             
-            print(f"🔍 FACE_SERVICE: Retornando resultado: {result}")
-            print(f"✅ PROCESAMIENTO COMPLETADO: {saved_photos} fotos procesadas UNA SOLA VEZ")
             return result
             
         except Exception as e:
@@ -368,7 +400,7 @@ class FaceRecognitionService:
         
         Args:
             employee: Instancia del modelo Employee
-            photo_data: Imagen en base64
+            photo_data: Imagen en base64 o archivo subido
             
         Returns:
             dict: Resultado de la verificación
@@ -391,11 +423,9 @@ class FaceRecognitionService:
                 }
             
             try:
-                print(f"⚡ VERIFICACIÓN ULTRA-RÁPIDA para {employee.full_name}")
-                print(f"🎯 Objetivo: < 2 segundos de respuesta")
                 
-                # ✅ OPTIMIZACIÓN 1: Decodificación rápida CON extracción de rostro
-                captured_image = self._decode_base64_image_fast(photo_data)
+                # ✅ OPTIMIZACIÓN 1: Decodificación reducida al tamaño del detector
+                captured_image = self._decode_image(photo_data)
                 if captured_image is None:
                     return {
                         'success': False,
@@ -403,15 +433,32 @@ class FaceRecognitionService:
                         'message': 'Error procesando imagen capturada'
                     }
                 
+                # ✅ Reintentos y doble toque: mismo cuadro → detección y embedding desde la
+                # caché por contenido, compartidos con identify_person
+                cache = self.facial_system.cache
+                cache_key = cache.key_for(captured_image) if cache.enabled else None
+                
                 # ✅ OPTIMIZACIÓN 2: Extraer rostro de manera rápida
-                print(f"🔍 Extracción rápida de rostro para verificación...")
-                face_image = self._extract_face_region_fast(captured_image)
+                face_image = self._extract_face_region_fast(captured_image, cache_key)
                 
-                # ✅ OPTIMIZACIÓN 3: Verificación directa con Facenet-512
-                print(f"🔍 Verificación directa con Facenet-512...")
+                # ✅ Sin rostro y control de calidad antes del modelo (también con el
+                # embedding en caché: identify_person no aplica el control)
+                rejection = self._face_rejection(face_image)
+                if rejection is not None:
+                    logger.debug("Verificación de %s: cuadro rechazado (%s)", employee.id, rejection['reason'])
+                    return {
+                        'success': False,
+                        'verified': False,
+                        'message': rejection['message'],
+                        'reason': rejection['reason'],
+                        'quality': rejection['metrics']
+                    }
+                face_image = fit_to_input(face_image, self._face_input_size())
                 
-                # Generar embedding de la imagen del rostro extraído
-                captured_embedding = self.facial_system.extract_face_features(face_image)
+                # ✅ OPTIMIZACIÓN 3: Verificación directa con Facenet-512 (sin forward si el
+                # cuadro ya pasó por verify o identify)
+                with span('embed'):
+                    captured_embedding = self.facial_system.face_embedding(face_image, cache_key)
                 if captured_embedding is None:
                     return {
                         'success': False,
@@ -433,45 +480,33 @@ class FaceRecognitionService:
                         'message': 'Carpeta del empleado no encontrada'
                     }
                 
-                print(f"🔍 DEBUG - Carpeta del empleado: {employee_folder}")
-                print(f"🔍 DEBUG - Embedding capturado: {len(captured_embedding)}D, rango: [{captured_embedding.min():.3f}, {captured_embedding.max():.3f}]")
-                
-                # Buscar embeddings del empleado
-                best_similarity = 0.0
-                embeddings_found = 0
                 
-                for file_name in os.listdir(employee_folder):
-                    if file_name.endswith('.npy'):
-                        embedding_path = os.path.join(employee_folder, file_name)
-                        try:
-                            stored_embedding = np.load(embedding_path)
-                            
-                            # ✅ CALCULAR SIMILITUD USANDO FÓRMULA CORRECTA (como en el sistema anterior)
-                            # Usar similitud coseno que es más precisa para embeddings
-                            dot_product = np.dot(captured_embedding, stored_embedding)
-                            norm1 = np.linalg.norm(captured_embedding)
-                            norm2 = np.linalg.norm(stored_embedding)
-                            
-                            if norm1 > 0 and norm2 > 0:
-                                # Fórmula de similitud coseno normalizada a [0,1]
-                                similarity = (dot_product / (norm1 * norm2) + 1) / 2
-                            else:
-                                similarity = 0.0
-                            
-                            # ✅ DEBUG: Mostrar detalles de cada comparación
-                            print(f"   🔍 Embedding {embeddings_found+1}: rango [{stored_embedding.min():.3f}, {stored_embedding.max():.3f}], similitud: {similarity:.3f}")
-                            
-                            if similarity > best_similarity:
-                                best_similarity = similarity
-                            
-                            embeddings_found += 1
-                            
-                            # ✅ OPTIMIZACIÓN 4: Parar si ya encontramos una similitud alta
-                            if similarity >= 0.95:  # 95% de confianza
-                                break
-                                
-                        except Exception as e:
-                            continue
+                # ✅ Primero el conjunto compacto (centroide + medoides); todas las
+                # plantillas solo cuando el resultado queda cerca del umbral
+                dimension = captured_embedding.shape[0]
+                with span('template_load'):
+                    compact = load_compact_templates(employee_folder)
+                if compact is not None and compact.size and compact.shape[1] != dimension:
+                    compact = None
+                
+                def load_full_templates():
+                    with span('template_load', full_set=True):
+                        stored_embeddings, _ = load_person_embeddings(employee_folder)
+                    if stored_embeddings.size and stored_embeddings.shape[1] != dimension:
+                        logger.warning("Dimensión del embedding capturado (%s) distinta a la registrada (%s)", dimension, stored_embeddings.shape[1])
+                        return None
+                    return stored_embeddings
+                
+                # 'match' incluye la carga del conjunto completo cuando hace falta
+                with span('match') as timing:
+                    best_similarity, embeddings_found, used_full_set = verify_with_templates(
+                        captured_embedding,
+                        compact,
+                        load_full_templates,
+                        face_profile.confidence_threshold,
+                        margin=getattr(settings, 'FACE_TEMPLATE_MARGIN', 0.05)
+                    )
+                    timing['templates'] = embeddings_found
                 
                 if embeddings_found == 0:
                     return {
@@ -483,11 +518,11 @@ class FaceRecognitionService:
                 # ✅ OPTIMIZACIÓN 5: Umbral configurable para velocidad vs precisión
                 verified = best_similarity >= face_profile.confidence_threshold
                 
-                print(f"🎯 Resultado ultra-rápido:")
-                print(f"   Similitud máxima: {best_similarity:.3f}")
-                print(f"   Umbral configurado: {face_profile.confidence_threshold}")
-                print(f"   Embeddings comparados: {embeddings_found}")
-                print(f"   Verificación: {'✅ EXITOSA' if verified else '❌ FALLIDA'}")
+                logger.info(
+                    "Verificación de %s: %s (similitud %.3f, umbral %s, %s plantillas del conjunto %s)",
+                    employee.id, 'exitosa' if verified else 'fallida', best_similarity,
+                    face_profile.confidence_threshold, embeddings_found, 'completo' if used_full_set else 'compacto'
+                )
                 
                 message = f'Rostro verificado correctamente (Similitud: {best_similarity:.3f})' if verified else f'Rostro no reconocido (Similitud: {best_similarity:.3f})'
                 
@@ -500,7 +535,7 @@ class FaceRecognitionService:
                 }
                 
             except Exception as e:
-                print(f"❌ Error en verificación ultra-rápida: {e}")
+                logger.exception("Error en verificación de %s: %s", employee.id, e)
                 return {
                     'success': False,
                     'verified': False,
@@ -545,17 +580,11 @@ class FaceRecognitionService:
             
             if folder_exists:
                 try:
-                    files = os.listdir(employee_folder)
-                    
-                    # Contar fotos (.jpg) y embeddings (.npy) físicos
-                    for file in files:
-                        if file.endswith('.jpg'):
-                            physical_photos_count += 1
-                        elif file.endswith('.npy'):
-                            physical_embeddings_count += 1
-                            
+                    # Contar fotos (.jpg) y embeddings (archivo empaquetado o .npy antiguos)
+                    physical_photos_count = sum(1 for file in os.listdir(employee_folder) if file.endswith('.jpg'))
+                    physical_embeddings_count = count_person_embeddings(employee_folder)
                 except Exception as e:
-                    print(f"⚠️ Error contando archivos físicos: {e}")
+                    logger.warning("Error contando archivos físicos: %s", e)
                     physical_photos_count = 0
                     physical_embeddings_count = 0
             
@@ -591,292 +620,166 @@ class FaceRecognitionService:
     def _extract_face_region(self, image):
         """
         Extrae y recorta automáticamente la región del rostro
-        ✅ IMPLEMENTACIÓN PERMISIVA - Procesa incluso si no detecta rostros claramente
         
         Args:
             image: Imagen OpenCV (numpy array)
             
         Returns:
-            numpy.ndarray: Imagen recortada del rostro o la imagen completa si no se detecta
+            numpy.ndarray: Recorte del rostro, un arreglo vacío si el rostro es
+            demasiado pequeño o None si no se detectó ninguno (el cuadro completo no
+            se usa: pasaría el control de tamaño sin contener un rostro)
         """
+        if not self.facial_system:
+            return image  # Sin detector no hay recorte posible
+        
         try:
-            print("      ✂️ Verificación PERMISIVA de rostro...")
-            
-            if not self.facial_system:
-                print("      ⚠️ Sistema facial NO disponible - Usando imagen completa")
-                return image  # ✅ FALLBACK: Usar imagen completa
-            
-            try:
-                # Detectar rostros en la imagen
+            with span('detect'):
                 faces_detected = self.facial_system.detect_faces(image)
-                
-                if faces_detected and len(faces_detected) > 0:
-                    # Tomar el primer rostro detectado
-                    face = faces_detected[0]
-                    
-                    # Extraer coordenadas del rostro (corregido para coincidir con detect_faces)
-                    x, y, w, h = face['x'], face['y'], face['width'], face['height']
-                    
-                    # Verificar que el rostro tenga un tamaño mínimo válido
-                    min_face_size = 20  # Muy permisivo
-                    if w < min_face_size or h < min_face_size:
-                        print(f"      ⚠️ Rostro muy pequeño: {w}x{h} - Usando imagen completa")
-                        return image  # ✅ FALLBACK: Usar imagen completa
-                    
-                    # Agregar margen alrededor del rostro (20% como en el sistema anterior)
-                    margin = int(min(w, h) * 0.2)
-                    x1 = max(0, x - margin)
-                    y1 = max(0, y - margin)
-                    x2 = min(image.shape[1], x + w + margin)
-                    y2 = min(image.shape[0], y + h + margin)
-                    
-                    # Verificar que la región extraída sea válida
-                    if x2 <= x1 or y2 <= y1:
-                        print(f"      ⚠️ Región de rostro inválida - Usando imagen completa")
-                        return image  # ✅ FALLBACK: Usar imagen completa
-                    
-                    # Recortar la región del rostro
-                    face_region = image[y1:y2, x1:x2]
-                    
-                    # Verificar que la región extraída no esté vacía
-                    if face_region.size == 0:
-                        print(f"      ⚠️ Región de rostro vacía - Usando imagen completa")
-                        return image  # ✅ FALLBACK: Usar imagen completa
-                    
-                    print(f"      ✅ ROSTRO VÁLIDO extraído: {face_region.shape}")
-                    print(f"      🏠 Región original: {image.shape}")
-                    print(f"      📐 Región del rostro: {face_region.shape}")
-                    print(f"      📍 Coordenadas: x={x1}-{x2}, y={y1}-{y2}")
-                    print(f"      🎯 Tamaño del rostro: {w}x{h}")
-                    
-                    return face_region
-                else:
-                    print("      ⚠️ NO SE DETECTARON ROSTROS - Usando imagen completa")
-                    return image  # ✅ FALLBACK: Usar imagen completa
-                    
-            except Exception as e:
-                print(f"      ⚠️ Error en detección de rostros: {e}")
-                print("      ✅ FALLBACK: Usando imagen completa")
-                return image  # ✅ FALLBACK: Usar imagen completa
-                
         except Exception as e:
-            print(f"      ⚠️ Error crítico en extracción de rostro: {e}")
-            print("      ✅ FALLBACK: Usando imagen completa")
-            return image  # ✅ FALLBACK: Usar imagen completa
+            logger.warning("Error en detección de rostros: %s", e)
+            return None
+        return self._crop_first_face(image, faces_detected)
 
-    def _extract_face_region_fast(self, image):
+    def _extract_face_region_fast(self, image, cache_key=None):
         """
         Extracción ULTRA-RÁPIDA del rostro para verificación
         ✅ Versión optimizada sin logs detallados
         
         Args:
             image: Imagen OpenCV (numpy array)
+            cache_key: Clave de la caché por contenido (reutiliza la detección)
             
         Returns:
-            numpy.ndarray: Imagen recortada del rostro o la imagen completa
+            numpy.ndarray: Igual que _extract_face_region
         """
+        if not self.facial_system:
+            return image  # Sin detector no hay recorte posible
+        
         try:
-            if not self.facial_system:
-                return image  # ✅ FALLBACK: Usar imagen completa
-            
-            # Detectar rostros en la imagen
-            faces_detected = self.facial_system.detect_faces(image)
-            
-            if faces_detected and len(faces_detected) > 0:
-                # Tomar el primer rostro detectado
-                face = faces_detected[0]
-                
-                # Extraer coordenadas del rostro (corregido para coincidir con detect_faces)
-                x, y, w, h = face['x'], face['y'], face['width'], face['height']
-                
-                # Verificar que el rostro tenga un tamaño mínimo válido
-                min_face_size = 20  # Muy permisivo
-                if w < min_face_size or h < min_face_size:
-                    return image  # ✅ FALLBACK: Usar imagen completa
-                
-                # Agregar margen alrededor del rostro (20% como en el sistema anterior)
-                margin = int(min(w, h) * 0.2)
-                x1 = max(0, x - margin)
-                y1 = max(0, y - margin)
-                x2 = min(image.shape[1], x + w + margin)
-                y2 = min(image.shape[0], y + h + margin)
-                
-                # Verificar que la región extraída sea válida
-                if x2 <= x1 or y2 <= y1:
-                    return image  # ✅ FALLBACK: Usar imagen completa
-                
-                # Recortar la región del rostro
-                face_region = image[y1:y2, x1:x2]
-                
-                # Verificar que la región extraída no esté vacía
-                if face_region.size == 0:
-                    return image  # ✅ FALLBACK: Usar imagen completa
-                
-                return face_region
-            else:
-                return image  # ✅ FALLBACK: Usar imagen completa
-                
+            # Detectar rostros en la imagen (sin 'tier' del detector = resultado de la caché)
+            with span('detect') as timing:
+                faces_detected = self.facial_system.detect_faces_cached(image, cache_key)
+                timing.setdefault('tier', 'cache')
         except Exception as e:
-            return image  # ✅ FALLBACK: Usar imagen completa
+            logger.warning("Error en detección de rostros: %s", e)
+            return None
+        return self._crop_first_face(image, faces_detected)
+
+    @staticmethod
+    def _crop_first_face(image, faces_detected):
+        """Recorte con margen del primer rostro (None sin rostros, vacío si es muy pequeño)"""
+        if not faces_detected:
+            logger.debug("No se detectaron rostros")
+            return None
+        face_region = crop_face(image, faces_detected[0])
+        return face_region if face_region is not None else image[:0, :0]
+
+    def _face_rejection(self, face_image):
+        """
+        Motivo por el que un recorte no sirve para el modelo
+        
+        Sin rostro ('no_face') o con un rostro demasiado pequeño ('too_small') se
+        rechaza aunque el control de calidad esté desactivado.
+        
+        Returns:
+            dict de FaceQualityGate.check con 'ok' = False, o None si el recorte sirve
+        """
+        if face_image is None or not face_image.size:
+            return FaceQualityGate.rejection('no_face' if face_image is None else 'too_small')
+        quality = self._check_quality(face_image)
+        if quality is not None and not quality['ok']:
+            return quality
+        return None
 
-    def _decode_base64_image_fast(self, base64_data):
+    def _face_input_size(self):
+        """Tamaño (alto, ancho) de entrada del modelo de embeddings"""
+        model_name = getattr(self.facial_system, 'model_name', 'Facenet')
+        return MODEL_INPUT_SIZES.get(model_name, (160, 160))
+
+    def _decode_image(self, photo_data):
         """
-        Decodificación ULTRA-RÁPIDA para verificación de asistencia
-        ✅ SIN extracción de rostro para máxima velocidad
+        Decodifica una foto al tamaño que necesita el detector
+        ✅ JPEG grandes con decodificación reducida (1/2, 1/4, 1/8) directo desde el buffer
         
         Args:
-            base64_data: String con datos de imagen en base64
+            photo_data: Imagen en base64, bytes o archivo subido
             
         Returns:
-            numpy.ndarray: Imagen OpenCV lista para procesar
+            numpy.ndarray: Cuadro BGR con el lado mayor <= FACE_DECODE_MAX_SIDE o None
         """
         try:
-            # ✅ OPTIMIZACIÓN: Sin logs para máxima velocidad
-            # Remover prefijo data URL si existe
-            if ',' in base64_data:
-                base64_data = base64_data.split(',')[1]
-            
-            # Decodificar base64
-            image_bytes = base64.b64decode(base64_data)
-            
-            # Convertir a imagen PIL
-            pil_image = Image.open(BytesIO(image_bytes))
-            
-            # Convertir a RGB si es necesario
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
-            # Convertir a numpy array (OpenCV format BGR)
-            opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            
-            return opencv_image
-            
+            with span('decode'):
+                return decode_image(read_image_bytes(photo_data), max_side=self.decode_max_side)
         except Exception as e:
-            print(f"❌ Error en decodificación rápida: {e}")
+            logger.warning("Error decodificando imagen: %s", e)
             return None
 
-    def _decode_base64_image(self, base64_data):
+    def _decode_face(self, photo_data, rejections=None):
         """
-        Decodifica imagen base64 y extrae automáticamente el rostro - OPTIMIZADO PARA VELOCIDAD
-        ✅ ULTRA-OPTIMIZADO: Menos logs, procesamiento más directo
+        Decodifica una foto y devuelve el rostro listo para el modelo
         
         Args:
-            base64_data: String con datos de imagen en base64
+            photo_data: Imagen en base64, bytes o archivo subido
+            rejections: Lista donde se agrega el código de motivo si la foto no
+                pasa el control de calidad
             
         Returns:
-            numpy.ndarray: Imagen del rostro recortada o None si hay error
+            numpy.ndarray: Recorte del rostro ajustado al tamaño de entrada del
+            modelo, o None si hay error, no se detectó rostro o la calidad no es
+            suficiente
         """
-        try:
-            # ✅ OPTIMIZACIÓN: Remover prefijo data URL de forma más eficiente
-            if ',' in base64_data:
-                base64_data = base64_data.split(',', 1)[1]  # Solo dividir una vez
-            
-            # ✅ OPTIMIZACIÓN: Decodificación directa sin logs excesivos
-            image_bytes = base64.b64decode(base64_data)
-            
-            # ✅ OPTIMIZACIÓN: Usar OpenCV directamente para decodificar (más rápido que PIL)
-            try:
-                # Decodificar directamente con OpenCV (más rápido)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                opencv_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if opencv_image is None:
-                    # Fallback a PIL si OpenCV falla
-                    pil_image = Image.open(BytesIO(image_bytes))
-                    if pil_image.mode != 'RGB':
-                        pil_image = pil_image.convert('RGB')
-                    opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-                
-            except Exception as e:
-                # Fallback completo a PIL
-                pil_image = Image.open(BytesIO(image_bytes))
-                if pil_image.mode != 'RGB':
-                    pil_image = pil_image.convert('RGB')
-                opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            
-            # ✅ OPTIMIZACIÓN: Extracción de rostro más eficiente
-            face_image = self._extract_face_region(opencv_image)
-            
-            # ✅ OPTIMIZACIÓN: Retornar imagen procesada o original
-            return face_image if face_image is not None else opencv_image
-            
-        except Exception as e:
-            print(f"      ❌ Error decodificando imagen: {e}")
+        image = self._decode_image(photo_data)
+        if image is None:
             return None
-    
-    def _batch_decode_base64_images(self, base64_data_list):
+        face_image = self._extract_face_region(image)
+        
+        rejection = self._face_rejection(face_image)
+        if rejection is not None:
+            logger.debug("Foto rechazada (%s): %s", rejection['reason'], rejection['metrics'])
+            if rejections is not None:
+                rejections.append(rejection['reason'])
+            return None
+        return fit_to_input(face_image, self._face_input_size())
+
+    def _check_quality(self, face_image):
+        """Resultado de FaceQualityGate.check o None si el control está desactivado"""
+        if self.quality_gate is None:
+            return None
+        with span('quality') as timing:
+            quality = self.quality_gate.check(face_image)
+            timing['result'] = quality['reason'] or 'ok'
+        return quality
+
+    def _batch_decode_images(self, photos_data, rejections=None):
         """
-        ✅ NUEVO MÉTODO: Decodifica múltiples imágenes base64 en lote
-        OPTIMIZADO PARA VELOCIDAD - Procesa múltiples imágenes simultáneamente
+        Decodifica varias fotos en paralelo (OpenCV libera el GIL al decodificar)
+        
+        Solo hay un cuadro completo por hilo a la vez; lo que se conserva son los
+        recortes ya reducidos al tamaño del modelo.
         
         Args:
-            base64_data_list: Lista de strings con datos de imagen en base64
+            photos_data: Lista de imágenes en base64, bytes o archivos subidos
+            rejections: Lista donde se agregan los códigos de motivo de calidad
             
         Returns:
-            Lista de imágenes OpenCV o None para imágenes fallidas
+            Lista de recortes o None para las fotos fallidas
         """
-        try:
-            print(f"🚀 DECODIFICACIÓN EN LOTE: {len(base64_data_list)} imágenes")
-            
-            def decode_single_image(base64_data):
-                try:
-                    # ✅ OPTIMIZACIÓN: Remover prefijo data URL de forma más eficiente
-                    if ',' in base64_data:
-                        base64_data = base64_data.split(',', 1)[1]
-                    
-                    # ✅ OPTIMIZACIÓN: Decodificación directa
-                    image_bytes = base64.b64decode(base64_data)
-                    
-                    # ✅ OPTIMIZACIÓN: Usar OpenCV directamente
-                    nparr = np.frombuffer(image_bytes, np.uint8)
-                    opencv_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    
-                    if opencv_image is None:
-                        # Fallback a PIL
-                        pil_image = Image.open(BytesIO(image_bytes))
-                        if pil_image.mode != 'RGB':
-                            pil_image = pil_image.convert('RGB')
-                        opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-                    
-                    # ✅ OPTIMIZACIÓN: Extracción de rostro
-                    face_image = self._extract_face_region(opencv_image)
-                    return face_image if face_image is not None else opencv_image
-                    
-                except Exception as e:
-                    print(f"      ❌ Error decodificando imagen: {e}")
-                    return None
-            
-            # ✅ PROCESAMIENTO PARALELO: Decodificar en lotes de 5
-            batch_size = 5
-            all_images = []
-            
-            for i in range(0, len(base64_data_list), batch_size):
-                batch = base64_data_list[i:i + batch_size]
-                print(f"   📦 Decodificando lote {i//batch_size + 1}: {len(batch)} imágenes")
-                
-                # Procesar lote en paralelo
-                with ThreadPoolExecutor(max_workers=3) as executor:
-                    batch_results = list(executor.map(decode_single_image, batch))
-                    all_images.extend(batch_results)
-            
-            successful = sum(1 for img in all_images if img is not None)
-            print(f"✅ DECODIFICACIÓN EN LOTE COMPLETADA: {successful}/{len(base64_data_list)} exitosas")
-            
-            return all_images
-            
-        except Exception as e:
-            print(f"❌ Error en decodificación en lote: {e}")
-            return [None] * len(base64_data_list)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            face_images = list(executor.map(bind(lambda photo: self._decode_face(photo, rejections)), photos_data))
+        
+        successful = sum(1 for img in face_images if img is not None)
+        logger.debug("Decodificación en lote: %s/%s fotos válidas", successful, len(photos_data))
+        return face_images
     
     def _save_base64_image(self, base64_data, file_path):
         """Guarda una imagen desde base64"""
         try:
-            opencv_image = self._decode_base64_image(base64_data)
+            opencv_image = self._decode_face(base64_data)
             if opencv_image is not None:
                 cv2.imwrite(file_path, opencv_image)
                 return True
         except Exception as e:
-            print(f"Error guardando imagen: {e}")
+            logger.warning("Error guardando imagen: %s", e)
         return False
 
 
@@ -1,90 +1,119 @@
 """
 Singleton para el servicio de reconocimiento facial
 Se inicializa una sola vez y se reutiliza para todas las consultas
+
+El servicio (y con él DeepFace/TensorFlow) se crea en la primera consulta facial o
+al llamar a warm_up(); importar este módulo no carga ningún modelo. Con
+FACE_STACK_LOADING = 'eager' se crea al importar, como antes.
 """
 
+from django.conf import settings
+from .face_inference import inference_address
 from .face_service import FaceRecognitionService
+import logging
 import os
 import sys
+import threading
+
+logger = logging.getLogger(__name__)
 
 class FaceServiceSingleton:
-    """Singleton para el servicio de reconocimiento facial"""
+    """Singleton para el servicio de reconocimiento facial (carga perezosa)"""
     
     _instance = None
     _service = None
+    _loaded = False
+    _lock = threading.RLock()
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(FaceServiceSingleton, cls).__new__(cls)
-            # Inicializar el servicio solo una vez
-            print("🚀 Inicializando servicio facial singleton...")
-            cls._service = cls._create_service()
-            print("✅ Servicio facial singleton inicializado")
+            if getattr(settings, 'FACE_STACK_LOADING', 'lazy') == 'eager':
+                cls._instance.warm_up()
         return cls._instance
     
+    @property
+    def is_loaded(self):
+        """True si ya se intentó crear el servicio en este proceso"""
+        return self._loaded
+    
+    def warm_up(self, warm_models=True):
+        """
+        Crea el servicio y carga los modelos ahora (procesos que atienden rostros)
+        
+        Args:
+            warm_models: Ejecutar inferencias de prueba; False solo carga los pesos
+        """
+        with self._lock:
+            if not self._loaded:
+                logger.info("Inicializando servicio facial")
+                FaceServiceSingleton._service = self._create_service(warm_models)
+                FaceServiceSingleton._loaded = True
+                logger.info("Servicio facial inicializado (disponible: %s)", FaceServiceSingleton._service is not None)
+        return self._service
+    
     @classmethod
-    def _create_service(cls):
+    def _create_service(cls, warm_models=True):
         """Crear el servicio facial con manejo de errores robusto"""
         try:
             # ✅ SOLUCIÓN RÁPIDA: Usar el entorno virtual de Django en lugar del directorio local
             # El problema es que face_recognition tiene su propio requirements.txt pero deepface está en venv
-            print("🔧 SOLUCIÓN RÁPIDA: Usando entorno virtual de Django para deepface")
             
             # Verificar que el directorio de reconocimiento facial existe
             face_recognition_dir = os.path.join(os.getcwd(), 'face_recognition')
             if not os.path.exists(face_recognition_dir):
-                print(f"❌ Directorio de reconocimiento facial no encontrado: {face_recognition_dir}")
+                logger.error("Directorio de reconocimiento facial no encontrado: %s", face_recognition_dir)
                 return None
             
             # ✅ AGREGAR EL DIRECTORIO AL PATH DE DJANGO (no al path local)
             if face_recognition_dir not in sys.path:
                 sys.path.insert(0, face_recognition_dir)
-                print(f"✅ Directorio agregado al path de Django: {face_recognition_dir}")
+                logger.debug("Directorio agregado al path: %s", face_recognition_dir)
             
             # ✅ VERIFICAR QUE DEEPFACE ESTÁ DISPONIBLE EN EL ENTORNO VIRTUAL
-            try:
-                import deepface
-                print(f"✅ DeepFace disponible en entorno virtual: {deepface.__version__}")
-            except ImportError as e:
-                print(f"❌ DeepFace no disponible en entorno virtual: {e}")
-                print("💡 Asegúrate de que estés usando: venv\\Scripts\\activate.ps1")
-                return None
+            # (con servidor de inferencia el worker no lo importa: corre en ese proceso)
+            if not inference_address():
+                try:
+                    import deepface
+                    logger.debug("DeepFace %s disponible", deepface.__version__)
+                except ImportError as e:
+                    logger.warning("DeepFace no disponible: %s", e)
+                    return None
             
             # Intentar importar el sistema facial
             try:
                 from advanced_face_system import FacialRecognition
-                print(f"✅ FacialRecognition importado correctamente")
             except ImportError as e:
-                print(f"❌ Error importando FacialRecognition: {e}")
-                print("🔍 Verificando dependencias del sistema facial...")
+                logger.warning("Error importando FacialRecognition: %s", e)
                 return None
             
             # Crear el servicio
-            service = FaceRecognitionService()
+            service = FaceRecognitionService(warm_up_models=warm_models)
             
             # Verificar que el servicio se creó correctamente
             if service and hasattr(service, 'facial_system') and service.facial_system:
-                print(f"✅ Servicio facial creado exitosamente")
                 return service
             else:
-                print(f"❌ Servicio facial no se creó correctamente")
+                logger.warning("Servicio facial creado sin sistema de reconocimiento")
                 return None
                 
         except Exception as e:
-            print(f"❌ Error creando servicio facial: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error creando servicio facial: %s", e)
             return None
     
     def get_service(self):
-        """Obtiene la instancia del servicio facial, reinicializa si es necesario"""
+        """Obtiene la instancia del servicio facial, la crea en el primer uso y reinicializa si es necesario"""
+        if not self._loaded:
+            return self.warm_up()
+        
         # Verificar si el servicio está disponible
         if not self._service or not hasattr(self._service, 'facial_system') or not self._service.facial_system:
-            print("⚠️ Servicio facial no disponible, intentando reinicializar...")
-            self._service = self._create_service()
+            with self._lock:
+                logger.warning("Servicio facial no disponible, intentando reinicializar")
+                FaceServiceSingleton._service = self._create_service()
             
             if not self._service or not hasattr(self._service, 'facial_system') or not self._service.facial_system:
-                print("❌ No se pudo reinicializar el servicio facial")
+                logger.warning("No se pudo reinicializar el servicio facial")
                 return None
         
         return self._service
@@ -109,7 +138,7 @@ class FaceServiceSingleton:
             }
         return service.verify_face(employee, photo)
     
-    def register_face(self, employee, photos_base64):
+    def register_face(self, employee, photos_base64, progress=None):
         """
         Registra o actualiza rostros de un empleado
         ✅ OPTIMIZADO: Sin refresh automático para evitar procesamiento duplicado
@@ -121,7 +150,7 @@ class FaceServiceSingleton:
                 'message': 'Sistema de reconocimiento facial no disponible'
             }
         
-        result = service.register_employee_face(employee, photos_base64)
+        result = service.register_employee_face(employee, photos_base64, progress=progress)
         # ❌ ELIMINADO: refresh_facial_system() que causaba procesamiento duplicado
         # El sistema facial se mantiene sincronizado automáticamente
         return result
@@ -134,14 +163,13 @@ class FaceServiceSingleton:
         service = self.get_service()
         if service and hasattr(service, 'facial_system') and service.facial_system:
             try:
-                print("🔄 Refrescando sistema facial...")
                 # Solo contar archivos, sin procesar imágenes
                 result = service.facial_system.get_face_count()
-                print(f"✅ Sistema facial refrescado: {result} rostros totales")
+                logger.debug("Sistema facial refrescado: %s rostros totales", result)
             except Exception as e:
-                print(f"⚠️ Error en refresh: {e}")
+                logger.warning("Error en refresh: %s", e)
         else:
-            print("⚠️ Sistema facial no disponible para refresh")
+            logger.warning("Sistema facial no disponible para refresh")
 
 # Instancia global del singleton
 face_service_singleton = FaceServiceSingleton()
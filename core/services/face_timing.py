@@ -0,0 +1,76 @@
+"""
+Tiempos por etapa de las acciones faciales expuestos a la API
+
+Las mediciones las hace face_recognition/stage_timing.py. Aquí se abre una traza por
+solicitud y, si el cliente envía la cabecera de depuración (FACE_TIMING_HEADER,
+por defecto ``X-Face-Timing: 1``), se devuelve el desglose en ``Server-Timing``:
+
+    Server-Timing: decode;dur=8.1, detect;desc="tier=haar";dur=3.0, quality;desc="result=ok";dur=1.1,
+                   embed;dur=95.4, template_load;dur=0.6, match;dur=0.2, verify_face;dur=112.9
+"""
+
+import os
+from functools import wraps
+
+from django.conf import settings
+
+from .face_paths import ensure_face_recognition_path
+
+ensure_face_recognition_path()
+from stage_timing import histograms, span, trace  # noqa: E402
+
+
+def wants_timing(request):
+    """True si la solicitud pidió el desglose de tiempos"""
+    header = getattr(settings, 'FACE_TIMING_HEADER', 'X-Face-Timing')
+    return str(request.headers.get(header, '')).lower() in ('1', 'true', 'yes')
+
+
+def timed_face_action(name):
+    """
+    Decorador para acciones de un ViewSet: mide la solicitud completa como la etapa
+    ``name`` y adjunta Server-Timing cuando se pide con la cabecera de depuración
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            with trace() as current:
+                with span(name):
+                    response = view(self, request, *args, **kwargs)
+            if wants_timing(request):
+                response['Server-Timing'] = current.server_timing()
+            return response
+        return wrapper
+    return decorator
+
+
+def timing_snapshot():
+    """
+    Histogramas de este proceso y estadísticas del detector y de la caché
+
+    Returns:
+        dict con 'pid', 'stages' (StageHistograms.snapshot), 'detector'
+        (FaceDetector.stats) y 'cache' (EmbeddingCache.stats); los dos últimos son
+        None si el sistema facial no está cargado
+    """
+    from .face_service_singleton import face_service_singleton
+
+    detector = cache = None
+    if face_service_singleton.is_loaded:
+        facial_system = getattr(face_service_singleton.get_service(), 'facial_system', None)
+        if facial_system is not None:
+            detector = facial_system.detector.stats()
+            cache = facial_system.cache.stats()
+    return {'pid': os.getpid(), 'stages': histograms.snapshot(), 'detector': detector, 'cache': cache}
+
+
+def reset_timings():
+    """Vacía los histogramas (y las estadísticas del detector y la caché si está cargado)"""
+    from .face_service_singleton import face_service_singleton
+
+    histograms.reset()
+    if face_service_singleton.is_loaded:
+        facial_system = getattr(face_service_singleton.get_service(), 'facial_system', None)
+        if facial_system is not None:
+            facial_system.detector.reset_stats()
+            facial_system.cache.reset_stats()
@@ -1,6 +1,11 @@
 from datetime import datetime, timedelta
+import numpy as np
 from django.utils import timezone
 from core.models import Area, AreaSchedule
+from core.services.area_cache import (
+    ACTIVE, DEFAULT_LATE_AFTER, END, GRACE, NO_TIME, START, area_cache, area_snapshot, seconds_of_day,
+    late_minutes_array, to_day_array, to_seconds_array, weekdays,
+)
 
 
 class ScheduleService:
@@ -12,34 +17,17 @@ class ScheduleService:
         Obtiene las horas esperadas de entrada y salida para un área en una fecha específica
         
         Args:
-            area: Instancia del modelo Area
+            area: Instancia del modelo Area, AreaSnapshot o id del área
             date: Fecha para la cual obtener el horario
             
         Returns:
             tuple: (hora_entrada_esperada, hora_salida_esperada) o (None, None) si no hay horario
         """
-        if not hasattr(area, 'schedule'):
+        snapshot = area_snapshot(area)
+        if snapshot is None or snapshot.schedule is None:
             return None, None
         
-        schedule = area.schedule
-        weekday = date.weekday()  # 0=Lunes, 6=Domingo
-        
-        if weekday == 0 and schedule.monday_active:
-            return schedule.monday_start, schedule.monday_end
-        elif weekday == 1 and schedule.tuesday_active:
-            return schedule.tuesday_start, schedule.tuesday_end
-        elif weekday == 2 and schedule.wednesday_active:
-            return schedule.wednesday_start, schedule.wednesday_end
-        elif weekday == 3 and schedule.thursday_active:
-            return schedule.thursday_start, schedule.thursday_end
-        elif weekday == 4 and schedule.friday_active:
-            return schedule.friday_start, schedule.friday_end
-        elif weekday == 5 and schedule.saturday_active:
-            return schedule.saturday_start, schedule.saturday_end
-        elif weekday == 6 and schedule.sunday_active:
-            return schedule.sunday_start, schedule.sunday_end
-        
-        return None, None
+        return snapshot.schedule.expected_times(date)
     
     @staticmethod
     def create_default_schedule(area):
@@ -85,34 +73,17 @@ class ScheduleService:
         Verifica si una fecha es un día laboral para un área
         
         Args:
-            area: Instancia del modelo Area
+            area: Instancia del modelo Area, AreaSnapshot o id del área
             date: Fecha a verificar
             
         Returns:
             bool: True si es día laboral, False en caso contrario
         """
-        if not hasattr(area, 'schedule'):
+        snapshot = area_snapshot(area)
+        if snapshot is None or snapshot.schedule is None:
             return False
         
-        schedule = area.schedule
-        weekday = date.weekday()
-        
-        if weekday == 0:
-            return schedule.monday_active
-        elif weekday == 1:
-            return schedule.tuesday_active
-        elif weekday == 2:
-            return schedule.wednesday_active
-        elif weekday == 3:
-            return schedule.thursday_active
-        elif weekday == 4:
-            return schedule.friday_active
-        elif weekday == 5:
-            return schedule.saturday_active
-        elif weekday == 6:
-            return schedule.sunday_active
-        
-        return False
+        return snapshot.schedule.is_work_day(date)
     
     @staticmethod
     def get_grace_period(area):
@@ -120,11 +91,78 @@ class ScheduleService:
         Obtiene el período de gracia para un área
         
         Args:
-            area: Instancia del modelo Area
+            area: Instancia del modelo Area, AreaSnapshot o id del área
             
         Returns:
             int: Minutos de tolerancia
         """
-        if hasattr(area, 'schedule'):
-            return area.schedule.grace_period_minutes
+        snapshot = area_snapshot(area)
+        if snapshot is not None and snapshot.schedule is not None:
+            return snapshot.schedule.grace_period_minutes
         return 15  # Valor por defecto
+    
+    @staticmethod
+    def classify(area, dates, check_ins=None):
+        """
+        Evalúa en bloque fechas y horas de entrada de un área con su horario compilado
+        
+        Args:
+            area: Instancia del modelo Area, AreaSnapshot o id del área
+            dates: Fechas (arreglo datetime64[D] o secuencia de date)
+            check_ins: Horas de entrada (segundos del día o secuencia de time/None)
+            
+        Returns:
+            dict de arreglos numpy (ver ScheduleSnapshot.evaluate); un área sin horario
+            no tiene días laborales y la tardanza usa el límite de las 8:30
+        """
+        snapshot = area_snapshot(area)
+        if snapshot is not None and snapshot.schedule is not None:
+            return snapshot.schedule.evaluate(dates, check_ins)
+        
+        days = to_day_array(dates)
+        result = {
+            'weekday': weekdays(days),
+            'is_work_day': np.zeros(len(days), dtype=bool),
+            'expected_check_in': np.full(len(days), NO_TIME, dtype=np.int32),
+            'expected_check_out': np.full(len(days), NO_TIME, dtype=np.int32),
+            'limit': np.full(len(days), DEFAULT_LATE_AFTER, dtype=np.int32),
+        }
+        if check_ins is not None:
+            seconds = to_seconds_array(check_ins)
+            result['is_late'] = (seconds != NO_TIME) & (seconds > DEFAULT_LATE_AFTER)
+            result['late_minutes'] = late_minutes_array(seconds, result['expected_check_in'])
+        return result
+    
+    @staticmethod
+    def effective_status_cutoffs(now=None):
+        """
+        Áreas cuyo horario de hoy ya pasó la hora límite de entrada o la de salida
+        
+        Es la parte que depende del horario en Attendance.update_status_dynamically:
+        sin entrada y pasada la hora límite → ausente; con entrada, sin salida y pasada
+        la hora de salida → presente (las tardanzas se mantienen). Solo cuentan las áreas con entrada y salida
+        definidas para hoy.
+        
+        Args:
+            now: Momento de referencia (ahora en la zona local por defecto)
+            
+        Returns:
+            tuple: (fecha de hoy, ids con límite de entrada vencido, ids con salida vencida)
+        """
+        now = now or timezone.localtime()
+        today = now.date()
+        weekday = today.weekday()
+        current = seconds_of_day(now.time())
+        past_limit, past_end = [], []
+        for area in area_cache.all():
+            if area.schedule is None:
+                continue
+            row = area.schedule.table[weekday]
+            if not row[ACTIVE] or row[START] == NO_TIME or row[END] == NO_TIME:
+                continue
+            # Mismo límite que datetime.combine(...) + tolerancia → .time() (da la vuelta a medianoche)
+            if current > (int(row[START]) + int(row[GRACE]) * 60) % 86400:
+                past_limit.append(area.id)
+            if current > row[END]:
+                past_end.append(area.id)
+        return today, past_limit, past_end
@@ -1,9 +1,11 @@
-from django.db.models.signals import post_save, post_init
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import date, timedelta
-from .models import User, Employee, Area, Attendance
+from .models import User, Employee, Area, AreaSchedule, Attendance
+from .services.area_cache import area_cache
+from .services import attendance_rollup
 import logging
 
 logger = logging.getLogger(__name__)
@@ -160,89 +162,70 @@ def auto_promote_to_admin_by_access(sender, instance, created, **kwargs):
             except Exception as e:
                 print(f"❌ Error verificando otros perfiles: {e}")
 
-@receiver(post_save, sender=Attendance)
-def process_incomplete_attendance_after_save(sender, instance, created, **kwargs):
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+@receiver(post_save, sender=AreaSchedule)
+@receiver(post_delete, sender=AreaSchedule)
+def invalidate_area_cache(sender, instance, **kwargs):
     """
-    Signal que se ejecuta automáticamente después de guardar una asistencia
-    Procesa asistencias incompletas del día anterior
+    Invalida la caché de áreas y horarios (core/services/area_cache.py) al guardar o
+    eliminar un área o su horario, en este proceso y en los demás workers
     """
-    try:
-        # Solo procesar si es una asistencia nueva o si se actualizó el check_out
-        if created or kwargs.get('update_fields') and 'check_out' in kwargs['update_fields']:
-            # Procesar asistencias incompletas del día anterior
-            yesterday = timezone.localtime().date() - timedelta(days=1)
-            process_incomplete_attendance_for_date(yesterday)
-            
-    except Exception as e:
-        logger.error(f"Error procesando asistencia incompleta automáticamente: {e}")
+    area_cache.invalidate()
 
-def process_incomplete_attendance_for_date(target_date):
+@receiver(pre_save, sender=Attendance)
+def remember_attendance_rollup_values(sender, instance, **kwargs):
     """
-    Procesa asistencias incompletas para una fecha específica
+    Guarda los valores actuales en la base de una asistencia que se va a modificar
+    (solo consulta si la instancia no se cargó con Attendance.from_db)
     """
-    try:
-        # Obtener asistencias incompletas del día objetivo
-        incomplete_attendances = Attendance.objects.filter(
-            date=target_date,
-            check_in__isnull=False,
-            check_out__isnull=True,
-            status__in=['present', 'late']  # Solo los que aún no son ausentes
-        )
-        
-        if not incomplete_attendances.exists():
-            return
-        
-        updated_count = 0
-        for attendance in incomplete_attendances:
-            try:
-                old_status = attendance.status
-                
-                # Marcar como ausente
-                if attendance.mark_as_absent_if_incomplete():
-                    updated_count += 1
-                    logger.info(f"🔄 {attendance.employee.full_name} ({target_date}): {old_status} → ausente (automático)")
-                    
-            except Exception as e:
-                logger.error(f"Error procesando {attendance.employee.full_name}: {e}")
-        
-        if updated_count > 0:
-            logger.info(f"✅ Procesamiento automático completado para {target_date}: {updated_count} estados actualizados")
-            
-    except Exception as e:
-        logger.error(f"Error en procesamiento automático para {target_date}: {e}")
+    if instance.pk is None or hasattr(instance, '_rollup_original'):
+        return
+    original = Attendance.objects.filter(pk=instance.pk).values_list(*attendance_rollup.ROLLUP_FIELDS).first()
+    instance._rollup_original = original
+
+@receiver(post_save, sender=Attendance)
+def update_attendance_rollup(sender, instance, created, raw=False, **kwargs):
+    """
+    Ajusta el resumen diario (DailyAttendanceRollup) con la diferencia entre los
+    valores anteriores y los guardados, dentro de la transacción de Attendance.save
+    """
+    if raw:
+        return
+    current = attendance_rollup.rollup_values(instance)
+    original = None if created else getattr(instance, '_rollup_original', None)
+    if original != current:
+        attendance_rollup.apply_changes([original] if original else [], [current])
+    instance._rollup_original = current
 
-@receiver(post_init, sender=Attendance)
-def process_incomplete_attendance_on_access(sender, instance, **kwargs):
+@receiver(post_delete, sender=Attendance)
+def remove_attendance_from_rollup(sender, instance, **kwargs):
+    """Resta la asistencia eliminada de su resumen diario"""
+    original = getattr(instance, '_rollup_original', None) or attendance_rollup.rollup_values(instance)
+    attendance_rollup.apply_changes(removed=[original])
+
+def process_incomplete_attendance_for_date(target_date):
     """
-    Signal que se ejecuta cuando se accede a una asistencia
-    Útil para procesar automáticamente al cargar reportes
+    Procesa asistencias incompletas para una fecha específica
+    (un UPDATE en bloque, ver core/services/day_close.py)
+    
+    Returns:
+        int: Asistencias marcadas como ausentes
     """
-    try:
-        # Solo procesar si es una asistencia del día anterior o anterior
-        if instance.date and instance.date < timezone.localtime().date():
-            # Procesar asistencias incompletas para esa fecha
-            process_incomplete_attendance_for_date(instance.date)
-            
-    except Exception as e:
-        logger.error(f"Error procesando asistencia al acceder: {e}")
+    from .services.day_close import close_incomplete_attendances
+    return close_incomplete_attendances(target_date)['updated']
 
-def auto_process_all_incomplete_attendances():
+def auto_process_all_incomplete_attendances(days=7):
     """
     Función que se puede llamar manualmente o programar
-    Procesa todas las asistencias incompletas de días anteriores
+    Procesa todas las asistencias incompletas de los últimos ``days`` días
+    
+    Returns:
+        dict: 'updated' y 'by_date' (ver close_incomplete_attendances)
     """
-    try:
-        today = timezone.localtime().date()
-        
-        # Procesar los últimos 7 días
-        for days_back in range(1, 8):
-            target_date = today - timedelta(days=days_back)
-            process_incomplete_attendance_for_date(target_date)
-            
-        logger.info("✅ Procesamiento automático de todas las asistencias incompletas completado")
-        
-    except Exception as e:
-        logger.error(f"Error en procesamiento automático general: {e}")
+    from .services.day_close import close_incomplete_attendances
+    today = timezone.localtime().date()
+    return close_incomplete_attendances(today - timedelta(days=days), today - timedelta(days=1))
 
 @receiver(post_save, sender=User)
 def force_password_change_for_new_users(sender, instance, created, **kwargs):
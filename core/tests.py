@@ -1,8 +1,52 @@
-from django.test import TestCase
+import base64
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
 from django.utils import timezone
 from datetime import datetime, timedelta, time
-from core.models import Employee, Area, Attendance, AreaSchedule
+from core.models import (
+    Employee, Area, Attendance, AreaSchedule, AttendanceCloseAudit, CacheGeneration, DailyAttendanceRollup,
+    DayCloseWatermark, FaceRegistrationJob,
+)
+from core.services.face_registration_jobs import run_registration_job
+from core.logging_utils import (
+    SampledDebugFilter, debug_enabled, reset_debug_sampled, set_debug_sampled, summarize_payload,
+)
+from core.services.benchmark import run_concurrent
+from core.services.face_service import read_image_bytes
 from core.services.schedule_service import ScheduleService
+from core.services.area_cache import area_cache
+from core.services.day_close import (
+    close_incomplete_attendances, close_pending_days, ensure_days_closed, forget_closed_days,
+)
+from core.services.attendance_rollup import late_minutes_for, rebuild_rollups
+
+from core.services.face_paths import ensure_face_recognition_path
+
+# Los módulos del sistema facial viven fuera del paquete core
+ensure_face_recognition_path()
+
+from embedding_index import EmbeddingIndex
+from embedding_store import (
+    append_person_embeddings, count_person_embeddings, load_compact_templates, load_person_embeddings,
+    pack_person_folder,
+)
+from template_compaction import verify_with_templates
+from batched_inference import BatchedEmbedder
+from inference_server import InferenceClient, InferenceServer
+from embedding_cache import EmbeddingCache
+from image_pipeline import decode_image, fit_to_input, jpeg_dimensions
+from face_detector import DetectorTier, FaceDetector
+from face_quality import FaceQualityGate
+import stage_timing
 
 
 class AttendanceValidationTests(TestCase):
@@ -163,3 +207,1105 @@ class AttendanceValidationTests(TestCase):
                 
                 self.assertTrue(is_too_early or is_too_late,
                               f"{invalid_time} debería estar fuera del rango válido ({min_time} - {max_time})")
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+    """Tests del índice en memoria para identificación 1:N"""
+    
+    def setUp(self):
+        self.face_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        for person in ['1', '2', '3']:
+            os.makedirs(os.path.join(self.face_dir, person))
+            for j in range(3):
+                np.save(os.path.join(self.face_dir, person, f'face_{j}.npy'), rng.normal(size=128))
+        self.probe = np.load(os.path.join(self.face_dir, '2', 'face_1.npy'))
+    
+    def test_search_returns_distinct_top_k(self):
+        """La búsqueda devuelve personas distintas ordenadas por similitud"""
+        index = EmbeddingIndex(self.face_dir)
+        matches = index.search(self.probe, top_k=3)
+        
+        self.assertEqual([label for label, _ in matches][0], '2')
+        self.assertEqual(len({label for label, _ in matches}), 3)
+        self.assertAlmostEqual(matches[0][1], 1.0, places=5)
+        self.assertGreaterEqual(matches[1][1], matches[2][1])
+    
+    def test_incremental_updates(self):
+        """Agregar y eliminar personas actualiza el índice sin releer el disco"""
+        index = EmbeddingIndex(self.face_dir)
+        index.ensure_loaded()
+        
+        index.remove('2')
+        self.assertEqual(len(index), 6)
+        self.assertNotEqual(index.search(self.probe)[0][0], '2')
+        
+        index.add('9', [self.probe])
+        self.assertEqual(index.search(self.probe)[0][0], '9')
+    
+    def test_shared_store_syncs_between_indexes(self):
+        """Dos índices sobre el mismo almacén compartido ven los cambios del otro"""
+        shared_dir = tempfile.mkdtemp()
+        worker_a = EmbeddingIndex(self.face_dir, shared_dir=shared_dir, sync_interval=0)
+        worker_b = EmbeddingIndex(self.face_dir, shared_dir=shared_dir, sync_interval=0)
+        self.assertEqual(worker_b.search(self.probe)[0][0], '2')
+        
+        worker_a.add('9', [self.probe * 2])
+        worker_a.remove('2')
+        self.assertEqual(worker_b.search(self.probe)[0][0], '9')
+        self.assertEqual(len(worker_b), 7)
+        self.assertIsInstance(worker_b._state['matrix'], np.memmap)
+    
+    def test_shared_store_rescans_when_faces_change_on_disk(self):
+        """Una generación armada con otro contenido de faces/ se reconstruye; el contador se lee con intervalo"""
+        shared_dir = tempfile.mkdtemp()
+        worker = EmbeddingIndex(self.face_dir, shared_dir=shared_dir, sync_interval=60, rescan_interval=0)
+        worker.ensure_loaded()
+        generation = worker._generation
+        
+        # Persona agregada al directorio sin pasar por el índice (otro proceso, copia manual)
+        os.makedirs(os.path.join(self.face_dir, '7'))
+        np.save(os.path.join(self.face_dir, '7', 'face_0.npy'), self.probe * 3)
+        self.assertEqual(len(worker.search(self.probe, top_k=4)), 3)
+        
+        worker.sync_interval = 0
+        self.assertEqual(len(worker.search(self.probe, top_k=4)), 4)
+        self.assertGreater(worker._generation, generation)
+        
+        # Un worker nuevo mapea la generación reconstruida sin volver a publicar
+        fresh = EmbeddingIndex(self.face_dir, shared_dir=shared_dir)
+        fresh.ensure_loaded()
+        self.assertEqual((fresh._generation, len(fresh)), (worker._generation, 10))
+    
+    def test_ivf_mode_matches_exact_with_all_lists(self):
+        """Revisando todas las listas IVF el resultado coincide con la búsqueda exacta"""
+        index = EmbeddingIndex(self.face_dir, mode='ivf', ivf_min_size=0)
+        stats = index.rebuild_ivf(nlist=3)
+        self.assertEqual(stats['embeddings'], 9)
+        
+        exact = index.search(self.probe, top_k=3, mode='exact')
+        approx = index.search(self.probe, top_k=3, nprobe=stats['nlist'])
+        self.assertEqual([label for label, _ in approx], [label for label, _ in exact])
+        self.assertEqual(index.search(self.probe, nprobe=1)[0][0], '2')
+
+
+class EmbeddingStoreTests(SimpleTestCase):
+    """Tests del archivo empaquetado de embeddings por persona"""
+    
+    def setUp(self):
+        self.folder = os.path.join(tempfile.mkdtemp(), '1Ana')
+        os.makedirs(self.folder)
+        rng = np.random.default_rng(1)
+        self.rows = [rng.normal(size=128).astype(np.float32) for _ in range(3)]
+        for j, row in enumerate(self.rows):
+            np.save(os.path.join(self.folder, f'face_{j}.npy'), row)
+    
+    def test_pack_legacy_folder(self):
+        """La migración junta los .npy en un solo archivo y los elimina"""
+        self.assertEqual(pack_person_folder(self.folder), 3)
+        self.assertFalse([f for f in os.listdir(self.folder) if f.endswith('.npy')])
+        
+        matrix, header = load_person_embeddings(self.folder)
+        self.assertFalse(header['legacy'])
+        self.assertEqual(header['model_name'], 'Facenet')
+        np.testing.assert_allclose(matrix, np.stack(self.rows))
+    
+    def test_append_and_count(self):
+        """Agregar embeddings conserva los existentes"""
+        append_person_embeddings(self.folder, [self.rows[0]], 'Facenet')
+        self.assertEqual(count_person_embeddings(self.folder), 4)
+        with self.assertRaises(ValueError):
+            append_person_embeddings(self.folder, [np.zeros(512)], 'Facenet512')
+
+    
+    def test_compact_templates_verification(self):
+        """El conjunto compacto decide lejos del umbral y el conjunto completo cerca de él"""
+        pack_person_folder(self.folder, medoids=2)
+        compact = load_compact_templates(self.folder)
+        self.assertEqual(compact.shape, (3, 128))
+        
+        full_loads = []
+        
+        def load_full():
+            full_loads.append(True)
+            return load_person_embeddings(self.folder)[0]
+        
+        accepted = verify_with_templates(self.rows[0], compact, load_full, threshold=0.9)
+        rejected = verify_with_templates(-self.rows[0], compact, load_full, threshold=0.9)
+        self.assertGreaterEqual(accepted[0], 0.9)
+        self.assertLess(rejected[0], 0.85)
+        self.assertFalse(full_loads)
+        
+        similarity, compared, used_full = verify_with_templates(self.rows[0], compact, load_full, threshold=1.1, margin=0.5)
+        self.assertTrue(used_full)
+        self.assertEqual(compared, 6)
+        self.assertAlmostEqual(similarity, 1.0, places=5)
+
+
+class BatchedEmbedderTests(SimpleTestCase):
+    """Tests de la inferencia por lotes del modelo de embeddings"""
+    
+    class FakeModel:
+        input_shape = (160, 160)
+        
+        def __init__(self):
+            self.batches = []
+        
+        def model(self, batch, training=False):
+            self.batches.append(batch.shape)
+            return batch.mean(axis=(1, 2))
+    
+    def test_one_forward_per_batch(self):
+        """50 rostros con lotes de 32 se resuelven en 2 llamadas al modelo"""
+        embedder = BatchedEmbedder('Facenet', batch_size=32)
+        embedder._model = self.FakeModel()
+        faces = [np.full((90, 70, 3), i, dtype=np.uint8) for i in range(50)]
+        faces[3] = None
+        
+        embeddings = embedder.embed(faces)
+        
+        self.assertEqual(embedder._model.batches, [(32, 160, 160, 3), (17, 160, 160, 3)])
+        self.assertIsNone(embeddings[3])
+        self.assertEqual(len(embeddings[10]), 3)
+    
+    def test_inference_server_batches_concurrent_requests(self):
+        """Solicitudes concurrentes dentro de la ventana se resuelven en un solo forward"""
+        address = os.path.join(tempfile.mkdtemp(), 'face.sock')
+        server = InferenceServer(address, b'test', batch_size=32, window_ms=200)
+        server.embedder._model = self.FakeModel()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.stop)
+        for _ in range(100):
+            if os.path.exists(address):
+                break
+            time_module.sleep(0.01)
+        
+        client = InferenceClient(address, b'test')
+        results = {}
+        
+        def verify(i):
+            results[i] = client.embed([np.full((90, 70, 3), i, dtype=np.uint8)])
+        
+        workers = [threading.Thread(target=verify, args=(i,)) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        
+        self.assertEqual(len(results), 4)
+        self.assertEqual(server.embedder._model.batches, [(4, 160, 160, 3)])
+        self.assertEqual(client.info()['requests'], 4)
+
+    def test_inference_server_detects_for_remote_tier(self):
+        """El nivel RetinaFace del worker envía la imagen reducida al servidor"""
+        address = os.path.join(tempfile.mkdtemp(), 'face.sock')
+        server = InferenceServer(address, b'test')
+        server.detector = FakeTier('retinaface', [(10, 20, 30, 40)], max_side=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.stop)
+        for _ in range(100):
+            if os.path.exists(address):
+                break
+            time_module.sleep(0.01)
+
+        detector = FaceDetector(tiers=['retinaface'], budget_ms=0, retinaface_max_side=320,
+                                inference_client=InferenceClient(address, b'test'))
+        faces, tier = detector.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+
+        self.assertEqual(tier, 'retinaface')
+        self.assertEqual(server.detector.calls, [(240, 320, 3)])
+        self.assertEqual(faces, [{'x': 20, 'y': 40, 'width': 60, 'height': 80}])
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    """Tests de la caché por contenido de imagen"""
+    
+    def test_hits_misses_and_memory_cap(self):
+        """Un cuadro repetido es un acierto y la caché respeta el tope de memoria"""
+        cache = EmbeddingCache(max_bytes=4096, ttl=60)
+        frame = np.zeros((40, 40, 3), dtype=np.uint8)
+        key = cache.key_for(frame)
+        self.assertEqual(key, cache.key_for(frame.copy()))
+        self.assertNotEqual(key, cache.key_for(frame[:, :20]))
+        
+        self.assertIsNone(cache.get(key, 'verify'))
+        cache.put(key, 'verify', np.ones(128, dtype=np.float32))
+        self.assertEqual(len(cache.get(key, 'verify')), 128)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        
+        for i in range(10):
+            cache.put(f'otro-{i}', 'verify', np.ones(128, dtype=np.float32))
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 4096)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertIsNone(cache.get(key, 'verify'))
+    
+    def test_expired_entries_are_misses(self):
+        cache = EmbeddingCache(ttl=0)
+        cache.put('k', 'faces', [])
+        self.assertIsNone(cache.get('k', 'faces'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FaceRegistrationJobTests(TestCase):
+    """Tests del registro facial en segundo plano"""
+    
+    def setUp(self):
+        from core.models import User
+        self.user = User.objects.create_user(username="admin_jobs", password="testpass123", role='admin')
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username="ana_jobs", password="testpass123"),
+            employee_id=777
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_async_registration_returns_job(self):
+        """El modo trabajo responde 202 y el estado se consulta por separado"""
+        response = self.client.post(
+            f'/api/employees/{self.employee.id}/register_face/?async=true',
+            {'photos_base64': ['foto-1', 'foto-2']},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+        job = FaceRegistrationJob.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.total_photos, 2)
+        self.assertTrue(os.path.exists(job.payload_path))
+        
+        status_response = self.client.get(f'/api/employees/{self.employee.id}/registration_status/')
+        self.assertEqual(status_response.data['status'], 'pending')
+        self.assertEqual(status_response.data['total_photos'], 2)
+        
+        # Fotos inválidas: el trabajo termina como fallido y se borra el archivo de fotos
+        run_registration_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(os.path.exists(job.payload_path))
+
+
+class ImagePipelineTests(SimpleTestCase):
+    """Tests de la decodificación reducida de fotos"""
+    
+    def test_large_jpeg_is_decoded_at_detector_size(self):
+        """Un JPEG de cámara se decodifica reducido y queda con el lado mayor pedido"""
+        import cv2
+        frame = np.zeros((1500, 2000, 3), dtype=np.uint8)
+        cv2.circle(frame, (1000, 750), 400, (200, 180, 160), -1)
+        jpeg = cv2.imencode('.jpg', frame)[1]
+        self.assertEqual(jpeg_dimensions(jpeg), (2000, 1500))
+        
+        decoded = decode_image(jpeg, max_side=640)
+        self.assertEqual(decoded.shape, (480, 640, 3))
+        self.assertEqual(decode_image(jpeg, max_side=0).shape, frame.shape)
+        
+        png = cv2.imencode('.png', frame[:400, :300])[1]
+        self.assertIsNone(jpeg_dimensions(png))
+        self.assertEqual(decode_image(png, max_side=200).shape, (200, 150, 3))
+        self.assertIsNone(decode_image(b'no es una imagen'))
+    
+    def test_crop_is_fitted_to_model_input(self):
+        """El recorte se reduce a la entrada del modelo y no queda como vista del cuadro"""
+        frame = np.full((480, 640, 3), 90, dtype=np.uint8)
+        crop = fit_to_input(frame[40:440, 100:400], (160, 160))
+        self.assertEqual(crop.shape, (160, 120, 3))
+        small = fit_to_input(frame[:50, :40], (160, 160))
+        self.assertEqual(small.shape, (50, 40, 3))
+        self.assertIsNone(small.base)
+
+class FakeTier(DetectorTier):
+    """Nivel de prueba: devuelve cajas fijas (en la imagen reducida) tras una espera"""
+    
+    def __init__(self, name, boxes, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.boxes = boxes
+        self.delay = delay
+        self.builds = 0
+        self.calls = []
+    
+    def _build(self):
+        self.builds += 1
+        return object()
+    
+    def _detect(self, detector, image):
+        self.calls.append(image.shape)
+        time_module.sleep(self.delay)
+        return self.boxes
+
+
+class FaceDetectorTests(SimpleTestCase):
+    """Tests de la cadena de detección por niveles"""
+    
+    def test_boxes_are_mapped_back_and_detector_is_reused(self):
+        """Se detecta en la copia reducida y las cajas vuelven a la escala original"""
+        fast = FakeTier('haar', [(10, 20, 30, 40)], max_side=320)
+        detector = FaceDetector(tiers=[fast], budget_ms=0)
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        for _ in range(3):
+            faces, tier = detector.detect(image)
+        self.assertEqual(tier, 'haar')
+        self.assertEqual(fast.calls[0], (240, 320, 3))
+        self.assertEqual(faces, [{'x': 20, 'y': 40, 'width': 60, 'height': 80}])
+        self.assertEqual(fast.builds, 1)
+        self.assertEqual(detector.stats()['answered_by'], {'haar': 3})
+    
+    def test_slow_tier_is_skipped_outside_budget(self):
+        """El nivel lento solo corre si su duración estimada cabe en el presupuesto"""
+        empty = FakeTier('haar', [], max_side=0)
+        slow = FakeTier('retinaface', [(0, 0, 50, 50)], max_side=0, expected_ms=500)
+        image = np.zeros((100, 100, 3), dtype=np.uint8)
+        
+        faces, tier = FaceDetector(tiers=[empty, slow], budget_ms=100).detect(image)
+        self.assertEqual((faces, tier), ([], None))
+        self.assertEqual(slow.calls, [])
+        
+        detector = FaceDetector(tiers=[empty, slow], budget_ms=1000)
+        faces, tier = detector.detect(image)
+        self.assertEqual(tier, 'retinaface')
+        stats = detector.stats()
+        self.assertEqual(stats['answered_by'], {'haar': 0, 'retinaface': 1})
+        self.assertEqual(stats['skipped_by_budget']['retinaface'], 0)
+
+    def test_skipped_tier_is_probed_and_comes_back(self):
+        """Un nivel saltado por una estimación inflada se vuelve a medir y recupera su lugar"""
+        empty = FakeTier('haar', [], max_side=0)
+        slow = FakeTier('retinaface', [(0, 0, 50, 50)], max_side=0, expected_ms=500)
+        image = np.zeros((100, 100, 3), dtype=np.uint8)
+        slow.detect(image)
+        detector = FaceDetector(tiers=[empty, slow], budget_ms=100, probe_every=3)
+
+        tiers = [detector.detect(image)[1] for _ in range(4)]
+        self.assertEqual(tiers, [None, None, 'retinaface', 'retinaface'])
+        stats = detector.stats()
+        self.assertEqual(stats['skipped_by_budget']['retinaface'], 2)
+        self.assertEqual(stats['probes']['retinaface'], 1)
+        self.assertLess(stats['estimated_ms']['retinaface'], 100)
+
+    def test_cold_first_call_is_not_averaged(self):
+        """La primera ejecución del hilo (carga del modelo) no infla la estimación"""
+        class ColdTier(FakeTier):
+            def _detect(self, detector, image):
+                self.delay = 0.3 if not self.calls else 0.0
+                return super()._detect(detector, image)
+
+        empty = FakeTier('haar', [], max_side=0)
+        cold = ColdTier('retinaface', [(0, 0, 50, 50)], max_side=0, expected_ms=50)
+        detector = FaceDetector(tiers=[empty, cold], budget_ms=250)
+        image = np.zeros((100, 100, 3), dtype=np.uint8)
+
+        self.assertEqual(detector.detect(image)[1], 'retinaface')
+        self.assertEqual(detector.stats()['estimated_ms']['retinaface'], 50)
+        self.assertEqual(detector.detect(image)[1], 'retinaface')
+        self.assertEqual(len(cold.calls), 2)
+
+class FaceQualityGateTests(SimpleTestCase):
+    """Tests del control de calidad previo al modelo"""
+    
+    def setUp(self):
+        import cv2
+        rng = np.random.default_rng(0)
+        face = np.full((200, 200, 3), 120, dtype=np.uint8)
+        cv2.circle(face, (100, 100), 60, (180, 160, 150), -1)
+        self.face = np.clip(face + rng.normal(0, 20, face.shape), 0, 255).astype(np.uint8)
+        self.gate = FaceQualityGate()
+    
+    def test_good_face_passes(self):
+        result = self.gate.check(self.face)
+        self.assertTrue(result['ok'])
+        self.assertIsNone(result['reason'])
+    
+    def test_bad_frames_are_rejected_with_reason(self):
+        """Cada defecto se rechaza con su código de motivo"""
+        import cv2
+        cases = {
+            'too_blurry': cv2.GaussianBlur(self.face, (21, 21), 8),
+            'too_dark': (self.face * 0.15).astype(np.uint8),
+            'too_bright': np.full_like(self.face, 250),
+            'too_small': self.face[:40, :40],
+        }
+        for reason, image in cases.items():
+            result = self.gate.check(image)
+            self.assertFalse(result['ok'])
+            self.assertEqual(result['reason'], reason)
+    
+    def test_photo_without_face_is_rejected(self):
+        """Sin rostro detectado la foto se rechaza con 'no_face' en lugar de evaluar el cuadro completo"""
+        import cv2
+        from core.services.face_service import FaceRecognitionService
+        
+        class NoFaceDetector:
+            def detect_faces(self, image):
+                return []
+        
+        service = FaceRecognitionService(warm_up_models=False, base_dir=tempfile.mkdtemp())
+        service.facial_system = NoFaceDetector()
+        frame = cv2.resize(self.face, (320, 320))
+        self.assertTrue(self.gate.check(frame)['ok'])
+        
+        rejections = []
+        self.assertIsNone(service._decode_face(cv2.imencode('.jpg', frame)[1].tobytes(), rejections))
+        self.assertEqual(rejections, ['no_face'])
+        self.assertEqual(self.gate.check(None)['reason'], 'no_face')
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FaceUploadTransportTests(TestCase):
+    """Tests de los transportes binarios de register_face / verify_face"""
+    
+    def setUp(self):
+        from core.models import User
+        import cv2
+        self.user = User.objects.create_user(username="admin_upload", password="testpass123", role='admin')
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username="luis_upload", password="testpass123"),
+            employee_id=778
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        image = np.full((32, 32, 3), 127, dtype=np.uint8)
+        self.jpeg = cv2.imencode('.jpg', image)[1].tobytes()
+    
+    def test_read_image_bytes_from_every_transport(self):
+        """base64 (con data URL), bytes y archivo subido entregan los mismos bytes"""
+        data_url = 'data:image/jpeg;base64,' + base64.b64encode(self.jpeg).decode()
+        upload = SimpleUploadedFile('foto.jpg', self.jpeg, content_type='image/jpeg')
+        for source in (data_url, self.jpeg, upload):
+            self.assertEqual(read_image_bytes(source).tobytes(), self.jpeg)
+    
+    def test_multipart_registration_job_keeps_files(self):
+        """Las fotos multipart se copian al trabajo sin convertirlas a base64"""
+        photos = [SimpleUploadedFile(f'foto{i}.jpg', self.jpeg, content_type='image/jpeg') for i in range(2)]
+        response = self.client.post(
+            f'/api/employees/{self.employee.id}/register_face/?async=true',
+            {'photos': photos},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 202)
+        job = FaceRegistrationJob.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.total_photos, 2)
+        files_dir = os.path.join(os.path.dirname(job.payload_path), str(job.id))
+        self.assertEqual(sorted(os.listdir(files_dir)), ['photo_000', 'photo_001'])
+        
+        run_registration_job(job.id)
+        self.assertFalse(os.path.exists(job.payload_path))
+        self.assertFalse(os.path.exists(files_dir))
+    
+    def test_raw_image_body_size_cap(self):
+        """Un cuerpo image/jpeg mayor al tope se rechaza con 413"""
+        url = f'/api/employees/{self.employee.id}/verify_face/'
+        with override_settings(FACE_UPLOAD_MAX_BYTES=len(self.jpeg) - 1):
+            response = self.client.post(url, self.jpeg, content_type='image/jpeg')
+        self.assertEqual(response.status_code, 413)
+        
+        response = self.client.post(url, b'', content_type='image/jpeg')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_multipart_stream_counts_bytes_read(self):
+        """El cuerpo multipart se corta al leer más del tope aunque falte el Content-Length"""
+        from io import BytesIO
+        from core.parsers import CappedStream, UploadTooLarge
+        stream = CappedStream(BytesIO(self.jpeg * 3), len(self.jpeg) * 2)
+        self.assertEqual(len(stream.read(len(self.jpeg))), len(self.jpeg))
+        with self.assertRaises(UploadTooLarge):
+            stream.read()
+
+
+class LazyFaceStackTests(SimpleTestCase):
+    """Carga perezosa y readiness del sistema facial"""
+    
+    def test_importing_views_does_not_load_face_stack(self):
+        script = (
+            "import sys, django; django.setup(); import core.views; "
+            "from core.services.face_service_singleton import face_service_singleton as s; "
+            "print('advanced_face_system' in sys.modules, 'deepface' in sys.modules, s.is_loaded)"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='geoproject.settings', FACE_STACK_LOADING='lazy')
+        output = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, env=env, timeout=120
+        ).stdout.strip().splitlines()
+        self.assertEqual(output[-1], 'False False False')
+
+    def test_inference_client_mode_does_not_load_tensorflow(self):
+        """Con servidor de inferencia, RetinaFace y los embeddings no cargan TensorFlow en el worker"""
+        script = '\n'.join([
+            "import sys, tempfile, numpy as np",
+            "from core.services.face_paths import ensure_face_recognition_path",
+            "ensure_face_recognition_path()",
+            "from advanced_face_system import FacialRecognition",
+            "class Remote:",
+            "    def info(self): return {'model_name': 'Facenet', 'batch_size': 32}",
+            "    def embed(self, faces): return [[0.5] * 128 for _ in faces]",
+            "    def detect(self, image): return [{'x': 10, 'y': 10, 'width': 80, 'height': 80}]",
+            "system = FacialRecognition(base_dir=tempfile.mkdtemp(), inference_client=Remote(),",
+            "                           detector_options={'budget_ms': 0})",
+            "faces = system.detect_faces(np.zeros((200, 200, 3), dtype=np.uint8))",
+            "features = system.batch_extract_features([np.zeros((160, 160, 3), dtype=np.uint8)])",
+            "print(len(faces), len(features[0]), 'tensorflow' in sys.modules, 'deepface' in sys.modules)",
+        ])
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='geoproject.settings')
+        output = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, env=env, timeout=120
+        ).stdout.strip().splitlines()
+        self.assertEqual(output[-1], '1 128 False False')
+
+
+    def test_face_readiness_endpoint(self):
+        """Sin modelos cargados el proceso no está listo (503)"""
+        response = APIClient().get('/api/health/face/')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.data['ready'])
+        self.assertIn(response.data['phase'], ('cold', 'unavailable'))
+
+
+class BenchmarkTests(SimpleTestCase):
+    """Medición concurrente de los comandos de benchmark"""
+    
+    def test_run_concurrent_counts_calls_and_errors(self):
+        def func(value):
+            if value < 0:
+                raise ValueError('entrada inválida')
+            return value
+        
+        summary = run_concurrent(func, [1, 2, 3, -1], concurrency=4, iterations=5)
+        self.assertEqual(summary['concurrency'], 4)
+        self.assertEqual(summary['count'], 15)
+        self.assertEqual(summary['errors'], 5)
+        self.assertEqual(summary['first_error'], 'entrada inválida')
+        self.assertGreater(summary['throughput_per_s'], 0)
+
+
+class StageTimingTests(TestCase):
+    """Tiempos por etapa: trazas por solicitud, histogramas y endpoint de administración"""
+    
+    def setUp(self):
+        from core.models import User
+        stage_timing.histograms.reset()
+        self.admin = User.objects.create_user(username="admin_timing", password="testpass123", role='admin')
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username="eva_timing", password="testpass123"),
+            employee_id=779
+        )
+        self.client = APIClient()
+    
+    def test_spans_feed_trace_and_histograms(self):
+        def decode(_):
+            with stage_timing.span('decode'):
+                pass
+        
+        with stage_timing.trace() as current:
+            with stage_timing.span('detect'):
+                stage_timing.annotate(tier='haar')
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(stage_timing.bind(decode), range(2)))
+        stage_timing.annotate(tier='ignorado')
+        
+        totals = current.totals()
+        self.assertEqual(totals['detect']['tier'], 'haar')
+        self.assertEqual(totals['decode']['count'], 2)
+        self.assertIn('detect;desc="tier=haar";dur=', current.server_timing())
+        self.assertIn('decode;desc="x2";dur=', current.server_timing())
+        self.assertEqual(stage_timing.histograms.snapshot()['detect']['count'], 1)
+    
+    def test_histogram_percentiles_use_bucket_bounds(self):
+        histograms = stage_timing.StageHistograms(buckets_ms=(10, 100))
+        for seconds in [0.005] * 90 + [0.05] * 9 + [0.5]:
+            histograms.record('embed', seconds)
+        snapshot = histograms.snapshot()['embed']
+        self.assertEqual((snapshot['p50_ms'], snapshot['p95_ms']), (10.0, 100.0))
+        self.assertEqual(snapshot['buckets'], {'10': 90, '100': 9, 'inf': 1})
+    
+    def test_server_timing_header_and_admin_endpoint(self):
+        self.client.force_authenticate(self.admin)
+        url = f'/api/employees/{self.employee.id}/verify_face/'
+        response = self.client.post(url, {'photo': 'Zm9v'}, format='json')
+        self.assertNotIn('Server-Timing', response)
+        
+        response = self.client.post(url, {'photo': 'Zm9v'}, format='json', HTTP_X_FACE_TIMING='1')
+        self.assertIn('verify_face;dur=', response['Server-Timing'])
+        
+        response = self.client.get('/api/health/face/timings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stages']['verify_face']['count'], 2)
+        
+        self.assertEqual(self.client.delete('/api/health/face/timings/').status_code, 204)
+        self.assertEqual(self.client.get('/api/health/face/timings/').data['stages'], {})
+        
+        from core.models import User
+        self.client.force_authenticate(User.objects.create_user(username="kiosko_timing", password="testpass123"))
+        self.assertEqual(self.client.get('/api/health/face/timings/').status_code, 403)
+
+    def test_timings_include_detector_and_cache_stats(self):
+        """Con el sistema facial cargado se exponen los contadores del detector y de la caché"""
+        from types import SimpleNamespace
+        from core.services.face_service_singleton import FaceServiceSingleton
+        from core.services.face_timing import reset_timings, timing_snapshot
+
+        cache = EmbeddingCache()
+        cache.get('k', 'faces')
+        cache.put('k', 'faces', [])
+        cache.get('k', 'faces')
+        facial_system = SimpleNamespace(detector=FaceDetector(tiers=[FakeTier('haar', [])]), cache=cache)
+        saved = (FaceServiceSingleton._service, FaceServiceSingleton._loaded)
+        self.addCleanup(lambda: setattr(FaceServiceSingleton, '_service', saved[0]))
+        self.addCleanup(lambda: setattr(FaceServiceSingleton, '_loaded', saved[1]))
+        FaceServiceSingleton._service = SimpleNamespace(facial_system=facial_system)
+        FaceServiceSingleton._loaded = True
+
+        snapshot = timing_snapshot()
+        self.assertEqual((snapshot['cache']['hits'], snapshot['cache']['misses']), (1, 1))
+        self.assertEqual(snapshot['detector']['requests'], 0)
+        reset_timings()
+        self.assertEqual(timing_snapshot()['cache']['hits'], 0)
+        self.assertEqual(timing_snapshot()['cache']['entries'], 1)
+
+
+class LoggingUtilsTests(SimpleTestCase):
+    """Resumen de payloads y muestreo del log DEBUG por solicitud"""
+    
+    def test_summarize_payload_hides_photos(self):
+        photo = 'data:image/jpeg;base64,' + 'A' * 50000
+        upload = SimpleUploadedFile('foto.jpg', b'x' * 2048, content_type='image/jpeg')
+        summary = summarize_payload({'photos_base64': [photo] * 5, 'photo': upload, 'area_id': '3'})
+        self.assertEqual(summary['area_id'], '3')
+        self.assertEqual(summary['photos_base64'][0], '<image/jpeg base64 50023 caracteres>')
+        self.assertEqual(summary['photos_base64'][-1], '... (5 elementos)')
+        self.assertEqual(summary['photo'], "<archivo 'foto.jpg' 2048 bytes>")
+        self.assertLess(len(str(summary)), 400)
+    
+    def test_debug_records_dropped_for_unsampled_requests(self):
+        import logging
+        debug = logging.LogRecord('core.views', logging.DEBUG, __file__, 1, 'detalle', None, None)
+        warning = logging.LogRecord('core.views', logging.WARNING, __file__, 1, 'aviso', None, None)
+        log_filter = SampledDebugFilter()
+        token = set_debug_sampled(False)
+        try:
+            self.assertFalse(log_filter.filter(debug))
+            self.assertTrue(log_filter.filter(warning))
+            self.assertFalse(debug_enabled(logging.getLogger('core.views')))
+        finally:
+            reset_debug_sampled(token)
+        self.assertTrue(log_filter.filter(debug))
+
+
+class VerifyAndMarkTests(TestCase):
+    """Verificación facial y marcado de asistencia en una sola solicitud"""
+    
+    def setUp(self):
+        from core.models import User
+        self.area = Area.objects.create(name="Área Kiosco", latitude=-2.17, longitude=-79.92, radius=100)
+        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        schedule = {}
+        for day in days:
+            schedule.update({f'{day}_active': True, f'{day}_start': time(0, 30), f'{day}_end': time(23, 59, 59)})
+        AreaSchedule.objects.create(area=self.area, grace_period_minutes=15, **schedule)
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username="rosa_kiosko", password="testpass123"),
+            employee_id=780,
+            area=self.area
+        )
+        self.client = APIClient()
+        self.payload = {
+            'employee_id': self.employee.id, 'area_id': self.area.id,
+            'latitude': -2.17, 'longitude': -79.92, 'photo': 'Zm9v',
+        }
+    
+    def post(self, verification, **changes):
+        from unittest import mock
+        from core.services.face_service_singleton import face_service_singleton
+        with mock.patch.object(face_service_singleton, 'verify_face', return_value=verification) as verify:
+            response = self.client.post(
+                '/api/attendance/verify_and_mark/', dict(self.payload, **changes), format='json'
+            )
+        return response, verify
+    
+    def test_cheap_checks_skip_face_verification(self):
+        """Fuera de la geocerca o con la asistencia completa no se verifica el rostro"""
+        response, verify = self.post({'verified': True, 'confidence': 0.99}, latitude=-2.18)
+        self.assertEqual(response.data['error_type'], 'location_out_of_range')
+        verify.assert_not_called()
+        
+        # bulk_create no pasa por las validaciones de horario de Attendance.save
+        Attendance.objects.bulk_create([Attendance(
+            employee=self.employee, area=self.area, date=timezone.localtime().date(),
+            check_in=time(0, 30), check_out=time(23, 59, 59)
+        )])
+        response, verify = self.post({'verified': True, 'confidence': 0.99})
+        self.assertEqual(response.data['error_type'], 'already_complete')
+        verify.assert_not_called()
+    
+    def test_marks_entry_only_above_confidence(self):
+        response, verify = self.post({'verified': True, 'confidence': 0.5})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_type'], 'low_confidence')
+        self.assertFalse(Attendance.objects.filter(employee=self.employee).exists())
+        
+        response, verify = self.post({'verified': True, 'confidence': 0.95})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['action_type'], response.data['confidence']), ('entrada', 0.95))
+        verify.assert_called_once()
+        self.assertTrue(Attendance.objects.get(employee=self.employee).face_verified)
+
+
+class AreaCacheTests(TestCase):
+    """Caché por proceso de áreas y horarios"""
+    
+    def setUp(self):
+        from core.models import User
+        self.area = Area.objects.create(name="Área Caché", latitude=-2.17, longitude=-79.92, radius=100)
+        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        schedule = {}
+        for day in days:
+            schedule.update({f'{day}_active': True, f'{day}_start': time(0, 30), f'{day}_end': time(23, 59, 59)})
+        self.schedule = AreaSchedule.objects.create(area=self.area, grace_period_minutes=15, **schedule)
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username="ana_cache", password="testpass123"),
+            employee_id=781,
+            area=self.area
+        )
+    
+    def test_warm_cache_marks_attendance_without_area_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        area_cache.get(self.area.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post('/api/attendance/mark_attendance/', {
+                'employee_id': self.employee.id, 'area_id': self.area.id,
+                'latitude': -2.17, 'longitude': -79.92,
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['attendance']['area_name'], "Área Caché")
+        tables = [q['sql'] for q in queries.captured_queries if '"core_area"' in q['sql'] or '"core_areaschedule"' in q['sql']]
+        self.assertEqual(tables, [])
+    
+    def test_signals_and_generation_invalidate(self):
+        self.assertEqual(ScheduleService.get_grace_period(self.area), 15)
+        self.schedule.grace_period_minutes = 5
+        self.schedule.save()
+        self.assertEqual(ScheduleService.get_grace_period(self.area.id), 5)
+        
+        # Cambio hecho por otro worker: sin señal en este proceso, solo la generación
+        from django.db.models import F
+        Area.objects.filter(pk=self.area.pk).update(name="Renombrada")
+        CacheGeneration.objects.filter(key='areas').update(generation=F('generation') + 1)
+        self.assertEqual(area_cache.get(self.area.id).name, "Área Caché")
+        with override_settings(AREA_CACHE_CHECK_SECONDS=0):
+            self.assertEqual(area_cache.get(self.area.id).name, "Renombrada")
+    
+    def test_snapshot_distance_matches_haversine(self):
+        snapshot = area_cache.get(self.area.id)
+        self.assertAlmostEqual(snapshot.distance_to(-2.17, -79.92), 0.0)
+        self.assertAlmostEqual(snapshot.distance_to(-2.18, -79.92), 1111.95, places=1)
+
+
+class CompiledScheduleTests(SimpleTestCase):
+    """Horario compilado y evaluación en bloque"""
+    
+    def setUp(self):
+        from core.services.area_cache import AreaSnapshot, ScheduleSnapshot
+        schedule = AreaSchedule(
+            monday_start=time(8, 0), monday_end=time(17, 0), monday_active=True,
+            tuesday_start=time(9, 0), tuesday_end=time(18, 0), tuesday_active=True,
+            wednesday_start=time(8, 0), wednesday_end=time(17, 0), wednesday_active=False,
+            thursday_start=time(8, 0), thursday_end=time(17, 0), thursday_active=True,
+            friday_start=time(7, 30), friday_end=time(13, 0), friday_active=True,
+            saturday_active=False, sunday_active=False, grace_period_minutes=10
+        )
+        self.area = AreaSnapshot(
+            id=1, name="Área", status='active', latitude=0.0, longitude=0.0, radius=100,
+            lat_rad=0.0, lon_rad=0.0, cos_lat=1.0, schedule=ScheduleSnapshot.from_model(schedule)
+        )
+    
+    def test_bulk_evaluation_matches_per_row(self):
+        rng = np.random.default_rng(7)
+        dates = [datetime(2025, 9, 1).date() + timedelta(days=int(d)) for d in rng.integers(0, 28, 200)]
+        check_ins = [None if s < 0 else time(int(s) // 3600, int(s) % 3600 // 60) for s in rng.integers(-3600, 12 * 3600, 200)]
+        result = ScheduleService.classify(self.area, dates, check_ins)
+        
+        for i, (day, check_in) in enumerate(zip(dates, check_ins)):
+            expected_in, expected_out = ScheduleService.get_expected_times(self.area, day)
+            self.assertEqual(bool(result['is_work_day'][i]), ScheduleService.is_work_day(self.area, day))
+            self.assertEqual(result['weekday'][i], day.weekday())
+            if expected_in is None:
+                self.assertEqual(result['expected_check_in'][i], -1)
+                late = check_in is not None and check_in > time(8, 30)
+            else:
+                self.assertEqual(result['expected_check_out'][i], expected_out.hour * 3600 + expected_out.minute * 60)
+                limit = datetime.combine(day, expected_in) + timedelta(minutes=10)
+                late = check_in is not None and datetime.combine(day, check_in) > limit
+            self.assertEqual(bool(result['is_late'][i]), late)
+            minutes = 0 if check_in is None else late_minutes_for(self.area, day, check_in)
+            self.assertEqual(result['late_minutes'][i], minutes)
+    
+    def test_area_without_schedule(self):
+        result = ScheduleService.classify(self.area.__class__(
+            id=2, name="Sin horario", status='active', latitude=0.0, longitude=0.0, radius=100,
+            lat_rad=0.0, lon_rad=0.0, cos_lat=1.0
+        ), ['2025-09-01', '2025-09-02'], [time(8, 0), time(9, 0)])
+        self.assertFalse(result['is_work_day'].any())
+        self.assertEqual(result['is_late'].tolist(), [False, True])
+        self.assertEqual(result['late_minutes'].tolist(), [0, 30])
+
+
+class DayCloseTests(TestCase):
+    """Cierre de días con la marca "cerrado hasta" y carga sin efectos secundarios"""
+    
+    def setUp(self):
+        from core.models import User
+        forget_closed_days()
+        self.addCleanup(forget_closed_days)
+        self.area = Area.objects.create(name="Área Cierre", latitude=-2.17, longitude=-79.92, radius=100)
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username="mia_cierre", password="testpass123"),
+            employee_id=782,
+            area=self.area
+        )
+        self.today = timezone.localdate()
+    
+    def incomplete(self, days_ago, employee=None, status='present'):
+        # bulk_create no pasa por Attendance.save (recalcula el estado con el horario)
+        return Attendance.objects.bulk_create([Attendance(
+            employee=employee or self.employee, area=self.area, date=self.today - timedelta(days=days_ago),
+            check_in=time(8, 0), status=status
+        )])[0]
+    
+    def test_loading_past_rows_has_no_side_effects(self):
+        attendance = self.incomplete(3)
+        with self.assertNumQueries(1):
+            rows = list(Attendance.objects.filter(employee=self.employee))
+        self.assertEqual(rows[0].status, 'present')
+        self.assertEqual(Attendance.objects.get(pk=attendance.pk).status, 'present')
+    
+    def test_days_close_once(self):
+        attendance = self.incomplete(2)
+        result = close_pending_days(self.today, lookback_days=7)
+        self.assertEqual(len(result['days']), 7)
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(result['closed_through'], self.today - timedelta(days=1))
+        self.assertEqual(Attendance.objects.get(pk=attendance.pk).status, 'absent')
+        
+        # Un día ya cerrado no se vuelve a procesar
+        late_row = self.incomplete(1)
+        self.assertEqual(close_pending_days(self.today)['days'], [])
+        self.assertEqual(Attendance.objects.get(pk=late_row.pk).status, 'present')
+        
+        # Al día siguiente solo se cierra el día nuevo
+        result = close_pending_days(self.today + timedelta(days=1))
+        self.assertEqual(result['days'], [self.today])
+        self.assertEqual(DayCloseWatermark.objects.get().closed_through, self.today)
+    
+    def test_ensure_days_closed_remembers_watermark(self):
+        self.assertIsNotNone(ensure_days_closed(self.today))
+        with self.assertNumQueries(0):
+            self.assertIsNone(ensure_days_closed(self.today))
+    
+    def test_bulk_close_is_set_based_and_audited(self):
+        from core.models import User
+        others = [
+            Employee.objects.create(user=User.objects.create_user(username=f"cierre_{i}", password="x"), employee_id=790 + i)
+            for i in range(3)
+        ]
+        self.incomplete(2, status='late')
+        for employee in others:
+            self.incomplete(3, employee=employee)
+        complete = Attendance.objects.bulk_create([Attendance(
+            employee=self.employee, area=self.area, date=self.today - timedelta(days=3),
+            check_in=time(8, 0), check_out=time(17, 0), status='present'
+        )])[0]
+        
+        # SELECT, UPDATE e INSERT de auditoría, y SELECT, UPDATE e INSERT de resúmenes
+        # diarios (más SAVEPOINT/RELEASE), sin importar cuántas filas
+        rebuild_rollups()
+        area_cache.get(self.area.id)
+        with self.assertNumQueries(12):
+            result = close_incomplete_attendances(self.today - timedelta(days=3), self.today - timedelta(days=1))
+        self.assertEqual(result['updated'], 4)
+        self.assertEqual(result['by_date'], {
+            (self.today - timedelta(days=3)).isoformat(): 3, (self.today - timedelta(days=2)).isoformat(): 1,
+        })
+        self.assertEqual(Attendance.objects.get(pk=complete.pk).status, 'present')
+        self.assertEqual(
+            sorted(AttendanceCloseAudit.objects.values_list('previous_status', flat=True)),
+            ['late', 'present', 'present', 'present']
+        )
+        self.assertEqual(close_incomplete_attendances(self.today - timedelta(days=3))['updated'], 0)
+        self.assertEqual(
+            DailyAttendanceRollup.objects.get(date=self.today - timedelta(days=3), status='absent').attendance_count, 3
+        )
+    
+    def test_endpoint_returns_counts(self):
+        from core.models import User
+        self.incomplete(1)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="admin_cierre", password="x", role='admin'))
+        # Sin el cierre perezoso del middleware, que cerraría ayer antes de la vista
+        with override_settings(ATTENDANCE_CLOSE_ON_REQUEST=False):
+            response = client.post('/api/dashboard/auto_process_incomplete/', {'days_back': 2}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+
+
+class EffectiveStatusTests(TestCase):
+    """Estado efectivo calculado en la consulta, sin escrituras al leer"""
+    
+    def setUp(self):
+        from core.models import User
+        self.area = Area.objects.create(name="Área Estado", latitude=-2.17, longitude=-79.92, radius=100)
+        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        schedule = {}
+        for day in days:
+            schedule.update({f'{day}_active': True, f'{day}_start': time(8, 0), f'{day}_end': time(17, 0)})
+        AreaSchedule.objects.create(area=self.area, grace_period_minutes=15, **schedule)
+        self.user = User.objects.create_user(username="leo_estado", password="testpass123")
+        self.employee = Employee.objects.create(user=self.user, employee_id=783, area=self.area)
+        self.other = Employee.objects.create(
+            user=User.objects.create_user(username="sol_estado", password="testpass123"), employee_id=784
+        )
+        self.today = timezone.localdate()
+        # bulk_create no pasa por Attendance.save (recalcula el estado con el horario)
+        self.rows = Attendance.objects.bulk_create([
+            Attendance(employee=self.employee, area=self.area, date=self.today, check_in=time(8, 30), status='late'),
+            Attendance(employee=self.other, area=self.area, date=self.today, status='present'),
+            Attendance(
+                employee=self.employee, area=self.area, date=self.today - timedelta(days=1),
+                check_in=time(8, 30), status='late'
+            ),
+            Attendance(
+                employee=self.employee, area=self.area, date=self.today - timedelta(days=2),
+                check_in=time(8, 0), check_out=time(17, 0), status='present'
+            ),
+        ])
+    
+    def effective(self, now):
+        return dict(Attendance.objects.with_effective_status(now).values_list('pk', 'effective_status'))
+    
+    def test_annotation_follows_schedule_and_time(self):
+        at = lambda hour: timezone.make_aware(datetime.combine(self.today, time(hour, 0)))
+        ids = [row.pk for row in self.rows]
+        self.assertEqual([self.effective(at(8))[pk] for pk in ids], ['late', 'present', 'late', 'present'])
+        self.assertEqual([self.effective(at(9))[pk] for pk in ids], ['late', 'absent', 'late', 'present'])
+        # Pasada la salida, una entrada tardía sin salida sigue siendo tardanza
+        self.assertEqual([self.effective(at(18))[pk] for pk in ids], ['late', 'absent', 'late', 'present'])
+        
+        self.assertEqual(Attendance.objects.persist_effective_status(at(18)), 1)
+        self.assertEqual(Attendance.objects.persist_effective_status(at(18)), 0)
+        self.assertEqual(Attendance.objects.get(pk=ids[1]).status, 'absent')
+        self.assertEqual(Attendance.objects.get(pk=ids[0]).status, 'late')
+    
+    def test_employee_stats_is_one_read_only_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        client = APIClient()
+        client.force_authenticate(self.user)
+        area_cache.all()
+        with override_settings(ATTENDANCE_CLOSE_ON_REQUEST=False), CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/dashboard/employee_stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totalDays'], 3)
+        self.assertEqual(response.data['lateDays'] + response.data['onTimeDays'], 3)
+        statements = [q['sql'].split()[0] for q in queries.captured_queries]
+        self.assertEqual(statements, ['SELECT', 'SELECT'])
+
+
+class RollupTests(TestCase):
+    """Resúmenes diarios mantenidos en cada escritura y regenerables"""
+    
+    def setUp(self):
+        from core.models import User
+        self.area = Area.objects.create(name="Área Resumen", latitude=-2.17, longitude=-79.92, radius=100)
+        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        schedule = {}
+        for day in days:
+            schedule.update({f'{day}_active': True, f'{day}_start': time(8, 0), f'{day}_end': time(17, 0)})
+        AreaSchedule.objects.create(area=self.area, grace_period_minutes=15, **schedule)
+        self.user = User.objects.create_user(username="ines_resumen", password="testpass123")
+        self.employee = Employee.objects.create(user=self.user, employee_id=785, area=self.area)
+        self.other = Employee.objects.create(
+            user=User.objects.create_user(username="tito_resumen", password="testpass123"), employee_id=786
+        )
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+    
+    def rollups(self):
+        return {
+            (row.date, row.status): (row.attendance_count, row.late_minutes, row.worked_minutes)
+            for row in DailyAttendanceRollup.objects.filter(area=self.area).exclude(attendance_count=0)
+        }
+    
+    def test_writes_and_day_close_keep_rollup_in_sync_with_rebuild(self):
+        late = Attendance.objects.create(
+            employee=self.employee, area=self.area, date=self.yesterday, check_in=time(8, 30)
+        )
+        Attendance.objects.create(employee=self.other, area=self.area, date=self.yesterday, check_in=time(8, 5))
+        self.assertEqual(self.rollups(), {(self.yesterday, 'late'): (1, 30, 0), (self.yesterday, 'present'): (1, 0, 0)})
+        
+        late = Attendance.objects.get(pk=late.pk)
+        late.check_out = time(17, 30)
+        late.save()
+        self.assertEqual(self.rollups()[(self.yesterday, 'late')], (1, 30, 540))
+        
+        # El cierre en bloque pasa la asistencia sin salida a ausente
+        close_incomplete_attendances(self.yesterday)
+        incremental = self.rollups()
+        self.assertEqual(incremental, {(self.yesterday, 'late'): (1, 30, 540), (self.yesterday, 'absent'): (1, 0, 0)})
+        
+        self.assertEqual(rebuild_rollups(self.yesterday, self.yesterday), 2)
+        self.assertEqual(self.rollups(), incremental)
+        
+        late.delete()
+        self.assertEqual(self.rollups(), {(self.yesterday, 'absent'): (1, 0, 0)})
+    
+    def test_rebuild_keeps_late_minutes_after_schedule_change(self):
+        Attendance.objects.create(employee=self.employee, area=self.area, date=self.yesterday, check_in=time(8, 30))
+        AreaSchedule.objects.filter(area=self.area).update(**{
+            f'{day}_start': time(8, 25) for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        })
+        area_cache.invalidate()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), {(self.yesterday, 'late'): (1, 30, 0)})
+    
+    def test_rebuild_fills_missing_late_minutes(self):
+        """Las filas creadas sin pasar por save() reciben su tardanza al regenerar"""
+        Attendance.objects.bulk_create([Attendance(
+            employee=self.employee, area=self.area, date=self.yesterday,
+            check_in=time(8, 45), check_out=time(17, 45), status='late'
+        )])
+        rebuild_rollups()
+        self.assertEqual(Attendance.objects.get().late_minutes, 45)
+        self.assertEqual(self.rollups(), {(self.yesterday, 'late'): (1, 45, 540)})
+    
+    def test_migration_backfills_existing_attendances(self):
+        import importlib
+        from django.apps import apps
+        migration = importlib.import_module('core.migrations.0031_attendance_late_minutes_backfill_rollups')
+        # Filas anteriores a la migración: sin late_minutes ni resúmenes
+        Attendance.objects.bulk_create([Attendance(
+            employee=self.employee, area=self.area, date=self.yesterday,
+            check_in=time(8, 45), check_out=time(17, 45), status='late'
+        )])
+        self.assertEqual(self.rollups(), {})
+        migration.backfill_late_minutes_and_rollups(apps, None)
+        self.assertEqual(self.rollups(), {(self.yesterday, 'late'): (1, 45, 540)})
+        self.assertEqual(Attendance.objects.get().late_minutes, 45)
+    
+    def test_dashboard_reads_rollups(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        Attendance.objects.create(employee=self.employee, area=self.area, date=self.yesterday, check_in=time(8, 30))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        area_cache.all()
+        with override_settings(ATTENDANCE_CLOSE_ON_REQUEST=False), CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/dashboard/weekly_attendance/')
+        self.assertEqual(response.status_code, 200)
+        by_date = {row['date']: row['attendance'] for row in response.data['weeklyData']}
+        self.assertEqual(by_date[self.yesterday.isoformat()], 1)
+        self.assertEqual(sum(by_date.values()), 1)
+        # Resúmenes agrupados por fecha y total de empleados
+        self.assertEqual(len(queries.captured_queries), 2)
+        
+        with override_settings(ATTENDANCE_CLOSE_ON_REQUEST=False):
+            response = client.get('/api/dashboard/area_summary/', {
+                'start_date': self.yesterday.isoformat(), 'end_date': self.yesterday.isoformat()
+            })
+        self.assertEqual(response.status_code, 200)
+        summary = response.data['areas'][0]
+        self.assertEqual((summary['areaName'], summary['byStatus'], summary['lateMinutes']), ("Área Resumen", {'late': 1}, 30))
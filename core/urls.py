@@ -4,7 +4,7 @@ from .views import (
     AuthViewSet, DashboardViewSet, EmployeeViewSet, 
     AreaViewSet, AttendanceViewSet, ChangePasswordView, PasswordResetViewSet,
     EmployeePasswordResetViewSet, AreaScheduleViewSet, check_password_change_required,
-    check_attendance_permission
+    check_attendance_permission, face_readiness, face_timings
 )
 
 router = DefaultRouter()
@@ -22,4 +22,6 @@ urlpatterns = [
     path('auth/password/change/', ChangePasswordView.as_view(), name='change-password'),
     path('check-password-change/', check_password_change_required, name='check-password-change'),
     path('check-attendance-permission/', check_attendance_permission, name='check-attendance-permission'),
+    path('health/face/', face_readiness, name='face-readiness'),
+    path('health/face/timings/', face_timings, name='face-timings'),
 ]
@@ -4,10 +4,13 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import date, timedelta
-from .models import User, Employee, Area, Attendance, FaceProfile, PasswordResetToken, AreaSchedule
+from .models import (
+    User, Employee, Area, Attendance, FaceProfile, FaceRegistrationJob, PasswordResetToken, AreaSchedule
+)
 from .serializers import (
     UserSerializer, EmployeeSerializer, AreaSerializer, AttendanceSerializer,
     LoginSerializer, DashboardStatsSerializer, AttendanceReportSerializer,
@@ -17,13 +20,21 @@ from .serializers import (
 from .services.face_service_singleton import face_service_singleton
 from .services.password_reset_service import PasswordResetService
 from .services.employee_welcome_service import EmployeeWelcomeService
+from .services.face_registration_jobs import submit_registration, job_status
+from .services.face_runtime import readiness
+from .services.face_timing import timed_face_action, timing_snapshot, reset_timings
+from .services.area_cache import area_cache
+from .parsers import FACE_UPLOAD_PARSERS
+from .logging_utils import debug_enabled, summarize_payload
+from django.core.exceptions import ValidationError
 
 from rest_framework.views import APIView
 from django.contrib.auth import update_session_auth_hash
 import logging
 from django.conf import settings
 from rest_framework.permissions import IsAuthenticated
-from core.signals import auto_process_all_incomplete_attendances, process_incomplete_attendance_for_date
+from .services.day_close import close_incomplete_attendances
+from .services.attendance_rollup import area_totals, daily_totals
 
 # Configurar logging para debugging
 logger = logging.getLogger(__name__)
@@ -253,23 +264,20 @@ class DashboardViewSet(viewsets.ViewSet):
         # Contar áreas activas
         total_areas = Area.objects.filter(status='active').count()
         
-        # Asistencias de hoy
-        today_attendance = Attendance.objects.filter(date=today).count()
+        # Asistencias de hoy y del mes actual desde los resúmenes diarios
+        # (DailyAttendanceRollup), una consulta agrupada por fecha
+        current_month = today.month
+        current_year = today.year
+        from calendar import monthrange
+        _, days_in_month = monthrange(current_year, current_month)
+        totals_by_date = daily_totals(today.replace(day=1), today.replace(day=days_in_month))
+        today_attendance = totals_by_date.get(today, 0)
+        month_attendance = sum(totals_by_date.values())
         
         # Empleados pendientes (sin asistencia hoy)
         pending_attendance = total_employees - today_attendance
         
-        # Calcular tasa de asistencia del mes actual
-        current_month = timezone.localtime().month
-        current_year = timezone.localtime().year
-        month_attendance = Attendance.objects.filter(
-            date__month=current_month,
-            date__year=current_year
-        ).count()
-        
         # Total de días laborables en el mes (aproximado)
-        from calendar import monthrange
-        _, days_in_month = monthrange(current_year, current_month)
         # Asumir 22 días laborables por mes (excluyendo fines de semana)
         working_days = min(22, days_in_month)
         total_possible_attendance = total_employees * working_days
@@ -308,11 +316,12 @@ class DashboardViewSet(viewsets.ViewSet):
             dates.append(current_date)
             current_date += timedelta(days=1)
         
-        # Obtener datos de asistencia para cada día
+        # Asistencias de cada día desde los resúmenes diarios (una consulta agrupada)
+        totals_by_date = daily_totals(start_date, end_date)
+        total_employees = Employee.objects.count()
         weekly_data = []
         for date in dates:
-            attendance_count = Attendance.objects.filter(date=date).count()
-            total_employees = Employee.objects.count()
+            attendance_count = totals_by_date.get(date, 0)
             
             weekly_data.append({
                 'date': date.strftime('%Y-%m-%d'),
@@ -329,6 +338,48 @@ class DashboardViewSet(viewsets.ViewSet):
             'endDate': end_date.strftime('%Y-%m-%d')
         })
     
+    @action(detail=False, methods=['get'])
+    def area_summary(self, request):
+        """
+        Resumen por área de un rango de fechas (mes actual por defecto)
+        
+        Parámetros opcionales: start_date y end_date (YYYY-MM-DD). Lee los resúmenes
+        diarios: asistencias por estado, minutos de tardanza y horas trabajadas.
+        """
+        today = timezone.localtime().date()
+        try:
+            start_date = date.fromisoformat(request.query_params.get('start_date') or today.replace(day=1).isoformat())
+            end_date = date.fromisoformat(request.query_params.get('end_date') or today.isoformat())
+        except ValueError:
+            return Response(
+                {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        areas = {}
+        for row in area_totals(start_date, end_date):
+            snapshot = area_cache.get(row['area_id'])
+            summary = areas.setdefault(row['area_id'], {
+                'areaId': row['area_id'],
+                'areaName': snapshot.name if snapshot else None,
+                'attendances': 0,
+                'byStatus': {},
+                'lateMinutes': 0,
+                'hoursWorked': 0,
+            })
+            summary['attendances'] += row['attendances']
+            summary['byStatus'][row['status']] = row['attendances']
+            summary['lateMinutes'] += row['late_minutes']
+            summary['hoursWorked'] += row['worked_minutes']
+        for summary in areas.values():
+            summary['hoursWorked'] = round(summary['hoursWorked'] / 60, 2)
+        
+        return Response({
+            'areas': list(areas.values()),
+            'startDate': start_date.strftime('%Y-%m-%d'),
+            'endDate': end_date.strftime('%Y-%m-%d')
+        })
+    
     @action(detail=False, methods=['get'])
     def recent_activity(self, request):
         """Obtener actividad reciente del sistema"""
@@ -451,86 +502,18 @@ class DashboardViewSet(viewsets.ViewSet):
             # Obtener el empleado asociado al usuario autenticado
             employee = Employee.objects.get(user=request.user)
             
-            # Obtener todas las asistencias del empleado
-            attendances = Attendance.objects.filter(employee=employee)
-            
-            # ACTUALIZAR ESTADOS DINÁMICAMENTE antes de calcular
-            print(f"🔄 Actualizando estados dinámicamente para {employee.full_name}...")
-            for attendance in attendances:
-                try:
-                    old_status = attendance.status
-                    attendance.update_status_dynamically()
-                    if attendance.status != old_status:
-                        print(f"   ✅ Estado actualizado: {old_status} → {attendance.status}")
-                except Exception as e:
-                    print(f"   ⚠️ Error actualizando estado: {e}")
-            
-            # Recalcular estadísticas con estados actualizados
-            total_days = attendances.count()
-            
-            # Contadores para diferentes tipos de asistencia
-            # IMPORTANTE: Un día solo se cuenta una vez, basado en su estado final
-            on_time_days = 0
-            late_days = 0
-            absent_days = 0
-            
-            for attendance in attendances:
-                if not attendance.area:
-                    continue
-                
-                # IMPORTANTE: Usar el estado FINAL del registro, no el estado inicial
-                # El estado final ya considera si marcó entrada, salida, y si completó la jornada
-                
-                if attendance.status == 'absent':
-                    # Si el estado final es ausente, contar como ausente
-                    absent_days += 1
-                elif attendance.status == 'late':
-                    # Si el estado final es tarde, contar como tarde
-                    late_days += 1
-                elif attendance.status == 'present':
-                    # Si el estado final es presente, contar como a tiempo
-                    on_time_days += 1
-                else:
-                    # Para otros estados, verificar si tiene entrada
-                    if not attendance.check_in:
-                        absent_days += 1
-                    else:
-                        # Si tiene entrada pero no tiene estado claro, verificar si llegó tarde
-                        from core.services.schedule_service import ScheduleService
-                        expected_check_in, expected_check_out = ScheduleService.get_expected_times(
-                            attendance.area, attendance.date
-                        )
-                        
-                        if expected_check_in:
-                            # Obtener período de gracia
-                            grace_period = ScheduleService.get_grace_period(attendance.area)
-                            
-                            # Convertir horas a objetos time para comparar
-                            check_in_time = attendance.check_in
-                            
-                            if isinstance(check_in_time, str):
-                                from datetime import datetime
-                                try:
-                                    check_in_time = datetime.strptime(check_in_time, '%H:%M:%S').time()
-                                except ValueError:
-                                    check_in_time = datetime.strptime(check_in_time, '%H:%M').time()
-                            
-                            # Calcular hora límite de entrada (con período de gracia)
-                            from datetime import datetime, timedelta
-                            limit_datetime = datetime.combine(attendance.date, expected_check_in)
-                            limit_datetime = limit_datetime + timedelta(minutes=grace_period)
-                            limit_time = limit_datetime.time()
-                            
-                            # Verificar entrada
-                            is_late_entry = check_in_time > limit_time
-                            
-                            if is_late_entry:
-                                late_days += 1
-                            else:
-                                on_time_days += 1
-                        else:
-                            # Sin horario configurado, considerar como a tiempo
-                            on_time_days += 1
+            # Estado efectivo calculado en la consulta (sin escribir): un solo aggregate
+            # con el estado final de cada día, cada día contado una vez
+            counts = Attendance.objects.filter(employee=employee).with_effective_status().aggregate(
+                total_days=Count('id'),
+                on_time_days=Count('id', filter=Q(effective_status='present')),
+                late_days=Count('id', filter=Q(effective_status='late')),
+                absent_days=Count('id', filter=Q(effective_status='absent')),
+            )
+            total_days = counts['total_days']
+            on_time_days = counts['on_time_days']
+            late_days = counts['late_days']
+            absent_days = counts['absent_days']
             
             # Calcular tasa de asistencia (días trabajados vs total de días del mes)
             # Usar total de días del mes para el cálculo
@@ -608,31 +591,45 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Endpoint para procesar automáticamente asistencias incompletas
         Se puede llamar desde el frontend o programar
+        
+        Devuelve cuántas asistencias se marcaron como ausentes ('updated') y el
+        desglose por fecha ('by_date')
         """
         try:
             # Obtener parámetros opcionales
             target_date = request.data.get('date')
-            days_back = request.data.get('days_back', 1)
             
             if target_date:
                 # Procesar fecha específica
                 try:
                     target_date = date.fromisoformat(target_date)
-                    process_incomplete_attendance_for_date(target_date)
-                    message = f"Asistencias incompletas procesadas para {target_date}"
                 except ValueError:
                     return Response(
                         {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
+                result = close_incomplete_attendances(target_date, source='manual')
+                message = f"Asistencias incompletas procesadas para {target_date}"
             else:
-                # Procesar automáticamente los últimos días
-                auto_process_all_incomplete_attendances()
+                # Procesar los últimos días (hasta ayer)
+                try:
+                    days_back = max(1, int(request.data.get('days_back', 7)))
+                except (TypeError, ValueError):
+                    return Response(
+                        {'error': 'days_back debe ser un número entero'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                today = timezone.localtime().date()
+                result = close_incomplete_attendances(
+                    today - timedelta(days=days_back), today - timedelta(days=1), source='manual'
+                )
                 message = f"Asistencias incompletas procesadas automáticamente para los últimos {days_back} días"
             
             return Response({
                 'success': True,
                 'message': message,
+                'updated': result['updated'],
+                'by_date': result['by_date'],
                 'timestamp': timezone.localtime().isoformat()
             }, status=status.HTTP_200_OK)
             
@@ -701,139 +698,111 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         
         return queryset
     
-    @action(detail=True, methods=['post'])
+    @staticmethod
+    def _request_photos(request, *fields):
+        """Fotos del primer campo presente: lista JSON, archivos multipart o cuerpo binario"""
+        for field in fields:
+            if hasattr(request.data, 'getlist'):
+                photos = request.data.getlist(field)
+            else:
+                photos = request.data.get(field, [])
+                if photos and not isinstance(photos, list):
+                    photos = [photos]
+            if photos:
+                return photos
+        return []
+    
+    @action(detail=True, methods=['post'], parser_classes=FACE_UPLOAD_PARSERS)
+    @timed_face_action('register_face')
     def register_face(self, request, pk=None):
-        """Registrar rostro de empleado"""
-        print(f"\n🎯 ========== INICIO REGISTRO FACIAL ==========")
-        print(f"🆔 Employee ID: {pk}")
-        print(f"📤 Request method: {request.method}")
-        print(f"📊 Request data keys: {list(request.data.keys())}")
-        print(f"📝 Content-Type: {request.content_type}")
+        """Registrar rostro de empleado (JSON base64, multipart/form-data o image/*)"""
         employee = self.get_object()
         
-        print(f"🔍 REGISTER_FACE - Datos recibidos:")
-        print(f"   - Employee ID: {employee.id}")
-        print(f"   - Request data keys: {list(request.data.keys())}")
-        print(f"   - Request data completo: {request.data}")
-        
         # Verificar diferentes posibles nombres de campo
-        photos_base64 = request.data.get('photos_base64', [])
-        if not photos_base64:
-            photos_base64 = request.data.get('photos', [])
-        
-        print(f"   - photos_base64 type: {type(photos_base64)}")
-        print(f"   - photos_base64 length: {len(photos_base64) if photos_base64 else 0}")
+        photos_base64 = self._request_photos(request, 'photos_base64', 'photos', 'photo')
         
-        if photos_base64:
-            print(f"   - Primera foto sample: {str(photos_base64[0])[:100]}...")
+        if debug_enabled(logger):
+            logger.debug(
+                "register_face empleado %s (%s): %s",
+                employee.id, request.content_type, summarize_payload(request.data)
+            )
         
         if not photos_base64:
-            print("❌ No se recibieron fotos")
-            print("❌ Campos disponibles en request.data:")
-            for key, value in request.data.items():
-                print(f"   - {key}: {type(value)} - {len(value) if hasattr(value, '__len__') else 'N/A'}")
+            logger.info("register_face empleado %s sin fotos (campos: %s)", employee.id, list(request.data.keys()))
             return Response(
                 {'error': 'Se requieren fotos para el registro'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        print(f"✅ Fotos recibidas: {len(photos_base64)}")
-        
-        # 🔍 DEBUG: Verificar estado del servicio facial ANTES de llamarlo
-        print(f"\n🔍 DEBUG: VERIFICANDO SERVICIO FACIAL ANTES DE LLAMARLO")
-        try:
-            from core.services.face_service_singleton import face_service_singleton
-            service = face_service_singleton.get_service()
-            print(f"   - Service instance: {service}")
-            print(f"   - Service type: {type(service)}")
-            print(f"   - facial_system: {service.facial_system}")
-            print(f"   - facial_system type: {type(service.facial_system)}")
-            print(f"   - facial_system is None: {service.facial_system is None}")
-            print(f"   - facial_system bool evaluation: {bool(service.facial_system)}")
-            
-            if service.facial_system:
-                print(f"   - facial_system methods: {[m for m in dir(service.facial_system) if not m.startswith('_')]}")
-                print(f"   - facial_system base_dir: {getattr(service.facial_system, 'base_dir', 'N/A')}")
-                print(f"   - facial_system face_dir: {getattr(service.facial_system, 'face_dir', 'N/A')}")
-            else:
-                print("   ❌ facial_system es None o False")
-                
-        except Exception as e:
-            print(f"   ❌ Error verificando servicio facial: {e}")
-            import traceback
-            traceback.print_exc()
+        # ✅ MODO TRABAJO: responder 202 y procesar el registro en segundo plano
+        async_mode = request.query_params.get('async', request.data.get('async', False))
+        if str(async_mode).lower() in ('1', 'true', 'yes'):
+            job = submit_registration(employee, photos_base64)
+            logger.info("Registro facial de %s encolado: job %s (%s fotos)", employee.id, job.id, len(photos_base64))
+            return Response({
+                'success': True,
+                'message': 'Registro facial en proceso',
+                'job_id': str(job.id),
+                'status': job.status,
+                'employee_id': employee.id
+            }, status=status.HTTP_202_ACCEPTED)
         
         try:
-            print(f"🚀 Llamando a face_service.register_face...")
-            print(f"   - Employee: {employee.full_name}")
-            print(f"   - Photos count: {len(photos_base64)}")
-            print(f"   - Tipo de photos_base64: {type(photos_base64)}")
-            print(f"   - Primera foto tipo: {type(photos_base64[0]) if photos_base64 else 'N/A'}")
-            
-            # Verificar estructura de datos
-            if photos_base64 and len(photos_base64) > 0:
-                first_photo = photos_base64[0]
-                print(f"   - Primera foto keys: {list(first_photo.keys()) if isinstance(first_photo, dict) else 'No es dict'}")
-                if isinstance(first_photo, dict) and 'photo' in first_photo:
-                    print(f"   - Primera foto photo length: {len(first_photo['photo'])}")
-            
             result = face_service_singleton.register_face(employee, photos_base64)
             
-            print(f"📊 Resultado del face_service:")
-            print(f"   - Success: {result.get('success')}")
-            print(f"   - Message: {result.get('message')}")
-            print(f"   - Photos count: {result.get('photos_count')}")
-            print(f"   - Result completo: {result}")
-            
             if result.get('success'):
-                print("✅ Registro facial exitoso")
+                logger.info("Registro facial de %s: %s fotos", employee.id, result.get('photos_count'))
                 
                 # Enviar email de bienvenida con credenciales
                 try:
-                    # Obtener credenciales del usuario
-                    username = employee.user.username
-                    password = None
-                    
-                    # Intentar obtener la contraseña (si está disponible)
-                    if hasattr(employee.user, 'cedula') and employee.user.cedula:
-                        # Usar la cédula como contraseña por defecto
-                        password = employee.user.cedula
-                    else:
-                        password = f"pass{employee.user.id}"
-                    
-                    # Enviar email de bienvenida completo
-                    EmployeeWelcomeService.send_welcome_email(employee, username, password)
-                    print(f"✅ Email de bienvenida enviado a {employee.user.email}")
-                    
+                    EmployeeWelcomeService.send_after_face_registration(employee)
                 except Exception as email_error:
-                    print(f"⚠️ ADVERTENCIA: No se pudo enviar email de bienvenida: {email_error}")
                     # No fallar el registro facial si el email falla
+                    logger.warning("No se pudo enviar email de bienvenida a %s: %s", employee.user.email, email_error)
                 
-                print("📧 Enviando respuesta 201")
                 return Response({
                     'success': True,
                     'message': result['message'],
                     'photos_count': result['photos_count'],
+                    'rejected_reasons': result.get('rejected_reasons', {}),
                     'employee_id': employee.id
                 }, status=status.HTTP_201_CREATED)
             else:
-                print(f"❌ Registro facial falló, enviando respuesta 400")
                 error_message = result.get('error') or result.get('message') or 'Error desconocido'
-                print(f"   - Error message: {error_message}")
+                logger.info("Registro facial de %s rechazado: %s", employee.id, error_message)
                 return Response({
                     'success': False,
-                    'message': error_message
+                    'message': error_message,
+                    'rejected_reasons': result.get('rejected_reasons', {})
                 }, status=status.HTTP_400_BAD_REQUEST)
                 
         except Exception as e:
-            print(f"❌ Error en register_face: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error en register_face de %s", employee.id)
             return Response({
                 'success': False,
                 'message': f'Error interno: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=True, methods=['get'])
+    def registration_status(self, request, pk=None):
+        """Estado de un registro facial en segundo plano (por defecto el más reciente)"""
+        employee = self.get_object()
+        jobs = FaceRegistrationJob.objects.filter(employee=employee)
+        job_id = request.query_params.get('job_id')
+        
+        try:
+            job = jobs.get(pk=job_id) if job_id else jobs.first()
+        except (FaceRegistrationJob.DoesNotExist, ValidationError):
+            job = None
+        
+        if job is None:
+            return Response(
+                {'error': 'Registro facial no encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(job_status(job))
+    
     @action(detail=True, methods=['get'])
     def face_status(self, request, pk=None):
         """Obtener estado del perfil facial del empleado"""
@@ -842,11 +811,13 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         
         return Response(status_data)
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], parser_classes=FACE_UPLOAD_PARSERS)
+    @timed_face_action('verify_face')
     def verify_face(self, request, pk=None):
-        """Verificar rostro para asistencia"""
+        """Verificar rostro para asistencia (JSON base64, multipart/form-data o image/*)"""
         employee = self.get_object()
-        photo = request.data.get('photo')
+        photos = self._request_photos(request, 'photo', 'photo_base64')
+        photo = photos[0] if photos else None
         
         if not photo:
             return Response(
@@ -985,7 +956,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Permitir acceso público para marcar asistencia, pero requerir autenticación para otras operaciones"""
-        if self.action == 'mark_attendance':
+        if self.action in ('mark_attendance', 'verify_and_mark'):
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
@@ -1001,24 +972,19 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         date_to = self.request.query_params.get('date_to', None)
         status = self.request.query_params.get('status', None)
         
-        print(f"🔍 FILTROS RECIBIDOS:")
-        print(f"   - employee: {employee}")
-        print(f"   - area: {area}")
-        print(f"   - date_from: {date_from}")
-        print(f"   - date_to: {date_to}")
-        print(f"   - status: {status}")
+        logger.debug(
+            "Filtros de asistencias: employee=%s area=%s date_from=%s date_to=%s status=%s",
+            employee, area, date_from, date_to, status
+        )
         
         if employee:
             queryset = queryset.filter(employee_id=employee)
-            print(f"✅ Filtro por empleado aplicado: employee_id={employee}")
         
         if area:
             queryset = queryset.filter(area_id=area)
-            print(f"✅ Filtro por área aplicado: area_id={area}")
         
         if date_from:
             queryset = queryset.filter(date__gte=date_from)
-            print(f"✅ Filtro por fecha desde aplicado: {date_from}")
         
         if date_to:
             # Para incluir el día completo, usar date__lt del día siguiente
@@ -1027,378 +993,396 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                 # Convertir la fecha a datetime y agregar 1 día
                 date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
                 next_day = date_to_obj + timedelta(days=1)
-                
-                print(f"🔍 DEBUG FECHA HASTA:")
-                print(f"   - Fecha original: {date_to}")
-                print(f"   - Fecha convertida: {date_to_obj}")
-                print(f"   - Día siguiente: {next_day}")
-                print(f"   - Filtro aplicado: date__lt={next_day}")
-                
                 queryset = queryset.filter(date__lt=next_day)
-                print(f"✅ Filtro por fecha hasta aplicado: {date_to} (incluye día completo hasta {next_day})")
-                
-                # Verificar registros después del filtro
-                print(f"📊 Registros después del filtro fecha hasta: {queryset.count()}")
                 
             except ValueError as e:
                 # Si hay error en el formato, usar el filtro original
-                print(f"⚠️ Error en formato de fecha: {e}")
+                logger.warning("Formato de fecha inválido en date_to=%r: %s", date_to, e)
                 queryset = queryset.filter(date__lte=date_to)
-                print(f"✅ Filtro por fecha hasta aplicado (fallback): {date_to}")
         
         if status and status != 'all':
             queryset = queryset.filter(status=status)
-            print(f"✅ Filtro por estado aplicado: {status}")
         
-        print(f"📊 Total de registros después de filtros: {queryset.count()}")
-        
-        # DEBUG: Mostrar fechas disponibles en los registros filtrados
-        if queryset.count() > 0:
-            print(f"🔍 FECHAS DISPONIBLES EN RESULTADOS:")
-            dates_in_results = queryset.values_list('date', flat=True).distinct().order_by('date')
-            for date_obj in dates_in_results:
-                print(f"   - {date_obj}")
+        # Las consultas extra solo se hacen si el mensaje se va a emitir
+        if debug_enabled(logger):
+            logger.debug("Asistencias después de filtros: %s", queryset.count())
         
         return queryset
     
-    @action(detail=False, methods=['post'])
-    def mark_attendance(self, request):
-        """Marcar asistencia de un empleado"""
-        try:
-            # Obtener datos del request
-            employee_id = request.data.get('employee_id')
-            area_id = request.data.get('area_id')
-            face_verified = request.data.get('face_verified', False)
-            latitude = request.data.get('latitude')
-            longitude = request.data.get('longitude')
-            
-            print(f"🔍 MARK_ATTENDANCE - Datos recibidos:")
-            print(f"   - employee_id: {employee_id}")
-            print(f"   - area_id: {area_id}")
-            print(f"   - face_verified: {face_verified}")
-            print(f"   - latitude: {latitude}")
-            print(f"   - longitude: {longitude}")
-            
-            # Validar datos requeridos
-            if not employee_id or not area_id:
-                return Response({
-                    'success': False,
-                    'message': 'Se requiere employee_id y area_id',
-                    'error_type': 'missing_required_fields'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Obtener empleado y área
-            try:
-                employee = Employee.objects.get(id=employee_id)
-                area = Area.objects.get(id=area_id)
-                print(f"✅ Empleado y área encontrados:")
-                print(f"   - Empleado: {employee.full_name}")
-                print(f"   - Área: {area.name}")
-            except (Employee.DoesNotExist, Area.DoesNotExist) as e:
-                print(f"❌ Error: {e}")
-                return Response(
-                    {'error': 'Empleado o área no encontrada'}, 
-                    status=status.HTTP_404_NOT_FOUND
+    def _attendance_precheck(self, request):
+        """
+        Validaciones previas a marcar asistencia, sin tocar el sistema facial
+
+        Datos requeridos, geocerca (Haversine), día laboral y estado de la asistencia de
+        hoy (ya completa, salida antes de hora, fuera de la ventana de entrada).
+
+        Args:
+            request: Solicitud con employee_id, area_id, latitude y longitude
+
+        Returns:
+            (plan, None) si se puede marcar, o (None, Response) con el error. El plan
+            es un dict con lo necesario para _write_attendance
+        """
+        employee_id = request.data.get('employee_id')
+        area_id = request.data.get('area_id')
+        latitude = request.data.get('latitude')
+        longitude = request.data.get('longitude')
+        
+        # Validar datos requeridos
+        if not employee_id or not area_id:
+            return None, Response({
+                'success': False,
+                'message': 'Se requiere employee_id y area_id',
+                'error_type': 'missing_required_fields'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Obtener empleado y área (el área y su horario salen de la caché por proceso)
+        area = area_cache.get(area_id)
+        employee = Employee.objects.select_related('user').filter(id=employee_id).first()
+        if employee is None or area is None:
+            logger.info("mark_attendance: empleado %s o área %s no encontrados", employee_id, area_id)
+            return None, Response(
+                {'error': 'Empleado o área no encontrada'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        # Validar ubicación si se proporciona
+        distance_meters = None
+        if latitude and longitude:
+            # Distancia al centro del área (Haversine con radianes precalculados)
+            distance_meters = area.distance_to(latitude, longitude)
+            
+            # Verificar si está dentro del radio del área
+            if distance_meters > area.radius:
+                logger.info(
+                    "mark_attendance: %s fuera del área %s (%.2f m > %s m)",
+                    employee.full_name, area.name, distance_meters, area.radius
                 )
-            
-            # Validar ubicación si se proporciona
-            distance_meters = None
-            if latitude and longitude:
-                print(f"📍 Validando ubicación del empleado...")
-                print(f"   - Coordenadas empleado: {latitude}, {longitude}")
-                print(f"   - Coordenadas área: {area.latitude}, {area.longitude}")
-                print(f"   - Radio del área: {area.radius}m")
-                
-                # Calcular distancia usando la fórmula de Haversine
-                from math import radians, cos, sin, asin, sqrt
-                
-                lat1, lon1 = float(area.latitude), float(area.longitude)
-                lat2, lon2 = float(latitude), float(longitude)
-                
-                # Convertir a radianes
-                lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-                
-                # Diferencias
-                dlat = lat2 - lat1
-                dlon = lon2 - lon1
-                
-                # Fórmula de Haversine
-                a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                c = 2 * asin(sqrt(a))
-                r = 6371000  # Radio de la Tierra en metros
-                distance_meters = c * r
-                
-                print(f"   - Distancia calculada: {distance_meters:.2f} metros")
-                
-                # Verificar si está dentro del radio del área
-                if distance_meters > area.radius:
-                    print(f"❌ EMPLEADO FUERA DEL ÁREA: Distancia {distance_meters:.2f}m > Radio {area.radius}m")
-                    return Response({
-                        'success': False,
-                        'message': f'No puedes marcar asistencia desde esta ubicación. Debes estar en el área "{area.name}" (máximo {area.radius}m del centro).',
-                        'error_type': 'location_out_of_range',
-                        'distance_meters': round(distance_meters, 2),
-                        'area_radius': area.radius,
-                        'area_name': area.name
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    print(f"✅ UBICACIÓN VÁLIDA: Empleado dentro del área (distancia: {distance_meters:.2f}m)")
-            else:
-                print(f"⚠️ ADVERTENCIA: No se recibieron coordenadas de ubicación")
-                return Response({
+                return None, Response({
                     'success': False,
-                    'message': 'No se pudo obtener tu ubicación. Asegúrate de permitir el acceso a la ubicación en tu navegador.',
-                    'error_type': 'location_not_available'
+                    'message': f'No puedes marcar asistencia desde esta ubicación. Debes estar en el área "{area.name}" (máximo {area.radius}m del centro).',
+                    'error_type': 'location_out_of_range',
+                    'distance_meters': round(distance_meters, 2),
+                    'area_radius': area.radius,
+                    'area_name': area.name
                 }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Verificar si ya tiene asistencia hoy
-            today = timezone.localtime().date()
-            current_time = timezone.localtime().time()
-            print(f"📅 Fecha actual: {today}")
-            print(f"🕐 Hora actual: {current_time}")
-            
-            # Obtener horarios esperados del área
-            from core.services.schedule_service import ScheduleService
-            expected_check_in, expected_check_out = ScheduleService.get_expected_times(area, today)
-            grace_period = ScheduleService.get_grace_period(area)
-            
-            print(f"⏰ Horarios esperados del área:")
-            print(f"   - Hora entrada esperada: {expected_check_in}")
-            print(f"   - Hora salida esperada: {expected_check_out}")
-            print(f"   - Período de gracia: {grace_period} minutos")
-            
-            # Validar si es un día laboral
-            print(f"🔍 Validando día laboral para área {area.name}:")
-            print(f"   - Fecha: {today} (weekday: {today.weekday()})")
-            print(f"   - ¿Tiene schedule?: {hasattr(area, 'schedule')}")
-            
-            if hasattr(area, 'schedule'):
-                schedule = area.schedule
-                print(f"   - Schedule ID: {schedule.id}")
-                print(f"   - Schedule type: {schedule.schedule_type}")
-                print(f"   - Lunes activo: {schedule.monday_active}")
-                print(f"   - Martes activo: {schedule.tuesday_active}")
-                print(f"   - Miércoles activo: {schedule.wednesday_active}")
-                print(f"   - Jueves activo: {schedule.thursday_active}")
-                print(f"   - Viernes activo: {schedule.friday_active}")
-                print(f"   - Sábado activo: {schedule.saturday_active}")
-                print(f"   - Domingo activo: {schedule.sunday_active}")
-            
-            is_work_day = ScheduleService.is_work_day(area, today)
-            print(f"   - ¿Es día laboral?: {is_work_day}")
-            
-            if not is_work_day:
-                print(f"❌ NO ES DÍA LABORAL para el área {area.name}")
-                return Response({
+        else:
+            logger.info("mark_attendance: empleado %s sin coordenadas de ubicación", employee_id)
+            return None, Response({
+                'success': False,
+                'message': 'No se pudo obtener tu ubicación. Asegúrate de permitir el acceso a la ubicación en tu navegador.',
+                'error_type': 'location_not_available'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Verificar si ya tiene asistencia hoy
+        today = timezone.localtime().date()
+        current_time = timezone.localtime().time()
+        
+        # Obtener horarios esperados del área
+        from core.services.schedule_service import ScheduleService
+        expected_check_in, expected_check_out = ScheduleService.get_expected_times(area, today)
+        grace_period = ScheduleService.get_grace_period(area)
+        is_work_day = ScheduleService.is_work_day(area, today)
+        
+        logger.debug(
+            "mark_attendance: %s en %s a las %s (área %s: entrada %s, salida %s, gracia %s min, laboral %s)",
+            employee.full_name, today, current_time, area.name,
+            expected_check_in, expected_check_out, grace_period, is_work_day
+        )
+        
+        if not is_work_day:
+            return None, Response({
+                'success': False,
+                'message': f'Hoy no es un día laboral para el área "{area.name}". No puedes marcar asistencia.',
+                'error_type': 'not_work_day',
+                'area_name': area.name
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        plan = {
+            'employee': employee,
+            'area': area,
+            'latitude': latitude,
+            'longitude': longitude,
+            'distance_meters': distance_meters,
+            'today': today,
+            'current_time': current_time,
+            'expected_check_in': expected_check_in,
+            'expected_check_out': expected_check_out,
+            'attendance': None,
+            'initial_status': None,
+        }
+        
+        # Verificar si ya tiene asistencia hoy
+        attendance = Attendance.objects.filter(employee=employee, date=today).first()
+        if attendance is not None:
+            # Si ya tiene entrada y salida, no permitir más registros
+            if attendance.check_in and attendance.check_out:
+                return None, Response({
                     'success': False,
-                    'message': f'Hoy no es un día laboral para el área "{area.name}". No puedes marcar asistencia.',
-                    'error_type': 'not_work_day',
-                    'area_name': area.name
+                    'message': f"{employee.full_name} ya tiene entrada y salida registradas para hoy",
+                    'action_type': "completo",
+                    'check_in': attendance.check_in,
+                    'check_out': attendance.check_out,
+                    'employee_name': employee.full_name,
+                    'error_type': 'already_complete'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Verificar si ya tiene asistencia hoy
-            try:
-                attendance = Attendance.objects.get(employee=employee, date=today)
-                print(f"🔄 Asistencia existente encontrada para {employee.full_name}")
-                print(f"   - Entrada: {attendance.check_in}")
-                print(f"   - Salida: {attendance.check_out}")
-                
-                # Si ya tiene entrada y salida, no permitir más registros
-                if attendance.check_in and attendance.check_out:
-                    print(f"ℹ️ Empleado ya tiene entrada y salida registradas para hoy")
-                    message = f"{employee.full_name} ya tiene entrada y salida registradas para hoy"
-                    action_type = "completo"
+            # Si solo tiene entrada, registrar salida
+            if attendance.check_in and not attendance.check_out:
+                # VALIDACIÓN: No permitir marcar salida antes de la hora esperada
+                if expected_check_out and current_time < expected_check_out:
+                    # Calcular tiempo restante hasta la hora de salida
+                    from datetime import datetime
+                    current_datetime = datetime.combine(today, current_time)
+                    expected_datetime = datetime.combine(today, expected_check_out)
+                    time_remaining = expected_datetime - current_datetime
                     
-                    return Response({
-                        'success': False,
-                        'message': message,
-                        'action_type': action_type,
-                        'check_in': attendance.check_in,
-                        'check_out': attendance.check_out,
-                        'employee_name': employee.full_name,
-                        'error_type': 'already_complete'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Si solo tiene entrada, registrar salida
-                if attendance.check_in and not attendance.check_out:
-                    # VALIDACIÓN: No permitir marcar salida antes de la hora esperada
-                    if expected_check_out and current_time < expected_check_out:
-                        print(f"❌ SALIDA PREMATURA: Hora actual {current_time} < Hora salida esperada {expected_check_out}")
-                        
-                        # Calcular tiempo restante hasta la hora de salida
-                        from datetime import datetime, timedelta
-                        current_datetime = datetime.combine(today, current_time)
-                        expected_datetime = datetime.combine(today, expected_check_out)
-                        time_remaining = expected_datetime - current_datetime
-                        
-                        # Formatear tiempo restante de forma legible
-                        hours = int(time_remaining.total_seconds() // 3600)
-                        minutes = int((time_remaining.total_seconds() % 3600) // 60)
-                        
-                        if hours > 0:
-                            time_remaining_str = f"{hours}h {minutes}m"
-                        else:
-                            time_remaining_str = f"{minutes}m"
-                        
-                        return Response({
-                            'success': False,
-                            'message': f"No puedes marcar salida antes de las {expected_check_out.strftime('%H:%M')}. Te faltan {time_remaining_str} para completar tu jornada laboral.",
-                            'error_type': 'checkout_before_schedule',
-                            'expected_check_out': expected_check_out.strftime('%H:%M'),
-                            'current_time': current_time.strftime('%H:%M'),
-                            'time_remaining': time_remaining_str,
-                            'time_remaining_minutes': int(time_remaining.total_seconds() // 60)
-                        }, status=status.HTTP_400_BAD_REQUEST)
+                    # Formatear tiempo restante de forma legible
+                    hours = int(time_remaining.total_seconds() // 3600)
+                    minutes = int((time_remaining.total_seconds() % 3600) // 60)
                     
-                    # Marcar salida
-                    attendance.check_out = current_time
-                    attendance.save()
-                    print(f"⏰ Hora de salida actualizada: {attendance.check_out}")
-                    message = f"Salida registrada exitosamente para {employee.full_name}"
-                    action_type = "salida"
+                    if hours > 0:
+                        time_remaining_str = f"{hours}h {minutes}m"
+                    else:
+                        time_remaining_str = f"{minutes}m"
                     
-                else:
-                    # No debería llegar aquí, pero por seguridad
-                    print(f"⚠️ Estado inconsistente de asistencia")
-                    return Response({
+                    return None, Response({
                         'success': False,
-                        'message': 'Estado inconsistente de asistencia. Contacta al administrador.',
-                        'error_type': 'inconsistent_state'
+                        'message': f"No puedes marcar salida antes de las {expected_check_out.strftime('%H:%M')}. Te faltan {time_remaining_str} para completar tu jornada laboral.",
+                        'error_type': 'checkout_before_schedule',
+                        'expected_check_out': expected_check_out.strftime('%H:%M'),
+                        'current_time': current_time.strftime('%H:%M'),
+                        'time_remaining': time_remaining_str,
+                        'time_remaining_minutes': int(time_remaining.total_seconds() // 60)
                     }, status=status.HTTP_400_BAD_REQUEST)
-                    
-            except Attendance.DoesNotExist:
-                # Nueva asistencia - validar horarios antes de permitir entrada
-                print(f"🆕 Creando nueva asistencia para {employee.full_name}")
                 
-                if expected_check_in and expected_check_out:
-                    # Validar horarios antes de permitir entrada
-                    from datetime import datetime, timedelta
-                    
-                    # Calcular hora límite con tolerancia (para entrada tarde)
-                    limit_time = datetime.combine(today, expected_check_in)
-                    limit_time = limit_time + timedelta(minutes=grace_period)
-                    limit_time = limit_time.time()
-                    
-                    # Calcular hora mínima permitida (para entrada temprana)
-                    min_time = datetime.combine(today, expected_check_in)
-                    min_time = min_time - timedelta(minutes=grace_period)
-                    min_time = min_time.time()
-                    
-                    print(f"🕐 Validación de horarios:")
-                    print(f"   - Hora entrada esperada: {expected_check_in}")
-                    print(f"   - Hora mínima permitida: {min_time}")
-                    print(f"   - Hora límite con tolerancia: {limit_time}")
-                    print(f"   - Hora actual: {current_time}")
-                    
-                    # Si es muy temprano para marcar entrada
-                    if current_time < min_time:
-                        print(f"❌ MUY TEMPRANO PARA ENTRADA: Hora actual {current_time} < Hora mínima {min_time}")
-                        return Response({
-                            'success': False,
-                            'message': f"No puedes marcar entrada antes de las {min_time.strftime('%H:%M')}. El horario de entrada comienza a las {expected_check_in.strftime('%H:%M')} con una tolerancia de {grace_period} minutos.",
-                            'error_type': 'too_early_for_entry',
-                            'expected_check_in': expected_check_in.strftime('%H:%M'),
-                            'min_time_allowed': min_time.strftime('%H:%M'),
-                            'current_time': current_time.strftime('%H:%M'),
-                            'grace_period': grace_period
-                        }, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    # Si es muy tarde para marcar entrada
-                    elif current_time > expected_check_out:
-                        print(f"❌ MUY TARDE PARA ENTRADA: Hora actual {current_time} > Hora salida {expected_check_out}")
-                        return Response({
-                            'success': False,
-                            'message': f"Ya pasó la hora de salida ({expected_check_out.strftime('%H:%M')}). No puedes marcar entrada ahora.",
-                            'error_type': 'too_late_for_entry',
-                            'expected_check_out': expected_check_out.strftime('%H:%M'),
-                            'current_time': current_time.strftime('%H:%M')
-                        }, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    # Si es tarde pero dentro del horario laboral
-                    elif current_time > limit_time:
-                        print(f"⚠️ LLEGADA TARDE: Hora actual {current_time} > Hora límite {limit_time}")
-                        initial_status = 'late'
-                        message = f"Entrada registrada con tardanza para {employee.full_name}"
-                    else:
-                        print(f"✅ A TIEMPO: Hora actual {current_time} <= Hora límite {limit_time}")
-                        initial_status = 'present'
-                        message = f"Entrada registrada exitosamente para {employee.full_name}"
-                else:
-                    # Sin horario definido, marcar como presente
-                    print(f"ℹ️ Sin horario definido para el área, marcando como presente")
-                    initial_status = 'present'
-                    message = f"Entrada registrada exitosamente para {employee.full_name}"
-                
-                # Crear nueva asistencia
-                attendance = Attendance.objects.create(
-                    employee=employee,
-                    date=today,
-                    area=area,
-                    check_in=current_time,
-                    status=initial_status,
-                    latitude=latitude,
-                    longitude=longitude,
-                    face_verified=face_verified
+                plan.update(
+                    attendance=attendance, action_type="salida",
+                    message=f"Salida registrada exitosamente para {employee.full_name}"
                 )
-                
-                print(f"✅ NUEVA asistencia creada para {employee.full_name}")
-                print(f"   - Status inicial: {initial_status}")
-                print(f"   - Hora entrada: {attendance.check_in}")
-                action_type = "entrada"
+                return plan, None
             
-            # Actualizar estado basado en horarios (por si cambió algo)
-            attendance.update_status_based_on_schedule()
-            attendance.save()
+            # No debería llegar aquí, pero por seguridad
+            logger.warning("mark_attendance: estado inconsistente en asistencia %s", attendance.id)
+            return None, Response({
+                'success': False,
+                'message': 'Estado inconsistente de asistencia. Contacta al administrador.',
+                'error_type': 'inconsistent_state'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Nueva asistencia - validar horarios antes de permitir entrada
+        if expected_check_in and expected_check_out:
+            # Validar horarios antes de permitir entrada
+            from datetime import datetime
             
-            print(f"📊 Asistencia final: {attendance}")
-            print(f"   - Status final: {attendance.status}")
-            print(f"   - Es tarde: {attendance.is_late}")
+            # Calcular hora límite con tolerancia (para entrada tarde)
+            limit_time = datetime.combine(today, expected_check_in)
+            limit_time = limit_time + timedelta(minutes=grace_period)
+            limit_time = limit_time.time()
             
-            serializer = AttendanceSerializer(attendance)
+            # Calcular hora mínima permitida (para entrada temprana)
+            min_time = datetime.combine(today, expected_check_in)
+            min_time = min_time - timedelta(minutes=grace_period)
+            min_time = min_time.time()
             
-            # Crear respuesta personalizada
-            response_data = {
-                'attendance': serializer.data,
-                'message': message,
-                'location_info': {
-                    'employee_lat': float(latitude),
-                    'employee_lng': float(longitude),
-                    'area_lat': float(area.latitude),
-                    'area_lng': float(area.longitude),
-                    'area_radius': area.radius,
-                    'distance_meters': round(distance_meters, 2) if distance_meters else None
-                },
-                'action_type': action_type,
-                'check_in': attendance.check_in,
-                'check_out': attendance.check_out,
-                'employee_name': employee.full_name,
-                'status': attendance.status,
-                'status_display': attendance.get_status_display(),
-                'is_late': attendance.is_late,
-                'expected_check_in': expected_check_in,
-                'expected_check_out': expected_check_out
-            }
+            # Si es muy temprano para marcar entrada
+            if current_time < min_time:
+                return None, Response({
+                    'success': False,
+                    'message': f"No puedes marcar entrada antes de las {min_time.strftime('%H:%M')}. El horario de entrada comienza a las {expected_check_in.strftime('%H:%M')} con una tolerancia de {grace_period} minutos.",
+                    'error_type': 'too_early_for_entry',
+                    'expected_check_in': expected_check_in.strftime('%H:%M'),
+                    'min_time_allowed': min_time.strftime('%H:%M'),
+                    'current_time': current_time.strftime('%H:%M'),
+                    'grace_period': grace_period
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            print(f"🎯 RESPUESTA COMPLETA que se envía al frontend:")
-            print(f"   - action_type: {action_type}")
-            print(f"   - employee_name: {employee.full_name}")
-            print(f"   - message: {message}")
-            print(f"   - status: {attendance.status}")
-            print(f"   - is_late: {attendance.is_late}")
-            print(f"   - response_data keys: {list(response_data.keys())}")
+            # Si es muy tarde para marcar entrada
+            elif current_time > expected_check_out:
+                return None, Response({
+                    'success': False,
+                    'message': f"Ya pasó la hora de salida ({expected_check_out.strftime('%H:%M')}). No puedes marcar entrada ahora.",
+                    'error_type': 'too_late_for_entry',
+                    'expected_check_out': expected_check_out.strftime('%H:%M'),
+                    'current_time': current_time.strftime('%H:%M')
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            return Response(response_data)
+            # Si es tarde pero dentro del horario laboral
+            elif current_time > limit_time:
+                initial_status = 'late'
+                message = f"Entrada registrada con tardanza para {employee.full_name}"
+            else:
+                initial_status = 'present'
+                message = f"Entrada registrada exitosamente para {employee.full_name}"
+        else:
+            # Sin horario definido, marcar como presente
+            initial_status = 'present'
+            message = f"Entrada registrada exitosamente para {employee.full_name}"
+        
+        plan.update(action_type="entrada", initial_status=initial_status, message=message)
+        return plan, None
+    
+    def _write_attendance(self, plan, face_verified, extra=None):
+        """
+        Registra la entrada o la salida validada por _attendance_precheck
+        
+        Args:
+            plan: dict devuelto por _attendance_precheck
+            face_verified: Si el rostro fue verificado
+            extra: Campos adicionales para la respuesta (p. ej. la confianza facial)
+        
+        Returns:
+            Response con la asistencia registrada
+        """
+        employee, area = plan['employee'], plan['area']
+        latitude, longitude = plan['latitude'], plan['longitude']
+        distance_meters = plan['distance_meters']
+        action_type = plan['action_type']
+        
+        if action_type == "salida":
+            # Marcar salida
+            attendance = plan['attendance']
+            attendance.check_out = plan['current_time']
+            attendance.save()
+        else:
+            # Crear nueva asistencia. Entre la validación y la escritura puede entrar
+            # otra solicitud del mismo empleado (doble toque en el kiosco)
+            try:
+                with transaction.atomic():
+                    attendance = Attendance.objects.create(
+                        employee=employee,
+                        date=plan['today'],
+                        area_id=area.id,
+                        check_in=plan['current_time'],
+                        status=plan['initial_status'],
+                        latitude=latitude,
+                        longitude=longitude,
+                        face_verified=face_verified
+                    )
+            except IntegrityError:
+                logger.info("mark_attendance: %s ya registró entrada hoy", employee.full_name)
+                return Response({
+                    'success': False,
+                    'message': f"{employee.full_name} ya tiene la entrada registrada para hoy",
+                    'error_type': 'already_marked',
+                    'employee_name': employee.full_name
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Actualizar estado basado en horarios (por si cambió algo)
+        attendance.update_status_based_on_schedule()
+        attendance.save()
+        logger.info(
+            "Asistencia %s: %s (%s) estado=%s",
+            action_type, employee.full_name, attendance.date, attendance.status
+        )
+        
+        serializer = AttendanceSerializer(attendance)
+        
+        # Crear respuesta personalizada
+        response_data = {
+            'attendance': serializer.data,
+            'message': plan['message'],
+            'location_info': {
+                'employee_lat': float(latitude),
+                'employee_lng': float(longitude),
+                'area_lat': float(area.latitude),
+                'area_lng': float(area.longitude),
+                'area_radius': area.radius,
+                'distance_meters': round(distance_meters, 2) if distance_meters else None
+            },
+            'action_type': action_type,
+            'check_in': attendance.check_in,
+            'check_out': attendance.check_out,
+            'employee_name': employee.full_name,
+            'status': attendance.status,
+            'status_display': attendance.get_status_display(),
+            'is_late': attendance.is_late,
+            'expected_check_in': plan['expected_check_in'],
+            'expected_check_out': plan['expected_check_out']
+        }
+        if extra:
+            response_data.update(extra)
+        
+        return Response(response_data)
+    
+    @action(detail=False, methods=['post'])
+    def mark_attendance(self, request):
+        """Marcar asistencia de un empleado"""
+        try:
+            face_verified = request.data.get('face_verified', False)
+            logger.debug(
+                "mark_attendance: employee_id=%s area_id=%s face_verified=%s lat=%s lng=%s",
+                request.data.get('employee_id'), request.data.get('area_id'), face_verified,
+                request.data.get('latitude'), request.data.get('longitude')
+            )
+            
+            plan, error = self._attendance_precheck(request)
+            if error is not None:
+                return error
+            return self._write_attendance(plan, face_verified)
             
-        except (Employee.DoesNotExist, Area.DoesNotExist) as e:
-            print(f"❌ Error: {e}")
+        except Exception as e:
+            logger.exception("mark_attendance: error inesperado")
             return Response(
-                {'error': 'Empleado o área no encontrada'}, 
-                status=status.HTTP_404_NOT_FOUND
+                {'error': f'Error interno: {str(e)}'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    @action(detail=False, methods=['post'], parser_classes=FACE_UPLOAD_PARSERS)
+    @timed_face_action('verify_and_mark')
+    def verify_and_mark(self, request):
+        """
+        Verificar rostro y marcar asistencia en una sola solicitud (kiosco)
+        
+        Primero se hacen las validaciones baratas de mark_attendance (geocerca, día
+        laboral, asistencia de hoy ya completa o fuera de horario); el rostro solo se
+        verifica si pasan, y la asistencia se escribe con face_verified=True solo si la
+        confianza alcanza ATTENDANCE_FACE_MIN_CONFIDENCE.
+        """
+        try:
+            plan, error = self._attendance_precheck(request)
+            if error is not None:
+                return error
+            
+            photos = EmployeeViewSet._request_photos(request, 'photo', 'photo_base64')
+            if not photos:
+                return Response({
+                    'success': False,
+                    'message': 'Se requiere una foto para verificación',
+                    'error_type': 'missing_photo'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            employee = plan['employee']
+            result = face_service_singleton.verify_face(employee, photos[0])
+            confidence = result.get('confidence') or 0.0
+            min_confidence = settings.ATTENDANCE_FACE_MIN_CONFIDENCE
+            
+            if not result.get('verified'):
+                logger.info("verify_and_mark: rostro de %s no verificado: %s", employee.full_name, result.get('message'))
+                return Response({
+                    'success': False,
+                    'message': f"Rostro no reconocido: {result.get('message', '')}",
+                    'error_type': 'face_not_verified',
+                    'confidence': confidence
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            if confidence < min_confidence:
+                logger.info(
+                    "verify_and_mark: confianza insuficiente para %s (%.3f < %.2f)",
+                    employee.full_name, confidence, min_confidence
+                )
+                return Response({
+                    'success': False,
+                    'message': f"Confianza insuficiente: {confidence * 100:.1f}%. Se requiere mínimo {min_confidence * 100:.0f}% para registrar asistencia.",
+                    'error_type': 'low_confidence',
+                    'confidence': confidence,
+                    'min_confidence': min_confidence
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            return self._write_attendance(plan, True, extra={'face_verified': True, 'confidence': confidence})
+            
         except Exception as e:
-            print(f"❌ Error inesperado: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("verify_and_mark: error inesperado")
             return Response(
                 {'error': f'Error interno: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -1914,6 +1898,33 @@ class EmployeePasswordResetViewSet(viewsets.ViewSet):
                 'error': 'Error verificando email'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def face_readiness(request):
+    """
+    Readiness del sistema facial en este proceso (200 listo, 503 si no)
+    """
+    state = readiness()
+    return Response(state, status=status.HTTP_200_OK if state['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def face_timings(request):
+    """
+    Histogramas de tiempo por etapa del sistema facial en este proceso (solo administradores)
+    DELETE los reinicia
+    """
+    if getattr(request.user, 'role', None) != 'admin':
+        return Response({
+            'error': 'Solo los administradores pueden consultar los tiempos del sistema facial'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.method == 'DELETE':
+        reset_timings()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    return Response(timing_snapshot())
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def check_password_change_required(request):
@@ -1,18 +1,41 @@
 import cv2
+import logging
 import numpy as np
 import os
 import time
 import shutil
-from deepface import DeepFace
+from embedding_index import EmbeddingIndex
+from embedding_store import append_person_embeddings, count_person_embeddings
+from batched_inference import MODEL_INPUT_SIZES, BatchedEmbedder
+from embedding_cache import EMBEDDING, FACES, EmbeddingCache
+from face_detector import FaceDetector
+from image_pipeline import crop_face, fit_to_input
+
+# Bajo el logger 'core' para seguir su nivel y el muestreo por solicitud del proyecto
+logger = logging.getLogger('core.face_recognition')
 
 class FacialRecognition:
-    def __init__(self, base_dir=None, database_name="faces"):
+    def __init__(self, base_dir=None, database_name="faces", shared_store_dir=None, index_options=None,
+                 batch_size=32, inference_client=None, cache_options=None, detector_options=None,
+                 warm_up=True):
         """
         Inicializa el sistema de reconocimiento facial genérico
         
         Args:
             base_dir: Directorio base donde se guardarán los rostros
             database_name: Nombre de la carpeta para la base de datos de rostros
+            shared_store_dir: Directorio del almacén de embeddings compartido entre
+                procesos (None = índice privado en memoria)
+            index_options: Opciones del índice 1:N (mode, nprobe, ivf_min_size)
+            batch_size: Rostros por forward del modelo en batch_extract_features
+            inference_client: Cliente del servidor de inferencia local; si se indica,
+                los embeddings y RetinaFace corren en ese proceso y aquí no se importa
+                DeepFace/TensorFlow (sin servidor no hay embeddings, no se calculan aquí)
+            cache_options: Opciones de la caché por contenido de imagen (max_bytes, ttl)
+            detector_options: Opciones de FaceDetector (tiers, budget_ms, haar_max_side,
+                retinaface_max_side)
+            warm_up: Ejecutar inferencias de prueba al cargar. False solo carga los pesos
+                (precarga en el proceso maestro de gunicorn antes del fork)
         """
         if base_dir is None:
             base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -24,39 +47,110 @@ class FacialRecognition:
         if not os.path.exists(self.face_dir):
             os.makedirs(self.face_dir)
         
-        # Pre-cargar modelos de DeepFace
+        # Índice en memoria para identificación 1:N (se construye en la primera búsqueda)
+        index_options = dict(index_options or {})
+        index_options.setdefault('centroids_path', os.path.join(shared_store_dir or base_dir, 'ivf_centroids.npy'))
+        self.index = EmbeddingIndex(self.face_dir, shared_dir=shared_store_dir, **index_options)
+        
+        # Caché de detección y embeddings por contenido de imagen (reintentos del kiosko)
+        self.cache = EmbeddingCache(**(cache_options or {}))
+        
+        # Detectores precargados (uno por hilo) con cadena Haar → RetinaFace y presupuesto
+        self.detector = FaceDetector(inference_client=inference_client, **(detector_options or {}))
+        self.detector.warm_up()
+        
+        # Inferencia por lotes (el modelo se construye en el primer uso)
+        self.batch_size = max(1, int(batch_size))
+        self._embedder = None
+        self.inference_client = inference_client
+        
+        if inference_client is not None:
+            self._connect_inference_server()
+        elif warm_up:
+            # Pre-cargar modelos de DeepFace
+            self._preload_models()
+        else:
+            self._load_models()
+    
+    def _connect_inference_server(self):
+        """Toma el modelo del servidor de inferencia en lugar de cargarlo en este proceso"""
+        try:
+            info = self.inference_client.info()
+            self.model_name = info.get('model_name', 'Facenet')
+            logger.info("Servidor de inferencia conectado: %s, lotes de %s", self.model_name, info.get('batch_size'))
+        except Exception as e:
+            logger.warning("Servidor de inferencia no disponible todavía: %s", e)
+            self.model_name = "Facenet"
+    
+    def _remote_embed(self, face_images):
+        """
+        Embeddings calculados por el servidor de inferencia
+
+        Si el servidor no responde no se calculan localmente (cargaría TensorFlow en
+        el worker): cada rostro queda en None.
+        """
+        try:
+            return self.inference_client.embed(face_images)
+        except Exception as e:
+            logger.warning("Servidor de inferencia no disponible, rostros sin embedding: %s", e)
+            return [None] * len(face_images)
+    
+    def _load_models(self):
+        """Carga los pesos de RetinaFace y Facenet sin ejecutar ninguna inferencia"""
+        self.model_name = "Facenet"
+        try:
+            from deepface.detectors import FaceDetector as DeepFaceDetector
+            DeepFaceDetector.build_model('retinaface')
+            logger.info("Pesos de RetinaFace cargados")
+        except Exception as e:
+            logger.warning("No se pudieron cargar los pesos de RetinaFace: %s", e)
+        try:
+            self._get_embedder()._get_model()
+            logger.info("Pesos de Facenet-128 cargados")
+        except Exception as e:
+            logger.warning("No se pudieron cargar los pesos de Facenet: %s", e)
+    
+    def warm_up_models(self):
+        """Inferencias de prueba (crea el estado de ejecución de TensorFlow en este proceso)"""
+        if self.inference_client is not None:
+            return
         self._preload_models()
+        self._get_embedder().embed([np.full((160, 160, 3), 128, dtype=np.uint8)])
+        self.detector.warm_up()
     
     def _preload_models(self):
         """Pre-carga los modelos de DeepFace para evitar demoras - OPTIMIZADO PARA VELOCIDAD"""
-        print("🚀 Inicializando modelos de DeepFace con configuración OPTIMIZADA PARA VELOCIDAD...")
+        logger.info("Inicializando modelos de DeepFace")
         dummy_image = np.ones((224, 224, 3), dtype=np.uint8) * 128
         try:
+            from deepface import DeepFace
+            
             # Pre-cargar detector RetinaFace
             DeepFace.extract_faces(dummy_image, detector_backend='retinaface', enforce_detection=False)
-            print("✅ RetinaFace detector cargado")
+            logger.debug("RetinaFace detector cargado")
             
             # ✅ OPTIMIZACIÓN: Usar Facenet-128 para VELOCIDAD (más rápido que Facenet-512)
             # Mantiene buena precisión pero es 2-3x más rápido
             try:
                 DeepFace.represent(dummy_image, model_name="Facenet", detector_backend='retinaface', enforce_detection=False)
-                print("✅ Facenet-128 (VELOCIDAD OPTIMIZADA) cargado - 128 características")
+                logger.debug("Facenet-128 cargado")
                 self.model_name = "Facenet"  # Cache del modelo para reutilización
             except Exception as e:
-                print(f"⚠️ Error cargando Facenet-128, usando VGG-Face: {e}")
+                logger.warning("Error cargando Facenet-128, usando VGG-Face: %s", e)
                 DeepFace.represent(dummy_image, model_name="VGG-Face", detector_backend='retinaface', enforce_detection=False)
-                print("✅ VGG-Face (Fallback rápido) cargado")
+                logger.debug("VGG-Face cargado")
                 self.model_name = "VGG-Face"
             
-            print("🎯 Modelos de DeepFace con configuración OPTIMIZADA PARA VELOCIDAD cargados correctamente")
+            logger.info("Modelos de DeepFace cargados (%s)", self.model_name)
         except Exception as e:
-            print(f"⚠️ Advertencia al pre-cargar modelos: {e}")
+            logger.warning("Advertencia al pre-cargar modelos: %s", e)
             self.model_name = "Facenet"  # Fallback por defecto
     
     def detect_faces(self, image):
         """
         Detecta rostros en una imagen - ULTRA-OPTIMIZADO PARA VELOCIDAD
-        ✅ OPTIMIZACIÓN: Usa detector más rápido para casos de 15 fotos
+        ✅ OPTIMIZACIÓN: Haar sobre una copia reducida; RetinaFace solo si Haar no
+        encuentra nada y cabe en el presupuesto de tiempo (ver face_detector.py)
         
         Args:
             image: Imagen en formato numpy array (BGR)
@@ -65,47 +159,12 @@ class FacialRecognition:
             Lista de diccionarios con coordenadas de rostros detectados
         """
         try:
-            # ✅ OPTIMIZACIÓN ULTRA-RÁPIDA: Usar OpenCV Haar Cascade (más rápido que RetinaFace)
-            # Para casos de 15 fotos, priorizamos velocidad sobre precisión máxima
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Cargar detector Haar Cascade (más rápido)
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-            
-            face_list = []
-            for (x, y, w, h) in faces:
-                face_list.append({
-                    'x': int(x),
-                    'y': int(y),
-                    'width': int(w),
-                    'height': int(h)
-                })
-            
-            # Si no detecta rostros con Haar, usar RetinaFace como fallback
-            if not face_list:
-                print("      🔄 Fallback a RetinaFace...")
-                faces = DeepFace.extract_faces(
-                    image, 
-                    detector_backend='retinaface',
-                    align=False,
-                    enforce_detection=False
-                )
-                for face in faces:
-                    facial_area = face['facial_area']
-                    face_list.append({
-                        'x': facial_area['x'],
-                        'y': facial_area['y'],
-                        'width': facial_area['w'],
-                        'height': facial_area['h']
-                    })
-            
-            return face_list
+            faces, _ = self.detector.detect(image)
+            return faces
         except Exception as e:
-            print(f"Error en detección facial: {e}")
+            logger.warning("Error en detección facial, se asume la imagen completa como rostro: %s", e)
             # ✅ FALLBACK: Si no detecta rostros, asumir que la imagen completa es un rostro
             try:
-                print(f"      🔄 Fallback: Asumiendo imagen completa como rostro...")
                 h, w = image.shape[:2]
                 return [{
                     'x': 0,
@@ -116,6 +175,63 @@ class FacialRecognition:
             except:
                 return []
     
+    def detect_faces_cached(self, image, cache_key=None):
+        """
+        detect_faces con caché por contenido de imagen
+        
+        Args:
+            image: Imagen en formato numpy array (BGR)
+            cache_key: Clave de EmbeddingCache.key_for (None = sin caché)
+            
+        Returns:
+            Lista de diccionarios con coordenadas de rostros detectados
+        """
+        faces = self.cache.get(cache_key, FACES)
+        if faces is None:
+            faces = self.detect_faces(image)
+            self.cache.put(cache_key, FACES, faces)
+        return faces
+    
+    def crop_detected_face(self, image, cache_key=None):
+        """
+        Recorte del primer rostro listo para el modelo (mismo recorte que el registro)
+        
+        Args:
+            image: Cuadro BGR
+            cache_key: Clave de EmbeddingCache.key_for (reutiliza la detección)
+            
+        Returns:
+            Recorte ajustado al tamaño de entrada del modelo o None si no hay rostro
+        """
+        faces = self.detect_faces_cached(image, cache_key)
+        face_image = crop_face(image, faces[0]) if faces else None
+        if face_image is None:
+            return None
+        return fit_to_input(face_image, MODEL_INPUT_SIZES.get(getattr(self, 'model_name', 'Facenet'), (160, 160)))
+    
+    def face_embedding(self, face_image, cache_key=None):
+        """
+        Embedding de un rostro recortado, guardado por contenido del cuadro de origen
+        
+        verify_face e identify_person recortan igual (crop_detected_face), así que
+        un mismo cuadro pasa una sola vez por el modelo sin importar el flujo.
+        
+        Args:
+            face_image: Recorte listo para el modelo
+            cache_key: Clave de EmbeddingCache.key_for del cuadro completo
+            
+        Returns:
+            Embedding float32 o None si no se pudo extraer
+        """
+        features = self.cache.get(cache_key, EMBEDDING)
+        if features is None:
+            features = self.extract_face_features(face_image)
+            if features is None:
+                return None
+            features = np.asarray(features, dtype=np.float32)
+            self.cache.put(cache_key, EMBEDDING, features)
+        return features
+    
     def extract_face_features(self, face_image):
         """
         Extrae características faciales usando modelo optimizado para VELOCIDAD
@@ -127,10 +243,13 @@ class FacialRecognition:
         Returns:
             Array numpy con las características del rostro (128 dimensiones) o None si hay error
         """
+        if self.inference_client is not None:
+            return self._remote_embed([face_image])[0]
+        
+        # ✅ USAR MODELO CACHEADO PARA MÁXIMA VELOCIDAD
+        model_to_use = getattr(self, 'model_name', 'Facenet')
         try:
-            # ✅ USAR MODELO CACHEADO PARA MÁXIMA VELOCIDAD
-            model_to_use = getattr(self, 'model_name', 'Facenet')
-            print(f"      🧠 Extrayendo características con {model_to_use} (VELOCIDAD OPTIMIZADA)...")
+            from deepface import DeepFace
             
             # ✅ CONFIGURACIÓN ULTRA-OPTIMIZADA PARA VELOCIDAD
             embedding = DeepFace.represent(
@@ -142,16 +261,13 @@ class FacialRecognition:
             )
             
             features = embedding[0]['embedding']
-            print(f"      ✅ Características extraídas: {len(features)} dimensiones")
-            print(f"      🎯 Tipo de embedding: {model_to_use} (VELOCIDAD OPTIMIZADA)")
             
             return features
             
         except Exception as e:
-            print(f"      ❌ Error extrayendo características {model_to_use}: {e}")
+            logger.warning("Error extrayendo características con %s, se usa VGG-Face: %s", model_to_use, e)
             # ✅ FALLBACK ULTRA-RÁPIDO a VGG-Face
             try:
-                print(f"      🔄 Usando fallback ULTRA-RÁPIDO a VGG-Face...")
                 embedding = DeepFace.represent(
                     face_image,
                     model_name="VGG-Face",  # Fallback más rápido
@@ -160,10 +276,9 @@ class FacialRecognition:
                     align=False  # Sin alineación para máxima velocidad
                 )
                 features = embedding[0]['embedding']
-                print(f"      ⚡ Usando VGG-Face ULTRA-RÁPIDO: {len(features)} dimensiones")
                 return features
             except Exception as e2:
-                print(f"      ❌ Error en fallback ultra-rápido: {e2}")
+                logger.error("Error en el fallback a VGG-Face: %s", e2)
                 return None
     
     def compare_faces(self, features1, features2):
@@ -209,20 +324,19 @@ class FacialRecognition:
             # ✅ OPTIMIZACIÓN: Compresión más rápida (70 en lugar de 85)
             cv2.imwrite(face_path, face_image, [cv2.IMWRITE_JPEG_QUALITY, 70])
             
-            features_filename = f"{timestamp}.npy"
-            features_path = os.path.join(person_folder, features_filename)
-            np.save(features_path, features)
+            append_person_embeddings(person_folder, [features], getattr(self, 'model_name', 'Facenet'))
+            self.index.add(os.path.basename(person_folder), [features])
             
-            print(f"Guardado: {face_filename} y {features_filename}")
+            logger.debug("Guardado: %s y embeddings empaquetados", face_filename)
             return True
         except Exception as e:
-            print(f"Error al guardar características: {e}")
+            logger.error("Error al guardar características: %s", e)
             return False
     
     def batch_extract_features(self, face_images):
         """
-        ✅ NUEVO MÉTODO: Extrae características de múltiples rostros en lote
-        ULTRA-OPTIMIZADO PARA VELOCIDAD - Procesa múltiples imágenes simultáneamente
+        Extrae características de múltiples rostros en lote
+        ✅ Un solo forward del modelo por lote (tamaño configurable con batch_size)
         
         Args:
             face_images: Lista de imágenes de rostros
@@ -230,47 +344,41 @@ class FacialRecognition:
         Returns:
             Lista de características (arrays numpy) o None para imágenes fallidas
         """
+        if not face_images:
+            return []
+        
+        if self.inference_client is not None:
+            return self._remote_embed(face_images)
+        
         try:
-            print(f"🚀 PROCESAMIENTO EN LOTE ULTRA-OPTIMIZADO: {len(face_images)} rostros")
-            
-            # ✅ OPTIMIZACIÓN ESPECIAL: Para pocas fotos (≤20), procesar todas juntas
-            if len(face_images) <= 20:
-                print(f"   ⚡ MODO ULTRA-RÁPIDO: Procesando {len(face_images)} rostros simultáneamente")
-                batch_size = len(face_images)  # Procesar todas juntas
-            else:
-                # Para muchas fotos, usar lotes más grandes
-                batch_size = 5
-                print(f"   📦 MODO LOTE: Procesando en lotes de {batch_size}")
-            
-            all_features = []
-            
-            for i in range(0, len(face_images), batch_size):
-                batch = face_images[i:i + batch_size]
-                print(f"   📦 Procesando lote {i//batch_size + 1}: {len(batch)} rostros")
-                
-                batch_features = []
-                for j, face_image in enumerate(batch):
-                    try:
-                        features = self.extract_face_features(face_image)
-                        batch_features.append(features)
-                        if features is not None:
-                            print(f"      ✅ Rostro {i+j+1}: {len(features)} características")
-                        else:
-                            print(f"      ❌ Rostro {i+j+1}: Falló extracción")
-                    except Exception as e:
-                        print(f"      ❌ Rostro {i+j+1}: Error - {e}")
-                        batch_features.append(None)
-                
-                all_features.extend(batch_features)
-            
+            embedder = self._get_embedder()
+            all_features = embedder.embed(face_images)
+            calls = -(-sum(1 for f in face_images if f is not None) // embedder.batch_size)
             successful = sum(1 for f in all_features if f is not None)
-            print(f"✅ PROCESAMIENTO EN LOTE COMPLETADO: {successful}/{len(face_images)} exitosos")
-            
+            logger.debug("Lote de %s rostros: %s exitosos en %s llamadas al modelo", len(face_images), successful, calls)
             return all_features
-            
         except Exception as e:
-            print(f"❌ Error en procesamiento en lote: {e}")
-            return [None] * len(face_images)
+            logger.warning("Error en inferencia por lotes, procesando rostro por rostro: %s", e)
+        
+        all_features = []
+        for i, face_image in enumerate(face_images):
+            try:
+                features = self.extract_face_features(face_image)
+            except Exception as e:
+                logger.warning("Rostro %s: error extrayendo características: %s", i + 1, e)
+                features = None
+            all_features.append(features)
+        
+        successful = sum(1 for f in all_features if f is not None)
+        logger.debug("Procesamiento individual: %s/%s exitosos", successful, len(face_images))
+        return all_features
+    
+    def _get_embedder(self):
+        """Modelo para inferencia por lotes (se construye en el primer uso)"""
+        model_name = getattr(self, 'model_name', 'Facenet')
+        if self._embedder is None or self._embedder.model_name != model_name:
+            self._embedder = BatchedEmbedder(model_name, batch_size=self.batch_size)
+        return self._embedder
     
     def register_person(self, person_id, person_name, image, max_faces=50):
         """
@@ -290,21 +398,16 @@ class FacialRecognition:
             folder_name = f"{person_id}"
             folder_path = os.path.join(self.face_dir, folder_name)
             
-            print(f"🎯 NUEVA ESTRATEGIA: Carpeta solo con ID '{folder_name}' para máxima robustez")
-            print(f"📝 Nombre del empleado: {person_name} (solo informativo)")
             
             if not os.path.exists(folder_path):
                 os.makedirs(folder_path)
-                print(f"📁 Carpeta creada: {folder_path}")
-            else:
-                print(f"📁 Carpeta existente: {folder_path}")
             
             # Detectar rostros
             faces = self.detect_faces(image)
             existing_images = len([f for f in os.listdir(folder_path) if f.endswith('.jpg') and not f.startswith('full_')])
             
             if not faces:
-                print("❌ No se detectaron rostros en la imagen")
+                logger.debug("No se detectaron rostros en la imagen")
                 return {
                     'success': False,
                     'error': 'No se detectaron rostros en la imagen'
@@ -328,12 +431,12 @@ class FacialRecognition:
                 if face_image.size > 0:
                     face_images.append(face_image)
             
-            print(f"📸 Rostros extraídos para procesamiento: {len(face_images)}")
             
             # ✅ OPTIMIZACIÓN: Procesamiento en lote
             if face_images:
                 features_list = self.batch_extract_features(face_images)
                 saved_faces = 0
+                saved_features = []
                 
                 # Guardar rostros y características
                 for i, (face_image, features) in enumerate(zip(face_images, features_list)):
@@ -344,15 +447,19 @@ class FacialRecognition:
                         
                         # ✅ OPTIMIZACIÓN: Compresión más rápida
                         if cv2.imwrite(face_path, face_image, [cv2.IMWRITE_JPEG_QUALITY, 70]):
-                            features_filename = f"face_{timestamp}.npy"
-                            features_path = os.path.join(folder_path, features_filename)
-                            np.save(features_path, features)
+                            saved_features.append(features)
                             saved_faces += 1
-                            print(f"   ✅ Rostro {i+1} guardado exitosamente")
                         else:
-                            print(f"   ❌ Error guardando rostro {i+1}")
+                            logger.warning("Error guardando rostro %s", i + 1)
                     else:
-                        print(f"   ❌ Rostro {i+1} sin características válidas")
+                        logger.debug("Rostro %s sin características válidas", i + 1)
+                
+                # ✅ Un solo archivo empaquetado por persona (escritura atómica)
+                if saved_features:
+                    append_person_embeddings(folder_path, saved_features, getattr(self, 'model_name', 'Facenet'))
+                
+                # Mantener sincronizado el índice en memoria
+                self.index.add(folder_name, saved_features)
             else:
                 saved_faces = 0
             
@@ -366,123 +473,97 @@ class FacialRecognition:
             }
             
         except Exception as e:
-            print(f"Error en el registro facial: {e}")
+            logger.error("Error en el registro facial: %s", e)
             return {'success': False, 'error': str(e)}
     
-    def identify_person(self, image, similarity_threshold=0.6):
+    def _parse_folder_name(self, folder):
+        """Extrae (id, nombre) del nombre de la carpeta de una persona"""
+        person_id = ''.join(filter(str.isdigit, folder.split('_')[0] if '_' in folder else folder))
+        person_name = folder[len(person_id):]
+        return person_id, person_name
+    
+    def identify_person(self, image, similarity_threshold=0.6, top_k=5):
         """
         Identifica una persona comparando su rostro con la base de datos
         ✅ IMPLEMENTACIÓN OPTIMIZADA PARA ALTA PRECISIÓN (95%)
+        ✅ Búsqueda vectorizada sobre el índice en memoria (sin lecturas de disco)
         
         Args:
             image: Imagen que contiene el rostro a identificar
             similarity_threshold: 🔑 UMBRAL CLAVE: 0.6 (60%) para alta precisión
+            top_k: Número de candidatos (personas distintas) a devolver con su similitud
             
         Returns:
-            Diccionario con información de identificación
+            Diccionario con información de identificación y lista 'candidates'
         """
         try:
-            print(f"🔍 IDENTIFICACIÓN FACIAL - Configuración de alta precisión")
-            print(f"   Umbral configurado: {similarity_threshold}")
             
-            # ✅ DETECCIÓN CLAVE: usando RetinaFace optimizado
-            faces = self.detect_faces(image)
+            # ✅ DETECCIÓN CLAVE: RetinaFace, con la detección y el embedding compartidos
+            # por contenido del cuadro con verify_face (reintentos sin repetir el modelo)
+            cache_key = self.cache.key_for(image) if self.cache.enabled else None
+            faces = self.detect_faces_cached(image, cache_key)
             if not faces:
-                print("❌ No se detectaron rostros en la imagen")
+                logger.debug("Identificación: no se detectaron rostros")
                 return {
                     'success': True,
                     'person_identified': None,
-                    'similarity': 0.0
+                    'similarity': 0.0,
+                    'candidates': []
                 }
             
-            print(f"✅ Rostros detectados: {len(faces)}")
-            
-            # ✅ EXTRACCIÓN CLAVE: rostro con margen para mejor precisión
-            x, y, w, h = faces[0]['x'], faces[0]['y'], faces[0]['width'], faces[0]['height']
-            margin = 20  # 🔑 MARGEN CLAVE: 20 píxeles para contexto facial
-            x_start = max(0, x - margin)
-            y_start = max(0, y - margin)
-            x_end = min(image.shape[1], x + w + margin)
-            y_end = min(image.shape[0], y + h + margin)
-            face_image = image[y_start:y_end, x_start:x_end]
-            
-            if face_image.size == 0:
-                print("❌ Error al extraer el rostro con margen")
+            # ✅ EXTRACCIÓN CLAVE: mismo recorte (con margen) que el registro y la verificación
+            face_image = self.crop_detected_face(image, cache_key)
+            if face_image is None:
+                logger.debug("Identificación: recorte del rostro vacío")
                 return {'success': False, 'error': 'Error al extraer el rostro'}
             
-            print(f"✅ Rostro extraído con margen: {face_image.shape}")
-            
-            # ✅ EXTRACCIÓN CLAVE: características con Facenet optimizado
-            features = self.extract_face_features(face_image)
+            features = self.face_embedding(face_image, cache_key)
             if features is None:
-                print("❌ Error al extraer características faciales")
+                logger.debug("Identificación: no se pudieron extraer características")
                 return {'success': False, 'error': 'Error al extraer características faciales'}
             
-            print(f"✅ Características extraídas: {len(features)} dimensiones")
             
-            # ✅ BÚSQUEDA CLAVE: comparación optimizada con todos los rostros
-            best_match_id = None
-            best_match_name = None
-            best_similarity = 0.0
+            # ✅ BÚSQUEDA CLAVE: un solo producto matriz-vector sobre el índice en memoria
+            matches = self.index.search(features, top_k=max(1, top_k))
             
-            print(f"🔍 Buscando coincidencias en {len(os.listdir(self.face_dir))} carpetas...")
+            candidates = []
+            for label, similarity in matches:
+                person_id, person_name = self._parse_folder_name(label)
+                candidates.append({
+                    'id': person_id,
+                    'name': person_name,
+                    'similarity': similarity
+                })
             
-            for folder in os.listdir(self.face_dir):
-                folder_path = os.path.join(self.face_dir, folder)
-                if not os.path.isdir(folder_path):
-                    continue
-                
-                # Extraer ID y nombre del nombre de la carpeta
-                person_id = ''.join(filter(str.isdigit, folder.split('_')[0] if '_' in folder else folder))
-                person_name = folder[len(person_id):]
-                
-                # Comparar con todos los rostros registrados de esta persona
-                for file in os.listdir(folder_path):
-                    if not file.endswith('.npy'):
-                        continue
-                    
-                    features_path = os.path.join(folder_path, file)
-                    stored_features = np.load(features_path)
-                    
-                    # ✅ COMPARACIÓN CLAVE: usando algoritmo optimizado
-                    similarity = self.compare_faces(features, stored_features)
-                    
-                    if similarity > best_similarity:
-                        best_similarity = similarity
-                        best_match_id = person_id
-                        best_match_name = person_name
-                        print(f"   🔥 Nueva mejor coincidencia: {person_name} (ID: {person_id}) - Similitud: {similarity:.3f}")
-            
-            print(f"🎯 Mejor coincidencia encontrada:")
-            print(f"   ID: {best_match_id}")
-            print(f"   Nombre: {best_match_name}")
-            print(f"   Similitud: {best_similarity:.3f}")
-            print(f"   Umbral requerido: {similarity_threshold}")
-            print(f"   Verificación: {best_similarity > similarity_threshold}")
+            best = candidates[0] if candidates else None
+            best_similarity = best['similarity'] if best else 0.0
+            
+            logger.debug(
+                "Identificación: mejor coincidencia %s (similitud %.3f, umbral %s) entre %s embeddings",
+                best['id'] if best else None, best_similarity, similarity_threshold, len(self.index)
+            )
             
             # ✅ UMBRAL CLAVE: 0.6 para alta precisión (evita falsos positivos)
             if best_similarity > similarity_threshold:
-                print(f"✅ IDENTIFICACIÓN EXITOSA - Similitud: {best_similarity:.3f}")
                 return {
                     'success': True,
                     'person_identified': {
-                        'id': best_match_id,
-                        'name': best_match_name
+                        'id': best['id'],
+                        'name': best['name']
                     },
-                    'similarity': float(best_similarity)
+                    'similarity': float(best_similarity),
+                    'candidates': candidates[:top_k]
                 }
             else:
-                print(f"❌ IDENTIFICACIÓN FALLIDA - Similitud insuficiente: {best_similarity:.3f} < {similarity_threshold}")
                 return {
                     'success': True,
                     'person_identified': None,
-                    'similarity': float(best_similarity)
+                    'similarity': float(best_similarity),
+                    'candidates': candidates[:top_k]
                 }
                 
         except Exception as e:
-            print(f"❌ Error en la identificación facial: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error en la identificación facial: %s", e)
             return {'success': False, 'error': str(e)}
     
     def delete_person_faces(self, person_id):
@@ -496,18 +577,17 @@ class FacialRecognition:
             Diccionario con resultado de la eliminación
         """
         try:
-            print(f"🗑️ Intentando eliminar datos faciales para persona: {person_id}")
+            logger.info("Eliminando datos faciales de la persona %s", person_id)
             
             # Buscar la carpeta de la persona
             person_folder = None
             for folder in os.listdir(self.face_dir):
                 if folder.startswith(str(person_id)):
                     person_folder = os.path.join(self.face_dir, folder)
-                    print(f"📁 Carpeta encontrada: {person_folder}")
                     break
             
             if not person_folder:
-                print(f"❌ No se encontró la carpeta para la persona {person_id}")
+                logger.warning("No se encontró la carpeta de la persona %s", person_id)
                 return {
                     'success': False,
                     'error': 'No se encontró la carpeta de rostros para esta persona'
@@ -516,9 +596,9 @@ class FacialRecognition:
             # Eliminar la carpeta y todo su contenido
             try:
                 shutil.rmtree(person_folder)
-                print(f"✅ Carpeta eliminada exitosamente: {person_folder}")
+                self.index.remove(os.path.basename(person_folder))
             except Exception as e:
-                print(f"❌ Error al eliminar carpeta: {e}")
+                logger.error("Error al eliminar carpeta %s: %s", person_folder, e)
                 return {
                     'success': False,
                     'error': f'Error al eliminar carpeta: {str(e)}'
@@ -530,7 +610,7 @@ class FacialRecognition:
             }
             
         except Exception as e:
-            print(f"❌ Error al eliminar datos faciales: {e}")
+            logger.error("Error al eliminar datos faciales: %s", e)
             return {
                 'success': False,
                 'error': str(e)
@@ -562,14 +642,13 @@ class FacialRecognition:
             
             # Contar archivos
             jpg_files = [f for f in os.listdir(person_folder) if f.endswith('.jpg') and not f.startswith('full_')]
-            npy_files = [f for f in os.listdir(person_folder) if f.endswith('.npy')]
             
             return {
                 'success': True,
                 'person_id': person_id,
                 'person_name': folder[len(str(person_id)):],
                 'total_faces': len(jpg_files),
-                'total_features': len(npy_files),
+                'total_features': count_person_embeddings(person_folder),
                 'folder_path': person_folder
             }
             
@@ -594,18 +673,16 @@ class FacialRecognition:
                     continue
                 
                 # Extraer ID y nombre
-                person_id = ''.join(filter(str.isdigit, folder.split('_')[0] if '_' in folder else folder))
-                person_name = folder[len(person_id):]
+                person_id, person_name = self._parse_folder_name(folder)
                 
                 # Contar archivos
                 jpg_files = [f for f in os.listdir(folder_path) if f.endswith('.jpg') and not f.startswith('full_')]
-                npy_files = [f for f in os.listdir(folder_path) if f.endswith('.npy')]
                 
                 persons.append({
                     'id': person_id,
                     'name': person_name,
                     'total_faces': len(jpg_files),
-                    'total_features': len(npy_files),
+                    'total_features': count_person_embeddings(folder_path),
                     'folder_path': folder_path
                 })
             
@@ -637,7 +714,7 @@ class FacialRecognition:
                     total_faces += len(jpg_files)
             return total_faces
         except Exception as e:
-            print(f"Error contando rostros: {e}")
+            logger.error("Error contando rostros: %s", e)
             return 0
     
     def clear_database(self):
@@ -648,11 +725,11 @@ class FacialRecognition:
             Diccionario con resultado de la limpieza
         """
         try:
-            print("🗑️ Eliminando toda la base de datos de rostros...")
+            logger.info("Eliminando toda la base de datos de rostros")
             if os.path.exists(self.face_dir):
                 shutil.rmtree(self.face_dir)
                 os.makedirs(self.face_dir)
-                print("✅ Base de datos limpiada correctamente")
+                self.index.clear()
                 return {
                     'success': True,
                     'message': 'Base de datos limpiada correctamente'
@@ -663,7 +740,7 @@ class FacialRecognition:
                     'error': 'La base de datos no existe'
                 }
         except Exception as e:
-            print(f"❌ Error limpiando base de datos: {e}")
+            logger.error("Error limpiando base de datos: %s", e)
             return {
                 'success': False,
                 'error': str(e)
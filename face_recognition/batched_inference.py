@@ -0,0 +1,117 @@
+"""
+Inferencia por lotes del modelo de embeddings faciales
+
+DeepFace.represent procesa una imagen por llamada (forward con lote de 1). Aquí
+se construye el modelo una sola vez con DeepFace.build_model, cada recorte se
+preprocesa igual que DeepFace (BGR→RGB, redimensionado conservando proporción
+con relleno, escala a [0, 1]) y los recortes se apilan en un solo tensor para
+ejecutar un forward por lote.
+"""
+
+import threading
+import cv2
+import numpy as np
+
+# Tamaño de entrada (alto, ancho) de los modelos soportados, por si la versión
+# de DeepFace no lo expone en el cliente del modelo
+MODEL_INPUT_SIZES = {
+    'Facenet': (160, 160),
+    'Facenet512': (160, 160),
+    'VGG-Face': (224, 224),
+    'ArcFace': (112, 112),
+}
+
+
+class BatchedEmbedder:
+    """Extrae embeddings de varios rostros con un forward por lote"""
+
+    def __init__(self, model_name='Facenet', batch_size=32):
+        """
+        Args:
+            model_name: Modelo de DeepFace a utilizar
+            batch_size: Máximo de rostros por forward
+        """
+        self.model_name = model_name
+        self.batch_size = max(1, int(batch_size))
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        """Construye (una sola vez) el cliente del modelo de DeepFace"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from deepface import DeepFace
+                    self._model = DeepFace.build_model(self.model_name)
+        return self._model
+
+    def input_size(self):
+        """Tamaño de entrada (alto, ancho) del modelo"""
+        model = self._get_model()
+        shape = getattr(model, 'input_shape', None)
+        if shape and len(shape) >= 2 and all(isinstance(v, int) for v in shape[-2:]):
+            return tuple(shape[:2]) if len(shape) == 2 else tuple(shape[-3:-1])
+        return MODEL_INPUT_SIZES.get(self.model_name, (160, 160))
+
+    @staticmethod
+    def preprocess(face_image, target_size):
+        """
+        Prepara un recorte BGR como entrada del modelo
+
+        Args:
+            face_image: Recorte del rostro (BGR, uint8)
+            target_size: Tamaño (alto, ancho) de entrada del modelo
+
+        Returns:
+            Arreglo (alto, ancho, 3) float32 en [0, 1]
+        """
+        img = np.ascontiguousarray(face_image[:, :, ::-1])
+        height, width = target_size
+        factor = min(height / img.shape[0], width / img.shape[1])
+        size = (max(1, int(img.shape[1] * factor)), max(1, int(img.shape[0] * factor)))
+        # Los recortes ya ajustados a la entrada (image_pipeline.fit_to_input) no se redimensionan
+        resized = img if size == (img.shape[1], img.shape[0]) else cv2.resize(img, size)
+        pad_h = height - resized.shape[0]
+        pad_w = width - resized.shape[1]
+        img = np.pad(
+            resized,
+            ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)),
+            'constant'
+        )
+        if img.shape[:2] != (height, width):
+            img = cv2.resize(img, (width, height))
+        img = img.astype(np.float32)
+        if img.max() > 1:
+            img /= 255.0
+        return img
+
+    def _forward(self, batch):
+        """Un solo forward del modelo para todo el lote"""
+        model = self._get_model()
+        keras_model = getattr(model, 'model', model)
+        output = keras_model(batch, training=False)
+        return np.asarray(output.numpy() if hasattr(output, 'numpy') else output, dtype=np.float32)
+
+    def embed(self, face_images):
+        """
+        Calcula los embeddings de una lista de recortes
+
+        Args:
+            face_images: Lista de recortes BGR (los None o vacíos se omiten)
+
+        Returns:
+            Lista del mismo largo con el embedding (lista de floats) o None
+        """
+        results = [None] * len(face_images)
+        valid = [i for i, face in enumerate(face_images) if face is not None and getattr(face, 'size', 0)]
+        if not valid:
+            return results
+
+        target_size = self.input_size()
+        for start in range(0, len(valid), self.batch_size):
+            chunk = valid[start:start + self.batch_size]
+            batch = np.stack([self.preprocess(face_images[i], target_size) for i in chunk])
+            embeddings = self._forward(batch)
+            for i, embedding in zip(chunk, embeddings):
+                results[i] = embedding.tolist()
+        return results
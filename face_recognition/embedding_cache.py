@@ -0,0 +1,150 @@
+"""
+Caché de resultados por contenido de imagen
+
+Los reintentos del kiosko suelen reenviar exactamente el mismo cuadro. La clave
+es un hash (BLAKE2b) de los bytes de la imagen decodificada; cada entrada guarda
+los rostros detectados (FACES) y el embedding del rostro (EMBEDDING). Ambos
+dependen solo del contenido del cuadro, así que verify_face e identify_person
+comparten la detección y el forward del modelo.
+
+La caché es LRU con expiración (TTL) y un tope de memoria aproximado.
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ENTRY_OVERHEAD = 256
+
+# Campos de cada entrada
+FACES = 'faces'
+EMBEDDING = 'embedding'
+
+
+def _size_of(value):
+    """Tamaño aproximado en bytes de un valor guardado"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_size_of(v) for v in value) + 8 * len(value)
+    if isinstance(value, dict):
+        return sum(_size_of(v) for v in value.values()) + 64 * len(value)
+    return sys.getsizeof(value)
+
+
+class EmbeddingCache:
+    """LRU + TTL con tope de memoria, seguro entre hilos"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=120.0):
+        """
+        Args:
+            max_bytes: Memoria máxima aproximada de la caché (0 = desactivada)
+            ttl: Segundos de vida de cada entrada
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(image):
+        """Hash del contenido de una imagen decodificada (incluye forma y tipo)"""
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{image.shape}{image.dtype}'.encode('ascii'))
+        digest.update(memoryview(image).cast('B'))
+        return digest.hexdigest()
+
+    def get(self, key, field):
+        """
+        Valor guardado para una imagen
+
+        Args:
+            key: Clave de key_for
+            field: Campo de la entrada (FACES, EMBEDDING, ...)
+
+        Returns:
+            El valor o None si no existe o expiró
+        """
+        if not self.enabled or key is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] <= now:
+                self._drop(key)
+                entry = None
+            if entry is None or field not in entry['values']:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['values'][field]
+
+    def put(self, key, field, value):
+        """Guarda un valor para una imagen y libera las entradas más antiguas si hace falta"""
+        if not self.enabled or key is None or value is None:
+            return
+        size = _size_of(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {'values': {}, 'size': ENTRY_OVERHEAD, 'expires': 0.0}
+                self._entries[key] = entry
+                self._bytes += ENTRY_OVERHEAD
+            else:
+                self._entries.move_to_end(key)
+            if field in entry['values']:
+                old_size = _size_of(entry['values'][field])
+                entry['size'] -= old_size
+                self._bytes -= old_size
+            entry['values'][field] = value
+            entry['size'] += size
+            entry['expires'] = time.monotonic() + self.ttl
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry['size']
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Contadores de la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+            }
+
+    def reset_stats(self):
+        """Reinicia los contadores (las entradas se conservan)"""
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
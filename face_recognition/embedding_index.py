@@ -0,0 +1,421 @@
+"""
+Índice en memoria de embeddings faciales para identificación 1:N
+
+Mantiene todos los embeddings registrados en una única matriz float32 contigua,
+pre-normalizada (L2), con un arreglo paralelo de etiquetas (nombre de carpeta de
+cada persona). La identificación se reduce a un producto matriz-vector y argmax.
+
+Con un almacén compartido (ver shared_embedding_store) la matriz se mapea en
+memoria y todos los workers leen las mismas páginas físicas. Cada worker revisa
+la generación publicada como máximo cada ``sync_interval`` segundos y compara la
+huella del directorio de rostros cada ``rescan_interval`` segundos: si la
+generación falta, es inconsistente o se armó con otro contenido de ``faces/``, se
+vuelve a leer el directorio y se publica una generación nueva.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+from embedding_store import load_person_embeddings
+from shared_embedding_store import SharedEmbeddingStore
+from ivf_index import IVFIndex, load_centroids, save_centroids, train_centroids
+
+logger = logging.getLogger('core.face_recognition')
+
+
+class EmbeddingIndex:
+    """Índice vectorizado de embeddings, construido una vez y actualizado de forma incremental"""
+
+    def __init__(self, face_dir=None, shared_dir=None, mode='exact', nprobe=8,
+                 ivf_min_size=2000, centroids_path=None, sync_interval=1.0, rescan_interval=30.0):
+        """
+        Args:
+            face_dir: Directorio con una carpeta por persona (se usa para la carga inicial)
+            shared_dir: Directorio del almacén compartido entre procesos; si se indica,
+                la matriz se mapea en memoria y los cambios se publican para los demás workers
+            mode: 'exact' (búsqueda exhaustiva) o 'ivf' (aproximada con listas invertidas)
+            nprobe: Listas IVF revisadas por búsqueda (más = mejor recall, más latencia)
+            ivf_min_size: Con menos embeddings que esto se usa siempre búsqueda exacta
+            centroids_path: Archivo de centroides IVF entrenados con rebuild_face_index
+            sync_interval: Segundos entre lecturas del contador de generación compartido
+            rescan_interval: Segundos entre comparaciones de la huella de ``face_dir``
+                con la de la generación mapeada
+        """
+        if mode not in ('exact', 'ivf'):
+            raise ValueError(f"Modo de índice desconocido: {mode}")
+        self.face_dir = face_dir
+        self.store = SharedEmbeddingStore(shared_dir) if shared_dir else None
+        self.mode = mode
+        self.nprobe = nprobe
+        self.ivf_min_size = ivf_min_size
+        self.centroids_path = centroids_path
+        self.sync_interval = sync_interval
+        self.rescan_interval = rescan_interval
+        self._generation = 0
+        self._synced_at = 0.0
+        self._rescan_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._loaded = False
+        # Estado inmutable: se reemplaza completo en cada mutación para que las
+        # búsquedas lean siempre una instantánea consistente sin bloquear
+        self._state = self._build_state(np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=str))
+
+    @staticmethod
+    def _normalize(matrix):
+        """Normaliza filas a norma L2 = 1 (las filas nulas quedan en cero)"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+    @staticmethod
+    def _build_state(matrix, labels):
+        """Precalcula la tabla de personas y los códigos por fila"""
+        if len(labels):
+            persons, codes = np.unique(labels, return_inverse=True)
+        else:
+            persons, codes = np.empty(0, dtype=str), np.empty(0, dtype=np.intp)
+        return {
+            'matrix': matrix,
+            'labels': labels,
+            'persons': persons,
+            'codes': codes.astype(np.intp, copy=False),
+        }
+
+    @staticmethod
+    def _read_person_folder(folder_path):
+        """Lee todos los embeddings de la carpeta de una persona"""
+        matrix, _ = load_person_embeddings(folder_path)
+        return list(matrix)
+
+    def _scan_folders(self):
+        """Lee todas las carpetas de personas y arma la matriz normalizada y sus etiquetas"""
+        matrices = []
+        labels = []
+        if self.face_dir and os.path.isdir(self.face_dir):
+            for folder in sorted(os.listdir(self.face_dir)):
+                folder_path = os.path.join(self.face_dir, folder)
+                if not os.path.isdir(folder_path):
+                    continue
+                rows = self._read_person_folder(folder_path)
+                if rows:
+                    matrices.append(rows)
+                    labels.extend([folder] * len(rows))
+
+        matrix = np.empty((0, 0), dtype=np.float32)
+        if matrices:
+            rows = [row for person_rows in matrices for row in person_rows]
+            dim = rows[0].shape[0]
+            keep = [i for i, row in enumerate(rows) if row.shape[0] == dim]
+            if len(keep) != len(rows):
+                logger.warning("Se omitieron %s embeddings con dimensión distinta a %s", len(rows) - len(keep), dim)
+            matrix = self._normalize(np.stack([rows[i] for i in keep]))
+            labels = [labels[i] for i in keep]
+        return matrix, np.asarray(labels, dtype=str)
+
+    def _fingerprint(self):
+        """
+        Huella del directorio de rostros: nombre y mtime de cada carpeta de persona
+
+        Guardar o borrar embeddings cambia el mtime de la carpeta, así que basta un
+        stat por persona (sin leer los archivos). None si no hay directorio.
+        """
+        if not self.face_dir or not os.path.isdir(self.face_dir):
+            return None
+        digest = hashlib.sha1()
+        with os.scandir(self.face_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir():
+                    digest.update(f'{entry.name}:{entry.stat().st_mtime_ns};'.encode('utf-8', 'surrogateescape'))
+        return digest.hexdigest()
+
+    def _publish_scan(self):
+        """Lee las carpetas y publica una generación nueva. Debe llamarse dentro de ``store.locked()``."""
+        # La huella se toma antes de leer: un cambio durante la lectura se detecta en la próxima revisión
+        fingerprint = self._fingerprint()
+        matrix, labels = self._scan_folders()
+        self._map_generation(self.store.publish(matrix, labels, fingerprint))
+
+    def _is_stale(self, generation):
+        """True si la generación se armó con otro contenido de ``face_dir``"""
+        fingerprint = self._fingerprint()
+        return fingerprint is not None and self.store.manifest(generation) != fingerprint
+
+    def _map_generation(self, generation=None):
+        """Reemplaza el estado por la generación mapeada del almacén compartido"""
+        opened = self.store.open(generation)
+        if opened is None:
+            return False
+        gen, matrix, labels = opened
+        if not matrix.size:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._state = self._build_state(matrix, labels)
+            self._generation = gen
+            self._loaded = True
+        return True
+
+    def load(self):
+        """Construye el índice completo leyendo el directorio de rostros"""
+        if self.store is not None:
+            with self.store.locked():
+                if not self._map_generation() or self._is_stale(self._generation):
+                    # Primer worker o almacén desactualizado: construir desde las
+                    # carpetas y publicar para el resto
+                    self._publish_scan()
+                self._synced_at = self._rescan_checked_at = time.monotonic()
+            logger.info("Índice de embeddings compartido (generación %s): %s embeddings, %s personas",
+                        self._generation, len(self), len(self._state['persons']))
+            return
+
+        matrix, labels = self._scan_folders()
+        with self._lock:
+            self._state = self._build_state(matrix, labels)
+            self._loaded = True
+        logger.info("Índice de embeddings construido: %s embeddings, %s personas", len(labels), len(self._state['persons']))
+
+    def load_arrays(self, matrix, labels):
+        """Carga el índice desde una matriz ya armada (benchmarks y datos sintéticos)"""
+        self._loaded = True
+        self._mutate(lambda state: (self._normalize(matrix), np.asarray(labels, dtype=str)))
+
+    def ensure_loaded(self):
+        """Carga el índice desde disco la primera vez que se necesita"""
+        if not self._loaded:
+            self.load()
+
+    def sync(self):
+        """
+        Vuelve a mapear el almacén compartido si otro worker publicó una generación
+        nueva y lo reconstruye si la generación falta o no coincide con ``face_dir``
+
+        El contador se lee como máximo cada ``sync_interval`` segundos y la huella del
+        directorio cada ``rescan_interval``; las búsquedas intermedias no tocan el disco.
+        """
+        if self.store is None or not self._loaded:
+            return
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        rescan = now - self._rescan_checked_at >= self.rescan_interval
+        if rescan:
+            self._rescan_checked_at = now
+
+        generation = self.store.current_generation()
+        mapped = generation == self._generation or self._map_generation()
+        if mapped and not (rescan and self._is_stale(self._generation)):
+            return
+
+        with self.store.locked():
+            # Otro worker pudo haber reconstruido mientras se esperaba el bloqueo
+            if self._map_generation() and not self._is_stale(self._generation):
+                return
+            logger.warning("Almacén de embeddings desactualizado (generación %s), reconstruyendo", self._generation)
+            self._publish_scan()
+
+    def _mutate(self, change):
+        """
+        Aplica un cambio al estado actual
+
+        Args:
+            change: Función que recibe el estado y devuelve (matriz, etiquetas) nuevas,
+                o None si no hay nada que cambiar
+        """
+        if self.store is None:
+            with self._lock:
+                result = change(self._state)
+                if result is not None:
+                    self._state = self._build_state(*result)
+            return
+
+        self.ensure_loaded()
+        with self.store.locked():
+            # Partir de la última generación para no pisar cambios de otros workers
+            if self.store.current_generation() != self._generation:
+                self._map_generation()
+            result = change(self._state)
+            if result is not None:
+                # Los archivos de la persona ya se guardaron: la huella actual describe esta generación
+                self._map_generation(self.store.publish(*result, self._fingerprint()))
+
+    def _prepare_rows(self, embeddings):
+        rows = [np.asarray(e, dtype=np.float32).ravel() for e in embeddings if e is not None]
+        return self._normalize(np.stack(rows)) if rows else None
+
+    @staticmethod
+    def _without(state, label):
+        keep = state['labels'] != str(label)
+        if keep.all():
+            return None
+        return np.ascontiguousarray(state['matrix'][keep]), state['labels'][keep]
+
+    @staticmethod
+    def _with(state, label, new_rows):
+        matrix = state['matrix']
+        if matrix.size and matrix.shape[1] != new_rows.shape[1]:
+            logger.warning("Dimensión %s incompatible con el índice (%s), embeddings omitidos", new_rows.shape[1], matrix.shape[1])
+            return None
+        matrix = np.concatenate([matrix, new_rows]) if matrix.size else new_rows
+        labels = np.concatenate([state['labels'], np.full(len(new_rows), str(label))])
+        return matrix, labels
+
+    def add(self, label, embeddings):
+        """
+        Agrega embeddings de una persona al índice
+
+        Args:
+            label: Etiqueta de la persona (nombre de su carpeta)
+            embeddings: Lista o matriz (N, D) de embeddings
+        """
+        if not self._loaded and self.store is None:
+            # La carga inicial leerá también los archivos recién guardados
+            return
+        new_rows = self._prepare_rows(embeddings)
+        if new_rows is None:
+            return
+        self._mutate(lambda state: self._with(state, label, new_rows))
+
+    def remove(self, label):
+        """Elimina todos los embeddings de una persona"""
+        if not self._loaded and self.store is None:
+            return
+        self._mutate(lambda state: self._without(state, label))
+
+    def replace(self, label, embeddings):
+        """Reemplaza los embeddings de una persona (re-registro) en un solo cambio"""
+        if not self._loaded and self.store is None:
+            return
+        new_rows = self._prepare_rows(embeddings)
+
+        def change(state):
+            removed = self._without(state, label)
+            if removed is not None:
+                state = self._build_state(*removed)
+            if new_rows is None:
+                return removed
+            return self._with(state, label, new_rows) or removed
+
+        self._mutate(change)
+
+    def clear(self):
+        """Vacía el índice"""
+        self._loaded = True
+        self._mutate(lambda state: (np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=str)))
+
+    def __len__(self):
+        return len(self._state['labels'])
+
+    def _ivf_for(self, state):
+        """Listas invertidas del estado actual (se construyen la primera vez que se piden)"""
+        matrix = state['matrix']
+        if len(matrix) < max(1, self.ivf_min_size):
+            return None
+        ivf = state.get('ivf')
+        if ivf is not None:
+            return ivf
+
+        centroids = load_centroids(self.centroids_path) if self.centroids_path else None
+        if centroids is None or centroids.shape[1] != matrix.shape[1]:
+            logger.warning("Centroides IVF no disponibles, entrenando en memoria (ejecute rebuild_face_index)")
+            centroids = train_centroids(matrix, iterations=5)
+        ivf = IVFIndex(centroids, matrix)
+        state['ivf'] = ivf
+        return ivf
+
+    def rebuild_ivf(self, nlist=None, iterations=10):
+        """
+        Re-entrena los centroides IVF con los embeddings actuales y los guarda
+
+        Args:
+            nlist: Número de listas (por defecto ~4·√N)
+            iterations: Iteraciones de k-means
+
+        Returns:
+            Diccionario con estadísticas del índice reconstruido
+        """
+        self.ensure_loaded()
+        self.sync()
+        state = self._state
+        matrix = state['matrix']
+        centroids = train_centroids(matrix, nlist=nlist, iterations=iterations)
+        if self.centroids_path:
+            save_centroids(self.centroids_path, centroids)
+
+        ivf = IVFIndex(centroids, matrix)
+        sizes = np.diff(ivf.offsets)
+        if self.store is not None:
+            # Publicar una generación nueva para que los demás workers recarguen los centroides
+            with self.store.locked():
+                self._map_generation()
+                self._map_generation(self.store.publish(
+                    self._state['matrix'], self._state['labels'], self.store.manifest(self._generation)
+                ))
+        else:
+            with self._lock:
+                if self._state is state:
+                    state['ivf'] = ivf
+        return {
+            'embeddings': int(len(matrix)),
+            'nlist': int(ivf.nlist),
+            'largest_list': int(sizes.max()) if len(sizes) else 0,
+            'empty_lists': int((sizes == 0).sum()),
+        }
+
+    def search(self, features, top_k=1, mode=None, nprobe=None):
+        """
+        Busca las personas más similares a un embedding
+
+        Args:
+            features: Embedding de consulta
+            top_k: Número de candidatos (personas distintas) a devolver
+            mode: Fuerza 'exact' o 'ivf' (por defecto el modo configurado)
+            nprobe: Listas IVF a revisar (por defecto el valor configurado)
+
+        Returns:
+            Lista de tuplas (etiqueta, similitud) ordenada de mayor a menor similitud,
+            con la similitud en [0, 1] igual que compare_faces
+        """
+        self.ensure_loaded()
+        self.sync()
+        state = self._state
+        matrix = state['matrix']
+        if not matrix.size:
+            return []
+
+        query = self._normalize(features)[0]
+        if query.shape[0] != matrix.shape[1]:
+            raise ValueError(f"Dimensión del embedding ({query.shape[0]}) distinta a la del índice ({matrix.shape[1]})")
+
+        ivf = self._ivf_for(state) if (mode or self.mode) == 'ivf' else None
+        if ivf is not None:
+            # Re-ranking exacto: las filas de las listas revisadas se puntúan con los vectores completos
+            rows = ivf.candidates(query, nprobe or self.nprobe)
+            if not len(rows):
+                return []
+            scores = np.asarray(matrix[rows]) @ query
+            codes = state['codes'][rows]
+        else:
+            rows = None
+            scores = matrix @ query
+            codes = state['codes']
+
+        persons = state['persons']
+        if top_k <= 1:
+            best = int(np.argmax(scores))
+            best_row = int(rows[best]) if rows is not None else best
+            return [(str(state['labels'][best_row]), float((scores[best] + 1) / 2))]
+
+        # Mejor puntaje por persona y luego los k mejores
+        best = np.full(len(persons), -np.inf, dtype=np.float32)
+        np.maximum.at(best, codes, scores)
+        k = min(top_k, int(np.isfinite(best).sum()))
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top])]
+        return [(str(persons[i]), float((best[i] + 1) / 2)) for i in top]
@@ -0,0 +1,212 @@
+"""
+Almacenamiento empaquetado de embeddings por persona
+
+Cada carpeta de persona guarda un único archivo ``embeddings.npz`` con la matriz
+(N, D) float32 de embeddings, el conjunto compacto para verificación 1:1
+(centroide + medoides, ver template_compaction) y una pequeña cabecera (modelo,
+dimensión, fecha de creación). El archivo se escribe de forma atómica (archivo temporal + os.replace)
+y se lee con una sola apertura. Los archivos ``.npy`` sueltos del formato anterior
+se siguen leyendo mientras no se hayan convertido.
+"""
+
+import logging
+import os
+import time
+import tempfile
+import numpy as np
+
+from template_compaction import compact_templates
+
+logger = logging.getLogger('core.face_recognition')
+
+PACKED_FILENAME = 'embeddings.npz'
+FORMAT_VERSION = 2
+DEFAULT_MEDOIDS = 4
+
+# Modelo probable según la dimensión, para convertir archivos antiguos sin cabecera
+MODEL_BY_DIMENSION = {
+    128: 'Facenet',
+    512: 'Facenet512',
+    4096: 'VGG-Face',
+}
+
+
+def packed_path(folder):
+    """Ruta del archivo empaquetado de una persona"""
+    return os.path.join(folder, PACKED_FILENAME)
+
+
+def _legacy_files(folder):
+    """Archivos .npy sueltos (formato anterior) ordenados por nombre"""
+    return sorted(f for f in os.listdir(folder) if f.endswith('.npy'))
+
+
+def _as_matrix(embeddings):
+    """Convierte una lista de embeddings en una matriz (N, D) float32"""
+    rows = [np.asarray(e, dtype=np.float32).ravel() for e in embeddings if e is not None]
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.stack(rows), dtype=np.float32)
+
+
+def save_person_embeddings(folder, embeddings, model_name, medoids=DEFAULT_MEDOIDS):
+    """
+    Escribe de forma atómica el archivo empaquetado de una persona
+
+    Args:
+        folder: Carpeta de la persona
+        embeddings: Lista o matriz (N, D) de embeddings
+        model_name: Modelo con el que se generaron los embeddings
+        medoids: Medoides del conjunto compacto para verificación
+
+    Returns:
+        Número de embeddings guardados
+    """
+    matrix = _as_matrix(embeddings)
+    compact = compact_templates(matrix, medoids=medoids)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.embeddings-', suffix='.npz.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            np.savez(
+                tmp_file,
+                embeddings=matrix,
+                compact=compact,
+                model_name=np.array(model_name or ''),
+                dim=np.array(matrix.shape[1] if matrix.size else 0),
+                created_at=np.array(time.time()),
+                version=np.array(FORMAT_VERSION),
+            )
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, packed_path(folder))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(matrix)
+
+
+def load_person_embeddings(folder):
+    """
+    Lee los embeddings de una persona
+
+    Args:
+        folder: Carpeta de la persona
+
+    Returns:
+        Tupla (matriz (N, D) float32, cabecera dict). Si la carpeta aún usa el
+        formato anterior, la cabecera indica 'legacy': True.
+    """
+    try:
+        with np.load(packed_path(folder), allow_pickle=False) as data:
+            matrix = data['embeddings'].astype(np.float32, copy=False)
+            header = {
+                'model_name': str(data['model_name']),
+                'dim': int(data['dim']),
+                'created_at': float(data['created_at']),
+                'version': int(data['version']),
+                'compact': 'compact' in data.files,
+                'legacy': False,
+            }
+            return matrix, header
+    except FileNotFoundError:
+        pass
+
+    if not os.path.isdir(folder):
+        return np.empty((0, 0), dtype=np.float32), {'legacy': True, 'dim': 0}
+
+    rows = []
+    for file_name in _legacy_files(folder):
+        try:
+            rows.append(np.load(os.path.join(folder, file_name)))
+        except Exception as e:
+            logger.warning("Embedding ilegible %s: %s", file_name, e)
+    matrix = _as_matrix(rows)
+    return matrix, {'legacy': True, 'dim': matrix.shape[1] if matrix.size else 0}
+
+
+def load_compact_templates(folder):
+    """
+    Lee solo el conjunto compacto (centroide + medoides) de una persona
+
+    Returns:
+        Matriz (M, D) float32 o None si la carpeta no tiene conjunto compacto
+    """
+    try:
+        with np.load(packed_path(folder), allow_pickle=False) as data:
+            if 'compact' not in data.files:
+                return None
+            return data['compact'].astype(np.float32, copy=False)
+    except FileNotFoundError:
+        return None
+
+
+def append_person_embeddings(folder, embeddings, model_name, medoids=DEFAULT_MEDOIDS):
+    """Agrega embeddings a los existentes de una persona y reescribe el archivo empaquetado"""
+    existing, _ = load_person_embeddings(folder)
+    new_rows = _as_matrix(embeddings)
+    if existing.size and new_rows.size and existing.shape[1] != new_rows.shape[1]:
+        raise ValueError(f"Dimensión {new_rows.shape[1]} incompatible con los embeddings existentes ({existing.shape[1]})")
+    parts = [m for m in (existing, new_rows) if m.size]
+    total = save_person_embeddings(folder, np.concatenate(parts) if parts else new_rows, model_name, medoids)
+    remove_legacy_files(folder)
+    return total
+
+
+def count_person_embeddings(folder):
+    """Número de embeddings guardados para una persona (sin cargar la matriz completa)"""
+    path = packed_path(folder)
+    if os.path.exists(path):
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return int(data['embeddings'].shape[0])
+        except Exception as e:
+            logger.warning("Archivo empaquetado ilegible %s: %s", path, e)
+            return 0
+    if not os.path.isdir(folder):
+        return 0
+    return len(_legacy_files(folder))
+
+
+def remove_legacy_files(folder):
+    """Elimina los .npy sueltos del formato anterior"""
+    for file_name in _legacy_files(folder):
+        os.remove(os.path.join(folder, file_name))
+
+
+def pack_person_folder(folder, model_name=None, remove_legacy=True, medoids=DEFAULT_MEDOIDS):
+    """
+    Convierte la carpeta de una persona al formato empaquetado
+
+    Args:
+        folder: Carpeta de la persona
+        model_name: Modelo de los embeddings (si no se indica se infiere por la dimensión)
+        remove_legacy: Eliminar los .npy sueltos después de convertir
+        medoids: Medoides del conjunto compacto para verificación
+
+    Returns:
+        Número de embeddings empaquetados (0 si no había nada que convertir)
+    """
+    legacy = _legacy_files(folder)
+    matrix, header = load_person_embeddings(folder)
+    if not legacy:
+        if header.get('legacy') or header.get('compact') or not matrix.size:
+            return 0
+        # Archivo empaquetado anterior al conjunto compacto: reescribirlo
+        return save_person_embeddings(folder, matrix, header.get('model_name') or model_name, medoids)
+
+    if not header.get('legacy'):
+        # Ya existe un archivo empaquetado: incorporar los .npy que quedaron sueltos
+        legacy_matrix = _as_matrix([np.load(os.path.join(folder, f)) for f in legacy])
+        matrix = np.concatenate([m for m in (matrix, legacy_matrix) if m.size])
+        model_name = model_name or header.get('model_name')
+
+    if model_name is None:
+        model_name = MODEL_BY_DIMENSION.get(matrix.shape[1], '')
+
+    total = save_person_embeddings(folder, matrix, model_name, medoids)
+    if remove_legacy:
+        for file_name in legacy:
+            os.remove(os.path.join(folder, file_name))
+    return total
@@ -0,0 +1,315 @@
+"""
+Detección de rostros por niveles con presupuesto de tiempo
+
+Cada nivel (Haar, RetinaFace) trabaja sobre una copia reducida del cuadro y
+devuelve las cajas en las coordenadas de la imagen original. Los detectores se
+crean una sola vez por hilo (cv2.CascadeClassifier no es seguro entre hilos) y no
+en cada llamada.
+
+FaceDetector recorre la cadena de niveles hasta que uno encuentra rostros. Un nivel
+solo se intenta si su duración típica (media móvil de sus ejecuciones) cabe en lo
+que queda del presupuesto de la solicitud, de modo que el peor caso queda acotado:
+si Haar no encuentra nada y RetinaFace no alcanza, se responde sin rostros y el
+servicio facial rechaza la foto ('no_face', ver FaceQualityGate).
+
+La primera ejecución de cada hilo (inicialización del modelo) no entra en la media,
+y un nivel saltado ``probe_every`` veces seguidas se vuelve a medir aunque no quepa,
+así una estimación inflada no lo deja fuera para siempre.
+"""
+
+import logging
+import threading
+import time
+
+import cv2
+
+from image_pipeline import fit_within
+from stage_timing import annotate
+
+logger = logging.getLogger('core.face_recognition')
+
+HAAR_CASCADE = 'haarcascade_frontalface_default.xml'
+
+
+class DetectorTier:
+    """Nivel de la cadena de detección"""
+    name = 'base'
+
+    def __init__(self, max_side=480, expected_ms=None):
+        """
+        Args:
+            max_side: Lado mayor de la imagen sobre la que se detecta (0 = original)
+            expected_ms: Duración estimada antes de tener mediciones propias
+        """
+        self.max_side = max_side
+        self.expected_ms = expected_ms or 0.0
+        self._local = threading.local()
+    
+    def is_cold(self):
+        """True si el nivel todavía no detectó nada en el hilo actual"""
+        return not getattr(self._local, 'warm', False)
+
+    def _instance(self):
+        """Detector del hilo actual (se construye en la primera llamada del hilo)"""
+        detector = getattr(self._local, 'detector', None)
+        if detector is None:
+            detector = self._build()
+            self._local.detector = detector
+        return detector
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _detect(self, detector, image):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Construye el detector del hilo actual"""
+        self._instance()
+
+    def detect(self, image):
+        """
+        Detecta rostros en una copia reducida y escala las cajas al original
+
+        Returns:
+            Lista de diccionarios con 'x', 'y', 'width', 'height'
+        """
+        small = fit_within(image, self.max_side)
+        scale = image.shape[1] / small.shape[1]
+        faces = []
+        for x, y, w, h in self._detect(self._instance(), small):
+            faces.append({
+                'x': int(round(x * scale)),
+                'y': int(round(y * scale)),
+                'width': int(round(w * scale)),
+                'height': int(round(h * scale)),
+            })
+        self._local.warm = True
+        return faces
+
+
+class HaarTier(DetectorTier):
+    """OpenCV Haar Cascade: rápido, pensado para rostros frontales del kiosko"""
+    name = 'haar'
+
+    def __init__(self, max_side=480, scale_factor=1.1, min_neighbors=4, expected_ms=15.0):
+        super().__init__(max_side=max_side, expected_ms=expected_ms)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def _build(self):
+        detector = cv2.CascadeClassifier(cv2.data.haarcascades + HAAR_CASCADE)
+        if detector.empty():
+            raise RuntimeError(f'No se pudo cargar {HAAR_CASCADE}')
+        return detector
+
+    def _detect(self, detector, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return detector.detectMultiScale(gray, self.scale_factor, self.min_neighbors)
+
+
+class RetinaFaceTier(DetectorTier):
+    """RetinaFace vía DeepFace: más preciso y bastante más lento"""
+    name = 'retinaface'
+
+    def __init__(self, max_side=640, expected_ms=400.0):
+        super().__init__(max_side=max_side, expected_ms=expected_ms)
+
+    def _build(self):
+        from deepface import DeepFace
+        # Carga los pesos aquí (una vez por proceso) y no en la primera detección
+        try:
+            from deepface.detectors import FaceDetector as DeepFaceDetector
+            DeepFaceDetector.build_model('retinaface')
+        except Exception as e:
+            logger.warning("No se pudieron precargar los pesos de RetinaFace: %s", e)
+        return DeepFace
+
+    def _detect(self, detector, image):
+        faces = detector.extract_faces(image, detector_backend='retinaface', align=False, enforce_detection=False)
+        boxes = []
+        height, width = image.shape[:2]
+        for face in faces:
+            area = face['facial_area']
+            # Con enforce_detection=False DeepFace devuelve la imagen completa si no encuentra nada
+            if face.get('confidence', 1) == 0 and area['w'] >= width and area['h'] >= height:
+                continue
+            boxes.append((area['x'], area['y'], area['w'], area['h']))
+        return boxes
+
+
+class RemoteRetinaFaceTier(DetectorTier):
+    """RetinaFace ejecutado por el servidor de inferencia (el worker no carga TensorFlow)"""
+    name = 'retinaface'
+
+    def __init__(self, inference_client, max_side=640, expected_ms=400.0):
+        super().__init__(max_side=max_side, expected_ms=expected_ms)
+        self.inference_client = inference_client
+
+    def _build(self):
+        return self.inference_client
+
+    def _detect(self, detector, image):
+        return [(face['x'], face['y'], face['width'], face['height']) for face in detector.detect(image)]
+
+
+TIERS = {
+    'haar': HaarTier,
+    'retinaface': RetinaFaceTier,
+}
+
+
+class FaceDetector:
+    """Cadena de niveles de detección con presupuesto por solicitud y estadísticas"""
+
+    def __init__(self, tiers=('haar', 'retinaface'), budget_ms=800.0, haar_max_side=480, retinaface_max_side=640,
+                 probe_every=20, inference_client=None):
+        """
+        Args:
+            tiers: Nombres de los niveles en orden (ver TIERS) o instancias de DetectorTier
+            budget_ms: Tiempo máximo por solicitud (0 = sin límite)
+            haar_max_side: Lado mayor de la imagen para Haar
+            retinaface_max_side: Lado mayor de la imagen para RetinaFace
+            probe_every: Saltos seguidos por presupuesto tras los que el nivel se
+                ejecuta igualmente para medirlo de nuevo (0 = nunca)
+            inference_client: Cliente del servidor de inferencia; si se indica,
+                RetinaFace corre en ese proceso (RemoteRetinaFaceTier)
+        """
+        sizes = {'haar': haar_max_side, 'retinaface': retinaface_max_side}
+        self.tiers = []
+        for tier in tiers:
+            if isinstance(tier, str):
+                tier = tier.strip().lower()
+                if tier not in TIERS:
+                    raise ValueError(f'Nivel de detección desconocido: {tier}')
+                if tier == 'retinaface' and inference_client is not None:
+                    tier = RemoteRetinaFaceTier(inference_client, max_side=sizes[tier])
+                else:
+                    tier = TIERS[tier](max_side=sizes[tier])
+            self.tiers.append(tier)
+        self.budget = max(0.0, budget_ms) / 1000.0
+        self.probe_every = max(0, int(probe_every))
+        self._lock = threading.Lock()
+        self._estimates = {tier.name: tier.expected_ms / 1000.0 for tier in self.tiers}
+        self._skip_streak = {tier.name: 0 for tier in self.tiers}
+        self._stats = self._empty_stats()
+
+    def _empty_stats(self):
+        return {
+            'requests': 0,
+            'answered_by': {tier.name: 0 for tier in self.tiers},
+            'no_face': 0,
+            'skipped_by_budget': {tier.name: 0 for tier in self.tiers},
+            'probes': {tier.name: 0 for tier in self.tiers},
+            'errors': {tier.name: 0 for tier in self.tiers},
+            'tier_ms': {tier.name: 0.0 for tier in self.tiers},
+        }
+
+    def warm_up(self):
+        """Construye los detectores del hilo actual (los que se puedan cargar)"""
+        for tier in self.tiers:
+            try:
+                tier.warm_up()
+            except Exception as e:
+                logger.warning("No se pudo precargar el detector %s: %s", tier.name, e)
+
+    def _should_run(self, tier, remaining):
+        """
+        Decide si un nivel cabe en lo que queda del presupuesto
+
+        Returns:
+            Tupla (ejecutar, es una medición de prueba)
+        """
+        if remaining <= 0:
+            return False, False
+        with self._lock:
+            if self._estimates[tier.name] <= remaining:
+                self._skip_streak[tier.name] = 0
+                return True, False
+            self._skip_streak[tier.name] += 1
+            if self.probe_every and self._skip_streak[tier.name] >= self.probe_every:
+                self._skip_streak[tier.name] = 0
+                return True, True
+        return False, False
+    
+    def _record(self, tier, elapsed, cold=False, probe=False):
+        with self._lock:
+            self._stats['tier_ms'][tier.name] += elapsed * 1000.0
+            if cold:
+                # La primera ejecución del hilo incluye la inicialización del modelo
+                return
+            if probe:
+                # Tras muchos saltos la media vieja no sirve: se toma la medición nueva
+                self._estimates[tier.name] = elapsed
+            else:
+                # Media móvil de la duración del nivel para decidir si cabe en el presupuesto
+                self._estimates[tier.name] = 0.8 * self._estimates[tier.name] + 0.2 * elapsed
+
+    def detect(self, image):
+        """
+        Detecta rostros recorriendo la cadena de niveles
+
+        Args:
+            image: Imagen BGR
+
+        Returns:
+            Tupla (lista de rostros, nombre del nivel que respondió o None)
+        """
+        started = time.perf_counter()
+        answered = None
+        faces = []
+        skipped = []
+        probes = []
+        errors = []
+        for tier in self.tiers:
+            probe = False
+            if self.budget:
+                run, probe = self._should_run(tier, self.budget - (time.perf_counter() - started))
+                if not run:
+                    skipped.append(tier.name)
+                    continue
+                if probe:
+                    probes.append(tier.name)
+            cold = tier.is_cold()
+            tier_started = time.perf_counter()
+            try:
+                faces = tier.detect(image)
+            except Exception as e:
+                logger.warning("Error en detector %s: %s", tier.name, e)
+                errors.append(tier.name)
+                faces = []
+            self._record(tier, time.perf_counter() - tier_started, cold=cold, probe=probe)
+            if faces:
+                answered = tier.name
+                break
+
+        with self._lock:
+            self._stats['requests'] += 1
+            if answered:
+                self._stats['answered_by'][answered] += 1
+            else:
+                self._stats['no_face'] += 1
+            for name in skipped:
+                self._stats['skipped_by_budget'][name] += 1
+            for name in probes:
+                self._stats['probes'][name] += 1
+            for name in errors:
+                self._stats['errors'][name] += 1
+        annotate(tier=answered or 'none')
+        return faces, answered
+
+    def stats(self):
+        """Estadísticas acumuladas: qué nivel respondió, saltos por presupuesto y tiempos"""
+        with self._lock:
+            stats = {
+                key: dict(value) if isinstance(value, dict) else value
+                for key, value in self._stats.items()
+            }
+            stats['tier_ms'] = {name: round(ms, 3) for name, ms in stats['tier_ms'].items()}
+            stats['estimated_ms'] = {name: round(value * 1000.0, 3) for name, value in self._estimates.items()}
+            stats['budget_ms'] = self.budget * 1000.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = self._empty_stats()
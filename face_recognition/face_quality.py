@@ -0,0 +1,114 @@
+"""
+Control de calidad del rostro antes de calcular el embedding
+
+Entre la detección y el modelo se descartan los cuadros que no sirven (borrosos,
+oscuros, sobreexpuestos, sin contraste o con el rostro muy pequeño) con medidas
+baratas de OpenCV/numpy sobre el recorte. Así el registro no gasta inferencia ni
+disco en fotos inútiles y el kiosko responde de inmediato con el motivo.
+
+Las medidas de nitidez y exposición se calculan sobre el recorte en gris llevado a
+un tamaño fijo, de modo que no dependen de la resolución con que llegó la foto.
+"""
+
+import cv2
+import numpy as np
+
+# Lado del recorte en gris sobre el que se miden nitidez y exposición
+ANALYSIS_SIDE = 128
+
+REASONS = {
+    'no_face': 'No se detectó un rostro; mire de frente a la cámara',
+    'too_small': 'Rostro muy pequeño; acérquese a la cámara',
+    'too_blurry': 'Imagen borrosa; mantenga la cámara quieta',
+    'too_dark': 'Imagen muy oscura; busque más iluminación',
+    'too_bright': 'Imagen sobreexpuesta; evite la luz directa',
+    'low_contrast': 'Imagen sin contraste; revise la iluminación',
+}
+
+
+class FaceQualityGate:
+    """Evalúa un recorte de rostro y lo rechaza con un código de motivo"""
+
+    def __init__(self, min_face_px=60, min_sharpness=40.0, min_brightness=40.0, max_brightness=215.0,
+                 max_clipped=0.4, min_contrast=12.0):
+        """
+        Args:
+            min_face_px: Lado menor mínimo del recorte en píxeles
+            min_sharpness: Varianza mínima del Laplaciano (nitidez)
+            min_brightness: Brillo medio mínimo (0-255)
+            max_brightness: Brillo medio máximo (0-255)
+            max_clipped: Fracción máxima de píxeles casi negros o casi blancos
+            min_contrast: Desviación estándar mínima del brillo
+        """
+        self.min_face_px = min_face_px
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.min_contrast = min_contrast
+
+    @staticmethod
+    def rejection(reason):
+        """Resultado de rechazo sin medidas (p. ej. 'no_face' cuando no hubo detección)"""
+        return {'ok': False, 'reason': reason, 'message': REASONS[reason], 'metrics': {}}
+
+    @staticmethod
+    def measure(face_image):
+        """
+        Medidas de calidad de un recorte BGR
+
+        Returns:
+            dict con face_px, sharpness, brightness, contrast, dark_fraction y bright_fraction
+        """
+        gray = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY) if face_image.ndim == 3 else face_image
+        face_px = int(min(gray.shape[:2]))
+        gray = cv2.resize(gray, (ANALYSIS_SIDE, ANALYSIS_SIDE), interpolation=cv2.INTER_AREA)
+
+        histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+        histogram /= histogram.sum()
+        levels = np.arange(256)
+        brightness = float(histogram @ levels)
+        contrast = float(np.sqrt(histogram @ (levels - brightness) ** 2))
+
+        return {
+            'face_px': face_px,
+            'sharpness': float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+            'brightness': brightness,
+            'contrast': contrast,
+            'dark_fraction': float(histogram[:16].sum()),
+            'bright_fraction': float(histogram[240:].sum()),
+        }
+
+    def check(self, face_image):
+        """
+        Evalúa un recorte de rostro
+
+        Args:
+            face_image: Recorte BGR tal como sale de la detección (antes de redimensionar);
+                None si no se detectó rostro, vacío si el rostro era demasiado pequeño
+
+        Returns:
+            dict con 'ok', 'reason' (código o None), 'message' y 'metrics'
+        """
+        if face_image is None or not face_image.size:
+            return self.rejection('no_face' if face_image is None else 'too_small')
+
+        metrics = self.measure(face_image)
+        reason = None
+        if metrics['face_px'] < self.min_face_px:
+            reason = 'too_small'
+        elif metrics['brightness'] < self.min_brightness or metrics['dark_fraction'] > self.max_clipped:
+            reason = 'too_dark'
+        elif metrics['brightness'] > self.max_brightness or metrics['bright_fraction'] > self.max_clipped:
+            reason = 'too_bright'
+        elif metrics['contrast'] < self.min_contrast:
+            reason = 'low_contrast'
+        elif metrics['sharpness'] < self.min_sharpness:
+            reason = 'too_blurry'
+
+        return {
+            'ok': reason is None,
+            'reason': reason,
+            'message': REASONS[reason] if reason else 'Calidad adecuada',
+            'metrics': {key: round(value, 3) for key, value in metrics.items()},
+        }
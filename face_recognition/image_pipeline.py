@@ -0,0 +1,185 @@
+"""
+Decodificación de imágenes para los endpoints faciales
+
+Un solo camino para pasar de los bytes recibidos (JPEG/PNG) al cuadro BGR que usa
+el detector y al recorte que recibe el modelo de embeddings:
+
+- Los JPEG más grandes de lo que necesita el detector se decodifican a 1/2, 1/4 u
+  1/8 de resolución directamente en el decodificador (IMREAD_REDUCED_COLOR_*), sin
+  materializar el cuadro completo; el resto se ajusta con INTER_AREA.
+- cv2.imdecode trabaja sobre el buffer recibido; PIL solo se usa para formatos que
+  OpenCV no reconoce.
+- Los recortes del rostro se llevan directamente al tamaño de entrada del modelo y
+  se copian, de modo que el cuadro decodificado se libera de inmediato.
+"""
+
+from io import BytesIO
+
+import cv2
+import numpy as np
+
+# Lado mayor con el que trabaja el detector (Haar / RetinaFace)
+DEFAULT_MAX_SIDE = 640
+
+# Marcadores SOF (inicio de cuadro) que traen alto y ancho de la imagen
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def _as_buffer(data):
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1).view(np.uint8)
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def jpeg_dimensions(data):
+    """
+    Lee ancho y alto de la cabecera de un JPEG sin decodificarlo
+
+    Args:
+        data: Bytes o arreglo uint8 con el archivo
+
+    Returns:
+        Tupla (ancho, alto) o None si no es un JPEG válido
+    """
+    buffer = _as_buffer(data)
+    size = len(buffer)
+    if size < 4 or buffer[0] != 0xFF or buffer[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 9 < size:
+        if buffer[i] != 0xFF:
+            return None
+        marker = int(buffer[i + 1])
+        if marker == 0xFF:
+            # Bytes de relleno entre segmentos
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        if marker in _SOF_MARKERS:
+            height = (int(buffer[i + 5]) << 8) | int(buffer[i + 6])
+            width = (int(buffer[i + 7]) << 8) | int(buffer[i + 8])
+            return (width, height) if width and height else None
+        if marker == 0xDA:
+            # Inicio de los datos comprimidos sin haber visto un SOF
+            return None
+        i += 2 + ((int(buffer[i + 2]) << 8) | int(buffer[i + 3]))
+    return None
+
+
+def decode_flag(width, height, max_side):
+    """Bandera de imdecode con la mayor reducción que deja el lado mayor >= max_side"""
+    if max_side:
+        longest = max(width, height)
+        for factor, flag in _REDUCED_FLAGS:
+            if longest // factor >= max_side:
+                return flag
+    return cv2.IMREAD_COLOR
+
+
+def fit_within(image, max_side):
+    """Reduce la imagen (solo hacia abajo) para que su lado mayor sea max_side"""
+    if not max_side or image is None:
+        return image
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if longest <= max_side:
+        return image
+    scale = max_side / longest
+    return cv2.resize(
+        image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+    )
+
+
+def _decode_with_pil(buffer, max_side):
+    from PIL import Image
+
+    pil_image = Image.open(BytesIO(buffer.tobytes()))
+    if max_side:
+        pil_image.draft('RGB', (max_side, max_side))
+    rgb = np.asarray(pil_image.convert('RGB'))
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+def decode_image(data, max_side=DEFAULT_MAX_SIDE):
+    """
+    Decodifica una imagen a BGR con el lado mayor limitado a max_side
+
+    Args:
+        data: Bytes o arreglo uint8 con el archivo (JPEG, PNG, ...)
+        max_side: Lado mayor del cuadro resultante (0 = resolución original)
+
+    Returns:
+        numpy.ndarray BGR uint8 o None si los bytes no son una imagen
+    """
+    buffer = _as_buffer(data)
+    if not buffer.size:
+        return None
+
+    flag = cv2.IMREAD_COLOR
+    dimensions = jpeg_dimensions(buffer)
+    if dimensions:
+        flag = decode_flag(*dimensions, max_side)
+
+    image = cv2.imdecode(buffer, flag)
+    if image is None:
+        try:
+            image = _decode_with_pil(buffer, max_side)
+        except Exception:
+            return None
+    return fit_within(image, max_side)
+
+
+def crop_face(image, face, margin=0.2, min_size=20):
+    """
+    Recorta un rostro detectado con un margen alrededor
+
+    Args:
+        image: Cuadro BGR
+        face: Diccionario con 'x', 'y', 'width', 'height' (como detect_faces)
+        margin: Margen relativo al lado menor del rostro
+        min_size: Tamaño mínimo del rostro en píxeles
+
+    Returns:
+        Vista del recorte o None si el rostro es muy pequeño o la región es inválida
+    """
+    x, y, w, h = face['x'], face['y'], face['width'], face['height']
+    if w < min_size or h < min_size:
+        return None
+    pad = int(min(w, h) * margin)
+    x1, y1 = max(0, x - pad), max(0, y - pad)
+    x2, y2 = min(image.shape[1], x + w + pad), min(image.shape[0], y + h + pad)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    region = image[y1:y2, x1:x2]
+    return region if region.size else None
+
+
+def fit_to_input(face_image, target_size):
+    """
+    Lleva un recorte al tamaño de entrada del modelo conservando la proporción
+
+    Args:
+        face_image: Recorte BGR (puede ser una vista del cuadro completo)
+        target_size: Tamaño (alto, ancho) de entrada del modelo
+
+    Returns:
+        Arreglo propio (no una vista) cuyo lado limitante coincide con la entrada
+        del modelo; los recortes más pequeños solo se copian
+    """
+    if face_image is None or not face_image.size:
+        return None
+    height, width = target_size
+    factor = min(height / face_image.shape[0], width / face_image.shape[1])
+    if factor >= 1:
+        return face_image.copy() if face_image.base is not None else face_image
+    size = (max(1, int(face_image.shape[1] * factor)), max(1, int(face_image.shape[0] * factor)))
+    return cv2.resize(face_image, size, interpolation=cv2.INTER_AREA)
@@ -0,0 +1,274 @@
+"""
+Servidor local de inferencia facial con micro-batching
+
+Un proceso dedicado carga el modelo una sola vez y atiende a los workers de Django
+por un socket Unix (o TCP local) usando multiprocessing.connection. Las
+solicitudes que llegan dentro de una ventana corta (por defecto 5 ms) se agrupan
+en un solo forward del modelo, lo que sube el número de verificaciones por núcleo
+durante los picos de marcación y deja a los workers web sin TensorFlow cargado.
+RetinaFace también corre aquí (comando 'detect', sin agrupar): los workers solo
+ejecutan Haar con OpenCV.
+
+Protocolo (objetos serializados por Connection):
+    ('embed', id, [recortes BGR])  ->  ('ok', id, [embeddings o None])
+    ('detect', id, imagen BGR)     ->  ('ok', id, [{'x', 'y', 'width', 'height'}])
+    ('info', id, None)             ->  ('ok', id, {'model_name': ..., ...})
+    respuesta de error             ->  ('error', id, mensaje)
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from batched_inference import BatchedEmbedder
+from face_detector import RetinaFaceTier
+
+
+class InferenceUnavailable(Exception):
+    """El servidor de inferencia no respondió"""
+
+
+def parse_address(value):
+    """
+    Convierte la dirección configurada al formato de multiprocessing.connection
+
+    Args:
+        value: 'host:puerto' para TCP local o una ruta para socket Unix
+
+    Returns:
+        Tupla (host, puerto) o ruta del socket
+    """
+    host, sep, port = str(value).rpartition(':')
+    if sep and port.isdigit() and host and os.sep not in host:
+        return host, int(port)
+    return str(value)
+
+
+class InferenceServer:
+    """Proceso dueño del modelo que agrupa solicitudes concurrentes en lotes"""
+
+    def __init__(self, address, authkey, model_name='Facenet', batch_size=32, window_ms=5.0):
+        """
+        Args:
+            address: Dirección de escucha (ver parse_address)
+            authkey: Clave compartida con los clientes (bytes)
+            model_name: Modelo de DeepFace a cargar
+            batch_size: Máximo de rostros por forward
+            window_ms: Ventana para juntar solicitudes concurrentes
+        """
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.embedder = BatchedEmbedder(model_name, batch_size=batch_size)
+        # La imagen ya llega reducida por el worker (RemoteRetinaFaceTier)
+        self.detector = RetinaFaceTier(max_side=0)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._requests = queue.Queue()
+        self._stopped = threading.Event()
+        self.stats = {'requests': 0, 'faces': 0, 'batches': 0, 'detections': 0}
+
+    def warm_up(self):
+        """Construye los modelos antes de aceptar conexiones"""
+        import numpy as np
+        self.embedder.embed([np.full((160, 160, 3), 128, dtype=np.uint8)])
+        self.detector.detect(np.full((160, 160, 3), 128, dtype=np.uint8))
+
+    def _collect(self):
+        """Espera una solicitud y junta las que lleguen dentro de la ventana"""
+        first = self._requests.get()
+        if first is None:
+            return None
+        pending = [first]
+        faces = len(first[3])
+        deadline = time.monotonic() + self.window
+        while faces < self.embedder.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._requests.put(None)
+                break
+            pending.append(item)
+            faces += len(item[3])
+        return pending
+
+    def _batch_loop(self):
+        while not self._stopped.is_set():
+            pending = self._collect()
+            if pending is None:
+                return
+            crops = [crop for item in pending for crop in item[3]]
+            try:
+                embeddings = self.embedder.embed(crops)
+                error = None
+            except Exception as e:
+                embeddings, error = None, str(e)
+
+            self.stats['requests'] += len(pending)
+            self.stats['faces'] += len(crops)
+            self.stats['batches'] += 1
+
+            offset = 0
+            for conn, send_lock, request_id, item_crops in pending:
+                if error is None:
+                    reply = ('ok', request_id, embeddings[offset:offset + len(item_crops)])
+                else:
+                    reply = ('error', request_id, error)
+                offset += len(item_crops)
+                try:
+                    with send_lock:
+                        conn.send(reply)
+                except (OSError, EOFError):
+                    pass
+
+    def _serve_connection(self, conn):
+        send_lock = threading.Lock()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    command, request_id, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if command == 'embed':
+                    self._requests.put((conn, send_lock, request_id, list(payload or [])))
+                elif command == 'detect':
+                    try:
+                        reply = ('ok', request_id, self.detector.detect(payload))
+                    except Exception as e:
+                        reply = ('error', request_id, str(e))
+                    self.stats['detections'] += 1
+                    with send_lock:
+                        conn.send(reply)
+                elif command == 'info':
+                    info = {
+                        'model_name': self.embedder.model_name,
+                        'batch_size': self.embedder.batch_size,
+                        'window_ms': self.window * 1000.0,
+                        **self.stats,
+                    }
+                    with send_lock:
+                        conn.send(('ok', request_id, info))
+                else:
+                    with send_lock:
+                        conn.send(('error', request_id, f'Comando desconocido: {command}'))
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        """Acepta conexiones hasta que se llame a stop()"""
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        listener = Listener(self.address, authkey=self.authkey)
+        self._listener = listener
+        threading.Thread(target=self._batch_loop, name='face-batcher', daemon=True).start()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError):
+                    if self._stopped.is_set():
+                        break
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._requests.put(None)
+        listener = getattr(self, '_listener', None)
+        if listener is not None:
+            listener.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+class InferenceClient:
+    """Cliente usado por los workers de Django (una conexión por hilo)"""
+
+    def __init__(self, address, authkey, timeout=5.0):
+        """
+        Args:
+            address: Dirección del servidor (ver parse_address)
+            authkey: Clave compartida con el servidor (bytes)
+            timeout: Segundos máximos de espera por respuesta
+        """
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except Exception as e:
+                raise InferenceUnavailable(f'No se pudo conectar al servidor de inferencia: {e}')
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def after_fork(self):
+        """Descarta las conexiones heredadas del proceso padre sin cerrarlas"""
+        self._local = threading.local()
+
+    def _call(self, command, payload=None):
+        request_id = next(self._ids)
+        conn = self._connection()
+        try:
+            conn.send((command, request_id, payload))
+            if not conn.poll(self.timeout):
+                raise InferenceUnavailable('El servidor de inferencia no respondió a tiempo')
+            status, reply_id, result = conn.recv()
+        except InferenceUnavailable:
+            self._reset()
+            raise
+        except (OSError, EOFError) as e:
+            self._reset()
+            raise InferenceUnavailable(f'Conexión con el servidor de inferencia perdida: {e}')
+        if reply_id != request_id:
+            self._reset()
+            raise InferenceUnavailable('Respuesta fuera de orden del servidor de inferencia')
+        if status != 'ok':
+            raise InferenceUnavailable(result)
+        return result
+
+    def info(self):
+        """Modelo y estadísticas del servidor"""
+        return self._call('info')
+
+    def embed(self, face_images):
+        """
+        Embeddings de una lista de recortes BGR
+
+        Returns:
+            Lista del mismo largo con el embedding (lista de floats) o None
+        """
+        return self._call('embed', list(face_images))
+
+    def detect(self, image):
+        """
+        Rostros detectados por RetinaFace en el servidor
+
+        Returns:
+            Lista de diccionarios con 'x', 'y', 'width', 'height'
+        """
+        return self._call('detect', image)
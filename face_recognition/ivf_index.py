@@ -0,0 +1,140 @@
+"""
+Índice aproximado IVF (inverted file) para identificación 1:N a gran escala
+
+Los embeddings normalizados se agrupan con k-means esférico en ``nlist`` listas.
+Una búsqueda compara la consulta solo contra los centroides, toma las ``nprobe``
+listas más cercanas y puntúa de forma exacta (vectores completos float32) las
+filas de esas listas. ``nprobe`` es el control entre recall y latencia: con
+``nprobe == nlist`` el resultado es idéntico a la búsqueda exacta.
+
+Los centroides se entrenan una vez (comando ``rebuild_face_index``) y se guardan
+en disco; la asignación de filas a listas se recalcula al cambiar los datos.
+"""
+
+import os
+import tempfile
+import numpy as np
+
+
+def default_nlist(count):
+    """Número de listas recomendado para ``count`` embeddings (~4·√N)"""
+    if count <= 0:
+        return 1
+    return int(max(1, min(count, round(4 * np.sqrt(count)))))
+
+
+def _assign(matrix, centroids, chunk_size=8192):
+    """Lista más cercana de cada fila, procesando por bloques para acotar memoria"""
+    assignments = np.empty(len(matrix), dtype=np.intp)
+    for start in range(0, len(matrix), chunk_size):
+        block = np.asarray(matrix[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(matrix, nlist=None, iterations=10, sample_size=50000, seed=0):
+    """
+    Entrena centroides con k-means esférico
+
+    Args:
+        matrix: Matriz (N, D) de embeddings normalizados
+        nlist: Número de listas (por defecto ~4·√N)
+        iterations: Iteraciones de k-means
+        sample_size: Máximo de filas usadas para entrenar
+        seed: Semilla para reproducibilidad
+
+    Returns:
+        Matriz (nlist, D) float32 de centroides normalizados
+    """
+    rng = np.random.default_rng(seed)
+    count = len(matrix)
+    if count == 0:
+        raise ValueError("No hay embeddings para entrenar el índice")
+
+    if count > sample_size:
+        sample = np.asarray(matrix[np.sort(rng.choice(count, sample_size, replace=False))], dtype=np.float32)
+    else:
+        sample = np.asarray(matrix, dtype=np.float32)
+
+    nlist = min(nlist or default_nlist(count), len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-sembrar listas vacías con filas al azar
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return np.ascontiguousarray(centroids)
+
+
+def save_centroids(path, centroids):
+    """Guarda los centroides de forma atómica"""
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.ivf-', suffix='.npy.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            np.save(tmp_file, np.asarray(centroids, dtype=np.float32), allow_pickle=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_centroids(path):
+    """Lee los centroides guardados (None si no existen)"""
+    try:
+        return np.load(path, allow_pickle=False).astype(np.float32, copy=False)
+    except FileNotFoundError:
+        return None
+
+
+class IVFIndex:
+    """Listas invertidas sobre una matriz de embeddings normalizados"""
+
+    def __init__(self, centroids, matrix):
+        """
+        Args:
+            centroids: Matriz (nlist, D) de centroides normalizados
+            matrix: Matriz (N, D) de embeddings normalizados (puede ser un memmap)
+        """
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        assignments = _assign(matrix, self.centroids)
+        # Filas ordenadas por lista: la lista i ocupa order[offsets[i]:offsets[i + 1]]
+        self.order = np.argsort(assignments, kind='stable')
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))]
+        ).astype(np.intp)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def candidates(self, query, nprobe):
+        """
+        Filas de las ``nprobe`` listas más cercanas a la consulta
+
+        Args:
+            query: Embedding normalizado (D,)
+            nprobe: Número de listas a revisar
+
+        Returns:
+            Arreglo con los índices de fila candidatos
+        """
+        nprobe = max(1, min(int(nprobe), self.nlist))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        parts = [self.order[self.offsets[i]:self.offsets[i + 1]] for i in probe]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
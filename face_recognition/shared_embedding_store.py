@@ -0,0 +1,171 @@
+"""
+Almacén global de embeddings compartido entre procesos (workers de gunicorn)
+
+La matriz normalizada de todos los embeddings se publica en un archivo .npy que
+cada worker abre con memoria mapeada (np.memmap, modo solo lectura): el sistema
+operativo comparte las mismas páginas físicas entre todos los procesos en lugar
+de que cada uno mantenga su propia copia.
+
+Cada publicación crea una nueva generación (archivos ``matrix-<gen>.npy``,
+``labels-<gen>.npy`` y ``manifest-<gen>.txt``) y luego actualiza de forma
+atómica el archivo ``generation``. Los workers comparan ese contador (como
+máximo cada pocos segundos, ver EmbeddingIndex.sync) y vuelven a mapear solo
+cuando cambió. El manifiesto guarda la huella del directorio de rostros con la
+que se armó la generación; si ya no coincide, el índice se reconstruye.
+"""
+
+import logging
+import os
+import threading
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se protege dentro del mismo proceso
+    fcntl = None
+
+logger = logging.getLogger('core.face_recognition')
+
+GENERATION_FILENAME = 'generation'
+LOCK_FILENAME = '.lock'
+
+
+class SharedEmbeddingStore:
+    """Matriz de embeddings versionada y mapeada en memoria"""
+
+    def __init__(self, store_dir, keep_generations=2):
+        """
+        Args:
+            store_dir: Directorio donde se guardan las generaciones
+            keep_generations: Generaciones anteriores que se conservan para lectores en curso
+        """
+        self.store_dir = store_dir
+        self.keep_generations = max(1, keep_generations)
+        self._thread_lock = threading.RLock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, kind, generation, extension='.npy'):
+        return os.path.join(self.store_dir, f'{kind}-{generation:08d}{extension}')
+
+    def current_generation(self):
+        """Generación publicada más reciente (0 si todavía no hay ninguna)"""
+        try:
+            with open(os.path.join(self.store_dir, GENERATION_FILENAME), 'r') as gen_file:
+                return int(gen_file.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    @contextmanager
+    def locked(self):
+        """Bloqueo exclusivo entre hilos y procesos para publicar una generación"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.store_dir, LOCK_FILENAME), 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def open(self, generation=None):
+        """
+        Mapea en memoria una generación
+
+        Args:
+            generation: Generación a abrir (por defecto la más reciente)
+
+        Returns:
+            Tupla (generación, matriz (N, D) float32 de solo lectura, etiquetas) o
+            None si todavía no se ha publicado nada
+        """
+        for _ in range(3):
+            gen = generation or self.current_generation()
+            if not gen:
+                return None
+            try:
+                labels = np.load(self._path('labels', gen), allow_pickle=False)
+                try:
+                    matrix = np.load(self._path('matrix', gen), mmap_mode='r', allow_pickle=False)
+                except ValueError:
+                    # Un archivo sin filas no se puede mapear
+                    matrix = np.load(self._path('matrix', gen), allow_pickle=False)
+                if matrix.size and len(matrix) != len(labels):
+                    # Generación incompleta o corrupta: tratarla como inexistente
+                    logger.warning("Generación %s inconsistente (%s filas, %s etiquetas)", gen, len(matrix), len(labels))
+                    return None
+                return gen, matrix, labels
+            except FileNotFoundError:
+                if generation:
+                    raise
+                # Otra publicación eliminó la generación entre la lectura del contador y la apertura
+                continue
+        return None
+
+    def manifest(self, generation):
+        """Huella del directorio de rostros con la que se publicó la generación (o None)"""
+        try:
+            with open(self._path('manifest', generation, '.txt'), 'r') as manifest_file:
+                return manifest_file.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _write_atomic(self, final_path, write):
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.store_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                write(tmp_file)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, final_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def publish(self, matrix, labels, manifest=None):
+        """
+        Publica una nueva generación. Debe llamarse dentro de ``locked()``.
+
+        Args:
+            matrix: Matriz (N, D) de embeddings ya normalizados
+            labels: Etiqueta de cada fila
+            manifest: Huella del directorio de rostros de esta generación
+
+        Returns:
+            Número de la nueva generación
+        """
+        gen = self.current_generation() + 1
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        labels = np.asarray(labels, dtype=str)
+
+        self._write_atomic(self._path('matrix', gen), lambda f: np.save(f, matrix, allow_pickle=False))
+        self._write_atomic(self._path('labels', gen), lambda f: np.save(f, labels, allow_pickle=False))
+        if manifest is not None:
+            self._write_atomic(self._path('manifest', gen, '.txt'), lambda f: f.write(manifest.encode('ascii')))
+        self._write_atomic(
+            os.path.join(self.store_dir, GENERATION_FILENAME),
+            lambda f: f.write(str(gen).encode('ascii'))
+        )
+        self._cleanup(gen)
+        return gen
+
+    def _cleanup(self, current):
+        """Elimina generaciones antiguas que ya no debería estar leyendo nadie"""
+        for file_name in os.listdir(self.store_dir):
+            kind, _, rest = file_name.partition('-')
+            if kind not in ('matrix', 'labels', 'manifest') or not rest.endswith(('.npy', '.txt')):
+                continue
+            try:
+                gen = int(rest[:-4])
+            except ValueError:
+                continue
+            if gen <= current - self.keep_generations:
+                try:
+                    os.remove(os.path.join(self.store_dir, file_name))
+                except OSError:
+                    # En Windows un archivo mapeado por otro proceso no se puede borrar todavía
+                    pass
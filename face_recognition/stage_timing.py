@@ -0,0 +1,177 @@
+"""
+Tiempos por etapa del flujo facial (decode, detect, quality, embed, template_load, match)
+
+Cada etapa se mide con ``span``. La duración se acumula siempre en histogramas del
+proceso (``histograms``) y, si hay una traza activa (``trace``), se agrega también a
+la traza de la solicitud en curso. La traza vive en un ContextVar: los hilos de un
+ThreadPoolExecutor no la heredan salvo que la función se envuelva con ``bind``.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Límites superiores de los buckets en milisegundos (el último es +inf)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_current_trace = contextvars.ContextVar('face_stage_trace', default=None)
+_current_span = contextvars.ContextVar('face_stage_span', default=None)
+
+
+class StageTrace:
+    """Etapas medidas durante una solicitud"""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, attrs):
+        with self._lock:
+            self.spans.append({'stage': name, 'ms': round(seconds * 1000.0, 3), **attrs})
+
+    def totals(self):
+        """
+        Tiempo total y número de mediciones por etapa, en el orden de aparición
+
+        Returns:
+            dict {etapa: {'ms', 'count', y los atributos de la última medición}}
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for item in spans:
+            entry = totals.setdefault(item['stage'], {'ms': 0.0, 'count': 0})
+            entry['ms'] = round(entry['ms'] + item['ms'], 3)
+            entry['count'] += 1
+            entry.update({key: value for key, value in item.items() if key not in ('stage', 'ms')})
+        return totals
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (una entrada por etapa)"""
+        entries = []
+        for name, entry in self.totals().items():
+            details = [f'{key}={value}' for key, value in entry.items() if key not in ('ms', 'count')]
+            if entry['count'] > 1:
+                details.insert(0, f"x{entry['count']}")
+            desc = f';desc="{" ".join(details)}"' if details else ''
+            entries.append(f"{name}{desc};dur={entry['ms']:.1f}")
+        return ', '.join(entries)
+
+
+class StageHistograms:
+    """Histogramas de latencia por etapa, compartidos por todos los hilos del proceso"""
+
+    def __init__(self, buckets_ms=BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, name, seconds):
+        ms = seconds * 1000.0
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {
+                    'counts': [0] * (len(self.buckets_ms) + 1), 'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0,
+                }
+            stage['counts'][bisect.bisect_left(self.buckets_ms, ms)] += 1
+            stage['count'] += 1
+            stage['sum_ms'] += ms
+            stage['max_ms'] = max(stage['max_ms'], ms)
+
+    def _percentile(self, counts, total, fraction):
+        """Límite superior del bucket donde cae el percentil"""
+        position = np.searchsorted(np.cumsum(counts), fraction * total)
+        return float(self.buckets_ms[position]) if position < len(self.buckets_ms) else float('inf')
+
+    def snapshot(self):
+        """
+        Estado de los histogramas
+
+        Returns:
+            dict {etapa: {'count', 'mean_ms', 'max_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'buckets'}}
+            donde los percentiles son el límite superior del bucket correspondiente y
+            'buckets' asocia cada límite ('le') con su número de mediciones
+        """
+        with self._lock:
+            stages = {name: dict(stage, counts=list(stage['counts'])) for name, stage in self._stages.items()}
+        labels = [str(limit) for limit in self.buckets_ms] + ['inf']
+        result = {}
+        for name, stage in stages.items():
+            total = stage['count']
+            result[name] = {
+                'count': total,
+                'mean_ms': round(stage['sum_ms'] / total, 3) if total else 0.0,
+                'max_ms': round(stage['max_ms'], 3),
+                'p50_ms': self._percentile(stage['counts'], total, 0.50),
+                'p95_ms': self._percentile(stage['counts'], total, 0.95),
+                'p99_ms': self._percentile(stage['counts'], total, 0.99),
+                'buckets': dict(zip(labels, stage['counts'])),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+
+histograms = StageHistograms()
+
+
+@contextmanager
+def trace():
+    """Abre una traza para la solicitud en curso y la devuelve"""
+    current = StageTrace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    """Traza activa o None"""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Mide una etapa
+
+    Args:
+        name: Nombre de la etapa
+        **attrs: Atributos que se guardan con la medición (p. ej. photos=15)
+    """
+    attrs = dict(attrs)
+    token = _current_span.set(attrs)
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        elapsed = time.perf_counter() - started
+        _current_span.reset(token)
+        histograms.record(name, elapsed)
+        current = _current_trace.get()
+        if current is not None:
+            current.add(name, elapsed, attrs)
+
+
+def annotate(**attrs):
+    """Agrega atributos a la etapa en curso (sin efecto fuera de un span)"""
+    current = _current_span.get()
+    if current is not None:
+        current.update(attrs)
+
+
+def bind(func):
+    """Envuelve func para que las llamadas desde otros hilos registren en la traza actual"""
+    context = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return bound
@@ -0,0 +1,109 @@
+"""
+Compactación de plantillas faciales por persona
+
+Al registrar, los embeddings de cada persona (hasta 50) se reducen a un conjunto
+representativo pequeño: el centroide normalizado más ``k`` medoides elegidos con
+k-medoids sobre similitud coseno. La verificación 1:1 compara primero contra ese
+conjunto y solo revisa todas las plantillas cuando el resultado queda cerca del
+umbral.
+"""
+
+import numpy as np
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def compact_templates(embeddings, medoids=4, iterations=10):
+    """
+    Reduce las plantillas de una persona a centroide + k medoides
+
+    Args:
+        embeddings: Matriz (N, D) de embeddings
+        medoids: Número de medoides a conservar
+        iterations: Iteraciones máximas de k-medoids
+
+    Returns:
+        Matriz (M, D) float32 normalizada; la fila 0 es el centroide y el resto
+        son plantillas reales. Si N <= medoids se devuelven todas las plantillas.
+    """
+    matrix = _normalize(embeddings)
+    if not matrix.size:
+        return np.empty((0, 0), dtype=np.float32)
+
+    centroid = _normalize(matrix.mean(axis=0))
+    if len(matrix) <= medoids:
+        return np.ascontiguousarray(np.concatenate([centroid, matrix]), dtype=np.float32)
+
+    similarity = matrix @ matrix.T
+
+    # Inicialización: la plantilla más cercana al centroide y luego las más alejadas entre sí
+    chosen = [int(np.argmax(matrix @ centroid[0]))]
+    while len(chosen) < medoids:
+        chosen.append(int(np.argmin(similarity[:, chosen].max(axis=1))))
+    chosen = np.array(chosen)
+
+    for _ in range(iterations):
+        assignments = np.argmax(similarity[:, chosen], axis=1)
+        updated = chosen.copy()
+        for cluster in range(len(chosen)):
+            members = np.flatnonzero(assignments == cluster)
+            if len(members):
+                # Medoide: el miembro más parecido en promedio al resto de su grupo
+                updated[cluster] = members[np.argmax(similarity[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(updated, chosen):
+            break
+        chosen = updated
+
+    return np.ascontiguousarray(np.concatenate([centroid, matrix[chosen]]), dtype=np.float32)
+
+
+def best_similarity(templates, probe):
+    """Similitud máxima en [0, 1] entre un embedding y un conjunto de plantillas"""
+    templates = np.asarray(templates, dtype=np.float32)
+    probe = np.asarray(probe, dtype=np.float32).ravel()
+    norms = np.linalg.norm(templates, axis=1) * np.linalg.norm(probe)
+    dots = templates @ probe
+    similarities = np.where(norms > 0, (dots / np.where(norms > 0, norms, 1) + 1) / 2, 0.0)
+    return float(similarities.max())
+
+
+def verify_with_templates(probe, compact, load_full, threshold, margin=0.05):
+    """
+    Verificación 1:1 contra el conjunto compacto con respaldo al conjunto completo
+
+    Se acepta si una plantilla real del conjunto compacto (un medoide) supera el
+    umbral, lo que implica el mismo resultado que revisar todas. Se rechaza sin
+    revisar el resto si todo el conjunto compacto queda por debajo de
+    ``threshold - margin``. En la zona intermedia se comparan todas.
+
+    Args:
+        probe: Embedding capturado
+        compact: Conjunto compacto (fila 0 = centroide) o None si no existe
+        load_full: Función sin argumentos que devuelve la matriz completa
+        threshold: Umbral de similitud en [0, 1] (FaceProfile.confidence_threshold)
+        margin: Distancia al umbral a partir de la cual se revisan todas las plantillas
+
+    Returns:
+        Tupla (similitud, plantillas comparadas, se usó el conjunto completo)
+    """
+    compared = 0
+    if compact is not None and len(compact):
+        medoid_similarity = best_similarity(compact[1:], probe) if len(compact) > 1 else 0.0
+        compact_similarity = max(medoid_similarity, best_similarity(compact[:1], probe))
+        compared = len(compact)
+        if medoid_similarity >= threshold:
+            return medoid_similarity, compared, False
+        if compact_similarity < threshold - margin:
+            return medoid_similarity, compared, False
+
+    full = load_full()
+    if full is None or not len(full):
+        return 0.0, compared, True
+    return best_similarity(full, probe), compared + len(full), True
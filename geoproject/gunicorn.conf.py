@@ -0,0 +1,45 @@
+"""
+Configuración de gunicorn con precarga del sistema facial
+
+    gunicorn -c geoproject/gunicorn.conf.py
+
+El maestro importa Django y carga los pesos de los modelos antes del fork, de modo
+que los workers comparten esas páginas de memoria (copy-on-write) y un worker nuevo
+solo necesita la inferencia de prueba. Ver core/services/face_runtime.py.
+"""
+
+import multiprocessing
+import os
+
+# Los hooks solo precargan en este modo; se fija antes de que Django lea settings
+os.environ.setdefault('FACE_STACK_LOADING', 'preload')
+
+wsgi_app = 'geoproject.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', max(2, multiprocessing.cpu_count())))
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+# Cargar la aplicación en el maestro (requisito para compartir los pesos)
+preload_app = True
+
+
+def when_ready(server):
+    """Maestro listo, antes de crear los workers: cargar los pesos"""
+    from django.conf import settings
+    from core.services.face_runtime import preload_in_master
+
+    if getattr(settings, 'FACE_STACK_LOADING', 'lazy') != 'preload':
+        return
+    if preload_in_master():
+        server.log.info('Sistema facial precargado en el maestro')
+    else:
+        server.log.warning('Sistema facial no disponible; los workers arrancan sin modelos')
+
+
+def post_fork(server, worker):
+    """En cada worker: estado de TensorFlow propio e inferencia de prueba"""
+    from core.services.face_runtime import after_fork, readiness
+
+    after_fork()
+    server.log.info('Worker %s: sistema facial %s', worker.pid, readiness()['phase'])
@@ -57,6 +57,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.DebugLogSamplingMiddleware',
+    'core.middleware.DayCloseMiddleware',
 ]
 
 ROOT_URLCONF = 'geoproject.urls'
@@ -205,19 +207,43 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-face-timing',
 ]
 
+# Desglose de tiempos del sistema facial (ver FACE_TIMING_HEADER)
+CORS_EXPOSE_HEADERS = ['server-timing']
+
 # Configuración específica para OPTIONS (preflight)
 CORS_PREFLIGHT_MAX_AGE = 86400  # 24 horas
 
 # Logging
+# Nivel del logger core y fracción de solicitudes cuyo log DEBUG se emite
+# (la cabecera X-Debug-Log: 1 fuerza el muestreo de una solicitud)
+CORE_LOG_LEVEL = os.getenv('CORE_LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO').upper()
+CORE_DEBUG_SAMPLE_RATE = float(os.getenv('CORE_DEBUG_SAMPLE_RATE', 1.0 if DEBUG else 0.01))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sampled_debug': {
+            '()': 'core.logging_utils.SampledDebugFilter',
+        },
+    },
+    'formatters': {
+        'core': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'core_console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['sampled_debug'],
+            'formatter': 'core',
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -225,8 +251,8 @@ LOGGING = {
     },
     'loggers': {
         'core': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
+            'handlers': ['core_console'],
+            'level': CORE_LOG_LEVEL,
             'propagate': False,
         },
         'django': {
@@ -286,3 +312,98 @@ PASSWORD_RESET_EMAIL_TEMPLATE = 'core/emails/password_reset_email.html'
 # Configuración adicional para emails HTML
 EMAIL_USE_LOCALTIME = True
 EMAIL_TIMEOUT = 20  # Timeout en segundos para conexión SMTP
+
+# Configuración del reconocimiento facial
+# Almacén de embeddings mapeado en memoria y compartido por todos los workers de gunicorn
+FACE_SHARED_EMBEDDING_STORE = os.getenv('FACE_SHARED_EMBEDDING_STORE', 'True').lower() == 'true'
+# Segundos entre lecturas de la generación publicada y entre comparaciones de la
+# huella de faces/ (si no coincide, el almacén se reconstruye desde las carpetas)
+FACE_SHARED_STORE_SYNC_SECONDS = float(os.getenv('FACE_SHARED_STORE_SYNC_SECONDS', 1.0))
+FACE_SHARED_STORE_RESCAN_SECONDS = float(os.getenv('FACE_SHARED_STORE_RESCAN_SECONDS', 30.0))
+
+# Índice 1:N para identify_person: 'exact' (exhaustivo) o 'ivf' (aproximado)
+FACE_INDEX_MODE = os.getenv('FACE_INDEX_MODE', 'exact')
+# Listas IVF revisadas por búsqueda: control entre recall y latencia
+FACE_IVF_NPROBE = int(os.getenv('FACE_IVF_NPROBE', 8))
+# Por debajo de este número de embeddings la búsqueda exacta es más rápida
+FACE_IVF_MIN_SIZE = int(os.getenv('FACE_IVF_MIN_SIZE', 2000))
+
+# Verificación 1:1: medoides del conjunto compacto por empleado y distancia al
+# umbral dentro de la cual se comparan todas las plantillas
+FACE_TEMPLATE_MEDOIDS = int(os.getenv('FACE_TEMPLATE_MEDOIDS', 4))
+FACE_TEMPLATE_MARGIN = float(os.getenv('FACE_TEMPLATE_MARGIN', 0.05))
+
+# Rostros por forward del modelo al extraer embeddings en lote (registro)
+FACE_EMBEDDING_BATCH_SIZE = int(os.getenv('FACE_EMBEDDING_BATCH_SIZE', 32))
+
+# Servidor local de inferencia (manage.py run_face_inference_server): ruta de socket
+# Unix o host:puerto. Vacío = el modelo se ejecuta dentro de cada worker. Con servidor,
+# los workers no importan DeepFace/TensorFlow: RetinaFace y los embeddings corren allí
+# y, si no responde, no se calculan localmente
+FACE_INFERENCE_SERVER = os.getenv('FACE_INFERENCE_SERVER', '')
+# Ventana para agrupar solicitudes concurrentes en un solo forward (ms)
+FACE_INFERENCE_WINDOW_MS = float(os.getenv('FACE_INFERENCE_WINDOW_MS', 5))
+# Espera máxima de un worker por la respuesta del servidor (s)
+FACE_INFERENCE_TIMEOUT = float(os.getenv('FACE_INFERENCE_TIMEOUT', 5))
+
+# Caché de detección/embeddings por contenido de imagen (reintentos del kiosko).
+# FACE_EMBEDDING_CACHE_MB = 0 la desactiva
+FACE_EMBEDDING_CACHE_MB = float(os.getenv('FACE_EMBEDDING_CACHE_MB', 32))
+FACE_EMBEDDING_CACHE_TTL = float(os.getenv('FACE_EMBEDDING_CACHE_TTL', 120))
+
+# Hilos que procesan los registros faciales en segundo plano (register_face?async=true)
+FACE_REGISTRATION_WORKERS = int(os.getenv('FACE_REGISTRATION_WORKERS', 2))
+
+# Tope por solicitud de register_face / verify_face (JSON base64, multipart o image/*).
+# Las subidas multipart y binarias se escriben a disco por bloques (core/parsers.py)
+FACE_UPLOAD_MAX_BYTES = int(os.getenv('FACE_UPLOAD_MAX_BYTES', 60 * 1024 * 1024))
+
+# Lado mayor (px) al que se decodifican las fotos faciales antes de detectar; los JPEG
+# más grandes usan decodificación reducida. 0 = resolución original
+FACE_DECODE_MAX_SIDE = int(os.getenv('FACE_DECODE_MAX_SIDE', 640))
+
+# Detección de rostros: niveles en orden, presupuesto por solicitud (ms; un nivel solo
+# se intenta si su duración típica cabe en lo que queda) y lado mayor de la imagen
+# reducida sobre la que trabaja cada nivel
+FACE_DETECTOR_TIERS = [t for t in os.getenv('FACE_DETECTOR_TIERS', 'haar,retinaface').split(',') if t.strip()]
+FACE_DETECTOR_BUDGET_MS = float(os.getenv('FACE_DETECTOR_BUDGET_MS', 800))
+FACE_DETECTOR_HAAR_MAX_SIDE = int(os.getenv('FACE_DETECTOR_HAAR_MAX_SIDE', 480))
+FACE_DETECTOR_RETINAFACE_MAX_SIDE = int(os.getenv('FACE_DETECTOR_RETINAFACE_MAX_SIDE', 640))
+# Un nivel saltado por presupuesto tantas veces seguidas se ejecuta igualmente para
+# medirlo de nuevo (0 = nunca)
+FACE_DETECTOR_PROBE_EVERY = int(os.getenv('FACE_DETECTOR_PROBE_EVERY', 20))
+
+# Control de calidad del rostro antes del modelo (nitidez, exposición, tamaño). Los
+# umbrales por defecto están en face_recognition/face_quality.py; aquí se pueden
+# sobrescribir, p. ej. {'min_sharpness': 60, 'min_face_px': 80}
+FACE_QUALITY_GATE = os.getenv('FACE_QUALITY_GATE', 'True').lower() == 'true'
+FACE_QUALITY_THRESHOLDS = {}
+
+# Carga del sistema facial (DeepFace/TensorFlow): 'lazy' en la primera consulta facial
+# o con manage.py warm_face_models; 'eager' al importar las vistas (cada proceso);
+# 'preload' en el maestro de gunicorn antes del fork (geoproject/gunicorn.conf.py)
+FACE_STACK_LOADING = os.getenv('FACE_STACK_LOADING', 'lazy').lower()
+# Hilos de TensorFlow por proceso (0 = valor por defecto de TensorFlow). Con varios
+# workers conviene repartir los núcleos: p. ej. 2 workers en 4 núcleos → 2
+FACE_TF_INTRA_OP_THREADS = int(os.getenv('FACE_TF_INTRA_OP_THREADS', 0))
+FACE_TF_INTER_OP_THREADS = int(os.getenv('FACE_TF_INTER_OP_THREADS', 0))
+
+# Cabecera con la que un cliente pide el desglose de tiempos por etapa del sistema
+# facial (respuesta con Server-Timing); los histogramas están en /api/health/face/timings/
+FACE_TIMING_HEADER = os.getenv('FACE_TIMING_HEADER', 'X-Face-Timing')
+
+# Confianza mínima de la verificación facial para registrar asistencia desde el kiosco
+# (/api/attendance/verify_and_mark/)
+ATTENDANCE_FACE_MIN_CONFIDENCE = float(os.getenv('ATTENDANCE_FACE_MIN_CONFIDENCE', 0.90))
+
+# Caché por proceso de áreas y horarios (core/services/area_cache.py): cada cuántos
+# segundos se compara la generación en la base para notar cambios hechos por otros
+# workers (0 = en cada lectura)
+AREA_CACHE_CHECK_SECONDS = float(os.getenv('AREA_CACHE_CHECK_SECONDS', 5))
+
+# Cierre de días de asistencia (entradas sin salida → ausente, core/services/day_close.py).
+# Lo hace el comando auto_process_attendance o, si ATTENDANCE_CLOSE_ON_REQUEST, la
+# primera solicitud después de medianoche. Sin marca previa se cierran los últimos
+# ATTENDANCE_CLOSE_LOOKBACK_DAYS días
+ATTENDANCE_CLOSE_ON_REQUEST = os.getenv('ATTENDANCE_CLOSE_ON_REQUEST', 'True').lower() == 'true'
+ATTENDANCE_CLOSE_LOOKBACK_DAYS = int(os.getenv('ATTENDANCE_CLOSE_LOOKBACK_DAYS', 7))